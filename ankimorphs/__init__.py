@@ -22,6 +22,7 @@ from anki.cards import Card
 from anki.collection import OpChangesAfterUndo
 from aqt import gui_hooks, mw
 from aqt.browser.browser import Browser
+from aqt.operations import QueryOp
 from aqt.overview import Overview
 from aqt.qt import (  # pylint:disable=no-name-in-module
     QAction,
@@ -41,8 +42,10 @@ from . import (
     browser_utils,
     name_file_utils,
     recalc,
+    recalc_profiler,
     reviewing_utils,
     settings_dialog,
+    spacy_wrapper,
     toolbar_stats,
 )
 from .ankimorphs_config import AnkiMorphsConfig, AnkiMorphsConfigFilter
@@ -70,6 +73,7 @@ def main() -> None:
 
     gui_hooks.profile_did_open.append(load_am_profile_configs)
     gui_hooks.profile_did_open.append(init_db)
+    gui_hooks.profile_did_open.append(prewarm_spacy_models)
     gui_hooks.profile_did_open.append(register_addon_dialogs)
     gui_hooks.profile_did_open.append(redraw_toolbar)
     gui_hooks.profile_did_open.append(init_tool_menu_and_actions)
@@ -145,6 +149,25 @@ def init_db() -> None:
     am_db.con.close()
 
 
+def prewarm_spacy_models() -> None:
+    # Loading spacy models is slow, so we can optionally load
+    # them on a background thread before they are needed.
+    assert mw is not None
+
+    am_config = AnkiMorphsConfig()
+    if not am_config.spacy_prewarm_models:
+        return
+
+    operation = QueryOp(
+        parent=mw,
+        op=lambda _: spacy_wrapper.prewarm_models(am_config),
+        success=lambda _: None,
+    )
+    # any problems with the models will be shown when they are used
+    operation.failure(lambda _: None)
+    operation.without_collection().run_in_background()
+
+
 def register_addon_dialogs() -> None:
     # We use the Anki dialog manager to handle our dialogs
 
@@ -183,6 +206,7 @@ def init_tool_menu_and_actions() -> None:
 
     settings_action = create_settings_action(am_config)
     recalc_action = create_recalc_action(am_config)
+    recalc_profile_action = create_recalc_profile_action()
     frequency_list_action = create_frequency_file_action(am_config)
     readability_report_action = create_readability_report_action(am_config)
     known_morphs_exporter_action = create_known_morphs_exporter_action(am_config)
@@ -192,6 +216,7 @@ def init_tool_menu_and_actions() -> None:
     am_tool_menu = create_am_tool_menu()
     am_tool_menu.addAction(settings_action)
     am_tool_menu.addAction(recalc_action)
+    am_tool_menu.addAction(recalc_profile_action)
     am_tool_menu.addAction(frequency_list_action)
     am_tool_menu.addAction(readability_report_action)
     am_tool_menu.addAction(known_morphs_exporter_action)
@@ -334,6 +359,9 @@ def rebuild_seen_morphs(changes: OpChangesAfterUndo) -> None:
     # the studied cards. This is admittedly costly, but it only
     # happens on 'undo,' which should be a rare occurrence.
     #
+    # The reviewer reads the seen morphs from an in-memory copy of
+    # the table (see ankimorphs_db.py), which the rebuild discards.
+    #
     # REDO:
     # Redoing, i.e., undoing an undo (Ctrl+Shift+Z), is almost
     # impossible to distinguish from a regular forward operation.
@@ -376,6 +404,12 @@ def create_recalc_action(am_config: AnkiMorphsConfig) -> QAction:
     return action
 
 
+def create_recalc_profile_action() -> QAction:
+    action = QAction("Recalc &Profile", mw)
+    action.triggered.connect(recalc_profiler.show_latest_report)
+    return action
+
+
 def create_settings_action(am_config: AnkiMorphsConfig) -> QAction:
     action = QAction("&Settings", mw)
     action.setShortcut(am_config.shortcut_settings)
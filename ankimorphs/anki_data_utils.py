@@ -1,17 +1,25 @@
 """
 By using a class with slots we get the speed of a dict and also
 the convenience/safety of accessing properties of an object.
+
+The functions at the bottom fetch the anki data that recalc caches.
 """
 
-from collections.abc import Sequence
+from collections.abc import Iterator, Sequence
 from typing import Any, Optional, Union
 
 import anki.utils
 from anki.tags import TagManager
+from aqt import mw
 
+from . import recalc_profiler
 from .ankimorphs_config import AnkiMorphsConfig, AnkiMorphsConfigFilter
 from .morpheme import Morpheme
 
+# The number of notes that are processed at a time when recalc caches the
+# anki data. The data of a single chunk is kept in memory.
+NOTES_PER_CHUNK: int = 5000
+
 
 class AnkiDBRowData:
     __slots__ = (
@@ -21,6 +29,7 @@ class AnkiDBRowData:
         "note_id",
         "note_fields",
         "note_tags",
+        "note_mod",
     )
 
     def __init__(self, data_row: Sequence[Any]) -> None:
@@ -42,6 +51,9 @@ class AnkiDBRowData:
         assert isinstance(data_row[6], str)
         self.note_tags: str = data_row[6]
 
+        assert isinstance(data_row[7], int)
+        self.note_mod: int = data_row[7]
+
 
 class AnkiCardData:  # pylint:disable=too-many-instance-attributes
     __slots__ = (
@@ -55,39 +67,50 @@ class AnkiCardData:  # pylint:disable=too-many-instance-attributes
         "fields",
         "tags",
         "note_id",
+        "note_mod",
         "morphs",
     )
 
-    def __init__(
+    def __init__(  # pylint:disable=too-many-arguments
         self,
         am_config: AnkiMorphsConfig,
         config_filter: AnkiMorphsConfigFilter,
         tag_manager: TagManager,
         anki_row_data: AnkiDBRowData,
+        note_card_data: Optional["AnkiCardData"] = None,
     ) -> None:
+        # note_card_data is the data of another card of the same note, the
+        # values that come from the note are then copied instead of parsing
+        # the note again.
         assert config_filter.field_index is not None
 
-        fields_list = anki.utils.split_fields(anki_row_data.note_fields)
-        tags_list = tag_manager.split(anki_row_data.note_tags)
+        self.interval = anki_row_data.card_interval
+        self.type = anki_row_data.card_type
+
+        if note_card_data is None:
+            fields_list = anki.utils.split_fields(anki_row_data.note_fields)
+            tags_list = tag_manager.split(anki_row_data.note_tags)
 
-        expression_field = fields_list[config_filter.field_index]
-        expression = anki.utils.strip_html(expression_field)
+            expression_field = fields_list[config_filter.field_index]
+            self.expression: str = anki.utils.strip_html(expression_field)
 
-        automatically_known_tag = am_config.tag_known_automatically in tags_list
-        manually_known_tag = am_config.tag_known_manually in tags_list
-        ready_tag = am_config.tag_ready in tags_list
-        not_ready_tag = am_config.tag_not_ready in tags_list
+            self.automatically_known_tag: bool = (
+                am_config.tag_known_automatically in tags_list
+            )
+            self.manually_known_tag: bool = am_config.tag_known_manually in tags_list
+            self.ready_tag: bool = am_config.tag_ready in tags_list
+            self.not_ready_tag: bool = am_config.tag_not_ready in tags_list
+        else:
+            self.expression = note_card_data.expression
+            self.automatically_known_tag = note_card_data.automatically_known_tag
+            self.manually_known_tag = note_card_data.manually_known_tag
+            self.ready_tag = note_card_data.ready_tag
+            self.not_ready_tag = note_card_data.not_ready_tag
 
-        self.interval = anki_row_data.card_interval
-        self.type = anki_row_data.card_type
-        self.expression = expression
-        self.automatically_known_tag = automatically_known_tag
-        self.manually_known_tag = manually_known_tag
-        self.ready_tag = ready_tag
-        self.not_ready_tag = not_ready_tag
         self.fields = anki_row_data.note_fields
         self.tags = anki_row_data.note_tags
         self.note_id = anki_row_data.note_id
+        self.note_mod = anki_row_data.note_mod
 
         # this is set later when spacy is used
         self.morphs: Optional[set[Morpheme]] = None
@@ -121,3 +144,143 @@ class AnkiMorphsCardData:
 
         assert isinstance(data_row[5], str)
         self.tags: str = data_row[5]
+
+
+def get_anki_data_chunks(
+    am_config: AnkiMorphsConfig, config_filter: AnkiMorphsConfigFilter
+) -> Iterator[list[AnkiDBRowData]]:
+    # Yields the cards of the notes that match the note filter, NOTES_PER_CHUNK notes
+    # at a time. All the cards of a note are always in the same chunk. The notes are
+    # paged through by their id (keyset pagination), which unlike OFFSET does not
+    # have to skip over the previous rows every time.
+    #
+    # EXAMPLE FINAL SQL QUERY:
+    #   SELECT cards.id, cards.ivl, cards.type, cards.queue, notes.id, notes.flds, notes.tags, notes.mod
+    #   FROM cards
+    #   INNER JOIN notes ON
+    #       cards.nid = notes.id
+    #   WHERE notes.mid = 1691076536776 AND notes.tags LIKE '% movie %' AND (cards.queue != -1 OR notes.tags LIKE '% am-known-manually %') AND notes.id BETWEEN ? AND ?
+
+    assert mw
+    assert mw.col.db
+
+    notes_search_string, cards_search_string = _get_anki_data_search_strings(
+        am_config, config_filter
+    )
+    last_note_id: int = -1
+
+    while True:
+        with recalc_profiler.phase("fetch_anki_data"):
+            note_ids: list[int] = mw.col.db.list(
+                "SELECT notes.id FROM notes WHERE "
+                + notes_search_string
+                + " AND notes.id > ? ORDER BY notes.id LIMIT ?",
+                last_note_id,
+                NOTES_PER_CHUNK,
+            )
+            if len(note_ids) == 0:
+                return
+
+            result: list[Sequence[Any]] = mw.col.db.all(
+                """
+                SELECT cards.id, cards.ivl, cards.type, cards.queue, notes.id, notes.flds, notes.tags, notes.mod
+                FROM cards
+                INNER JOIN notes ON
+                    cards.nid = notes.id
+                """
+                + f"WHERE {notes_search_string}{cards_search_string} AND notes.id BETWEEN ? AND ?",
+                note_ids[0],
+                note_ids[-1],
+            )
+        last_note_id = note_ids[-1]
+        recalc_profiler.count("anki_cards_fetched", len(result))
+
+        if len(result) > 0:
+            yield list(map(AnkiDBRowData, result))
+
+
+def get_anki_card_amount(
+    am_config: AnkiMorphsConfig, config_filter: AnkiMorphsConfigFilter
+) -> int:
+    assert mw
+    assert mw.col.db
+
+    notes_search_string, cards_search_string = _get_anki_data_search_strings(
+        am_config, config_filter
+    )
+    card_amount = mw.col.db.scalar(
+        """
+        SELECT COUNT(*)
+        FROM cards
+        INNER JOIN notes ON
+            cards.nid = notes.id
+        """
+        + f"WHERE {notes_search_string}{cards_search_string}",
+    )
+    assert isinstance(card_amount, int)
+    return card_amount
+
+
+def get_anki_cards_due_and_queue(
+    note_type_id: int, first_card_id: int, last_card_id: int
+) -> dict[int, tuple[int, int]]:
+    # Returns the due and queue values of the cards of the note type
+    # with ids between first_card_id and last_card_id (inclusive)
+    assert mw
+    assert mw.col.db
+
+    result: list[Sequence[int]] = mw.col.db.all(
+        """
+        SELECT cards.id, cards.due, cards.queue
+        FROM cards
+        INNER JOIN notes ON
+            cards.nid = notes.id
+        WHERE notes.mid = ? AND cards.id BETWEEN ? AND ?
+        """,
+        note_type_id,
+        first_card_id,
+        last_card_id,
+    )
+    return {row[0]: (row[1], row[2]) for row in result}
+
+
+def _get_anki_data_search_strings(
+    am_config: AnkiMorphsConfig, config_filter: AnkiMorphsConfigFilter
+) -> tuple[str, str]:
+    ################################################################
+    #                        SQL QUERY
+    ################################################################
+    # This sql query is horrible, partly because of the limitation
+    # in sqlite where you can't really build a query with variable
+    # parameter length (tags in this case)
+    # More info:
+    # https://stackoverflow.com/questions/5766230/select-from-sqlite-table-where-rowid-in-list-using-python-sqlite3-db-api-2-0
+    #
+    # Returns the conditions on the notes and the cards separately,
+    # the notes conditions are also used to page through the notes.
+    ################################################################
+
+    ignore_suspended_cards = ""
+    if am_config.preprocess_ignore_suspended_cards_content:
+        # If this part is included, then we don't get cards that are suspended EXCEPT for
+        # the cards that were 'set known and skip' and later suspended. We want to always
+        # include those cards otherwise we can lose track of known morphs
+        ignore_suspended_cards = f" AND (cards.queue != -1 OR notes.tags LIKE '% {am_config.tag_known_manually} %')"
+
+    excluded_tags = config_filter.tags["exclude"]
+    included_tags = config_filter.tags["include"]
+    tags_search_string = ""
+
+    if len(excluded_tags) > 0:
+        tags_search_string += "".join(
+            [f" AND notes.tags NOT LIKE '% {_tag} %'" for _tag in excluded_tags]
+        )
+    if len(included_tags) > 0:
+        tags_search_string += "".join(
+            [f" AND notes.tags LIKE '% {_tag} %'" for _tag in included_tags]
+        )
+
+    notes_search_string = (
+        f"notes.mid = {config_filter.note_type_id}{tags_search_string}"
+    )
+    return notes_search_string, ignore_suspended_cards
@@ -153,6 +153,9 @@ class AnkiMorphsConfig:  # pylint:disable=too-many-instance-attributes
             self.recalc_interval_for_known: int = _get_int_config(
                 "recalc_interval_for_known", is_default
             )
+            self.recalc_morphemizer_workers: int = _get_int_config(
+                "recalc_morphemizer_workers", is_default
+            )
             self.recalc_on_sync: bool = _get_bool_config("recalc_on_sync", is_default)
             self.recalc_suspend_known_new_cards: bool = _get_bool_config(
                 "recalc_suspend_known_new_cards", is_default
@@ -172,6 +175,12 @@ class AnkiMorphsConfig:  # pylint:disable=too-many-instance-attributes
             self.recalc_unknowns_field_shows_lemmas: bool = _get_bool_config(
                 "recalc_unknowns_field_shows_lemmas", is_default
             )
+            self.spacy_pipe_settings: dict[str, dict[str, int]] = (
+                _get_spacy_pipe_settings_config(is_default)
+            )
+            self.spacy_prewarm_models: bool = _get_bool_config(
+                "spacy_prewarm_models", is_default
+            )
             self.tag_ready: str = _get_string_config("tag_ready", is_default)
             self.tag_not_ready: str = _get_string_config("tag_not_ready", is_default)
             self.tag_known_automatically: str = _get_string_config(
@@ -191,6 +200,10 @@ class AnkiMorphsConfig:  # pylint:disable=too-many-instance-attributes
                 show_critical_config_error()
                 ankimorphs_globals.ankimorphs_broken = True
 
+    def get_spacy_pipe_settings(self, spacy_model_name: str) -> dict[str, int]:
+        # models that are not in the settings use the defaults of the pipeline
+        return self.spacy_pipe_settings.get(spacy_model_name, {})
+
 
 def _get_config(
     key: str,
@@ -278,6 +291,27 @@ def get_matching_read_filter(note: Note) -> Optional[AnkiMorphsConfigFilter]:
     return None
 
 
+def _get_spacy_pipe_settings_config(
+    is_default: bool = False,
+) -> dict[str, dict[str, int]]:
+    # the settings are a dict of {model name: {setting: value}}
+    if is_default:
+        config_item = get_default_config("spacy_pipe_settings")
+    else:
+        config = get_configs()
+        assert config is not None
+        config_item = config["spacy_pipe_settings"]
+    assert isinstance(config_item, dict)
+
+    for spacy_model_name, pipe_settings in config_item.items():
+        assert isinstance(spacy_model_name, str)
+        assert isinstance(pipe_settings, dict)
+        for setting, value in pipe_settings.items():
+            assert setting in ("batch_size", "n_process")
+            assert isinstance(value, int) and value > 0
+    return config_item
+
+
 def _get_filters_config(is_default: bool = False) -> list[AnkiMorphsConfigFilter]:
     if is_default:
         filters_config = get_default_config("filters")
@@ -1,7 +1,11 @@
+# pylint:disable=too-many-lines
 import os
 import sqlite3
-from collections.abc import Sequence
-from typing import Any, Optional, Union
+import threading
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from types import TracebackType
+from typing import Any, Literal, Optional, Union
 
 from anki.collection import Collection, SearchNode
 from aqt import mw
@@ -10,23 +14,195 @@ from aqt.operations import QueryOp
 from .ankimorphs_config import AnkiMorphsConfig
 from .name_file_utils import get_names_from_file_as_morphs
 
+# Recalc updates the tables in place instead of rebuilding them every time,
+# so the tables have to match what the current code expects. Increment this
+# whenever the schema changes, that way outdated tables are dropped and rebuilt.
+_SCHEMA_VERSION: int = 4
+
+# The page cache used during bulk loads, in KiB (the default is 2 MB)
+_BULK_LOAD_CACHE_SIZE: int = 64000
+
+################################################################
+#                      SEEN MORPHS CACHE
+################################################################
+# The reviewer checks the seen morphs for every card it considers,
+# and when a lot of cards are skipped in a row, reloading the
+# Seen_Morphs table every time adds up. The table is therefore
+# loaded into memory once, and the inserts update both the table
+# and the set. Whenever the table is dropped or rebuilt (profile
+# close, undo, marking names as seen) the set is discarded, and
+# the next read loads it again.
+#
+# The reviewer reads the set on a background thread while the
+# rebuild runs on another, so loading and discarding are done
+# under a lock. That way a set that was loaded mid-rebuild is
+# always discarded when the rebuild is done.
+################################################################
+_seen_morphs_lock = threading.Lock()
+_seen_morphs_cache: dict[str, set[int]] = {}  # db path -> morph ids
+
+
+def _discard_seen_morphs_cache() -> None:
+    with _seen_morphs_lock:
+        _seen_morphs_cache.clear()
+
+
+class _Connection(sqlite3.Connection):
+    # During bulk loads all the writes are done in one enclosing transaction,
+    # so the 'with self.con:' blocks in AnkiMorphsDB must not commit.
+    in_bulk_load: bool = False
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> Literal[False]:
+        if self.in_bulk_load:
+            return False
+        return super().__exit__(exc_type, exc_value, traceback)
+
 
 class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
     # A card can have many morphs, morphs can be on many cards,
     # therefore, we need a many-to-many db structure:
     # Cards -> Card_Morph_Map <- Morphs
 
-    def __init__(self) -> None:
-        assert mw is not None
-        assert mw.pm is not None
-        path: str = os.path.join(mw.pm.profileFolder(), "ankimorphs.db")
-        self.con: sqlite3.Connection = sqlite3.connect(path)
+    def __init__(self, path: Optional[str] = None) -> None:
+        if path is None:
+            assert mw is not None
+            assert mw.pm is not None
+            path = os.path.join(mw.pm.profileFolder(), "ankimorphs.db")
+        self.path: str = path
+        self.con: _Connection = _Connection(path)
+
+    @contextmanager
+    def bulk_load(self, rebuild: bool = False) -> Iterator["AnkiMorphsDB"]:
+        ################################################################
+        #                          BULK LOAD
+        ################################################################
+        # Recalc writes a lot of rows at once, which is a lot faster if
+        # it's done in one transaction with a bigger page cache. All the
+        # writes in the 'with' block should use the yielded AnkiMorphsDB.
+        #
+        # With rebuild=True, the tables are built from scratch in a
+        # separate 'shadow' file, and when the block is done, the shadow
+        # is copied over ankimorphs.db in one step with the sqlite backup
+        # api. A crash mid-recalc therefore never leaves a half-written
+        # ankimorphs.db behind, so it's safe to use synchronous=OFF on
+        # the shadow. Without rebuild, the tables are updated in place
+        # in a single WAL transaction, which is rolled back on failure.
+        ################################################################
+        bulk_db: AnkiMorphsDB = self._create_shadow_db() if rebuild else self
+        previous_pragmas = bulk_db._start_bulk_load(is_shadow=rebuild)
+        try:
+            yield bulk_db
+            bulk_db.con.commit()
+            if rebuild:
+                bulk_db.con.backup(self.con)
+                _discard_seen_morphs_cache()
+        except BaseException:
+            bulk_db.con.rollback()
+            raise
+        finally:
+            bulk_db._end_bulk_load(previous_pragmas)
+            if rebuild:
+                bulk_db.con.close()
+                os.remove(bulk_db.path)
+
+    def _create_shadow_db(self) -> "AnkiMorphsDB":
+        shadow_path: str = self.path + ".shadow"
+        if os.path.exists(shadow_path):
+            # left behind by a crash, it's of no use
+            os.remove(shadow_path)
+
+        shadow_db = AnkiMorphsDB(shadow_path)
+        shadow_db.create_all_tables()
+
+        # The morphemizer cache, the known morphs files, and the frequency
+        # files are not derived from the cards, so they have to be carried
+        # over. ATTACH can't be used inside a transaction, which is why this
+        # happens before the bulk load starts.
+        shadow_db.con.execute("ATTACH DATABASE ? AS Current_DB", (self.path,))
+        with shadow_db.con:
+            for table in [
+                "Morphemizer_Cache",
+                "Known_Morphs_Files",
+                "Known_Morphs_File_Morphs",
+                "Frequency_Files",
+                "Frequency_File_Morphs",
+            ]:
+                # using f-string is terrible practice, but the table names are constants
+                shadow_db.con.execute(
+                    f"INSERT INTO {table} SELECT * FROM Current_DB.{table}"
+                )
+        shadow_db.con.execute("DETACH DATABASE Current_DB")
+        return shadow_db
+
+    def _start_bulk_load(self, is_shadow: bool) -> tuple[int, int]:
+        previous_pragmas: tuple[int, int] = (
+            self.con.execute("PRAGMA synchronous").fetchone()[0],
+            self.con.execute("PRAGMA cache_size").fetchone()[0],
+        )
+
+        if is_shadow:
+            self.con.execute("PRAGMA journal_mode = MEMORY")
+            self.con.execute("PRAGMA synchronous = OFF")
+        else:
+            # WAL is persistent, i.e. stored in the db file
+            self.con.execute("PRAGMA journal_mode = WAL")
+            self.con.execute("PRAGMA synchronous = NORMAL")
+
+        # pragma statements can't take parameters
+        self.con.execute(f"PRAGMA cache_size = -{_BULK_LOAD_CACHE_SIZE}")
+        self.con.execute("BEGIN")
+        self.con.in_bulk_load = True
+        return previous_pragmas
+
+    def _end_bulk_load(self, previous_pragmas: tuple[int, int]) -> None:
+        self.con.in_bulk_load = False
+        self.con.execute(f"PRAGMA synchronous = {previous_pragmas[0]}")
+        self.con.execute(f"PRAGMA cache_size = {previous_pragmas[1]}")
 
     def create_all_tables(self) -> None:
+        schema_version: int = self.con.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version != _SCHEMA_VERSION:
+            self.drop_all_tables()
+            with self.con:
+                # pragma statements can't take parameters
+                self.con.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
         self.create_morph_table()
+        self.create_morph_frequency_table()
         self.create_cards_table()
         self.create_card_morph_map_table()
         self.create_seen_morph_table()
+        self.create_notes_table()
+        self.create_highlights_table()
+        self.create_morphemizer_cache_table()
+        self.create_known_morphs_files_tables()
+        self.create_frequency_files_tables()
+
+    def create_indexes(self) -> None:
+        # The primary keys only speed up the lookups by card (or morph),
+        # these indexes are used for the reverse lookups, i.e. morph -> cards,
+        # and the cards of a note type. Updating the indexes row by row is
+        # slower than building them in one go, so recalc calls this after the
+        # tables have been filled instead of the indexes being created with
+        # the tables.
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE INDEX IF NOT EXISTS Card_Morph_Map_Morph_Index
+                    ON Card_Morph_Map (morph_id)
+                    """
+            )
+            self.con.execute(
+                """
+                    CREATE INDEX IF NOT EXISTS Cards_Note_Type_Index
+                    ON Cards (note_type_id)
+                    """
+            )
 
     def create_cards_table(self) -> None:
         with self.con:
@@ -39,7 +215,8 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
                         note_type_id INTEGER,
                         card_type INTEGER,
                         fields TEXT,
-                        tags TEXT
+                        tags TEXT,
+                        learning_interval INTEGER
                     )
                     """
             )
@@ -51,25 +228,45 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
                     CREATE TABLE IF NOT EXISTS Card_Morph_Map
                     (
                         card_id INTEGER,
-                        morph_lemma TEXT,
-                        morph_inflection TEXT,
+                        morph_id INTEGER,
                         FOREIGN KEY(card_id) REFERENCES card(id),
-                        FOREIGN KEY(morph_lemma, morph_inflection) REFERENCES morph(lemma, inflection)
-                        PRIMARY KEY(card_id, morph_lemma, morph_inflection)
-                    )
+                        FOREIGN KEY(morph_id) REFERENCES morph(morph_id)
+                        PRIMARY KEY(card_id, morph_id)
+                    ) WITHOUT ROWID
                     """
             )
 
     def create_morph_table(self) -> None:
+        # The morphs are interned, i.e. every (lemma, inflection) gets an
+        # integer id that the other tables refer to, which is a lot smaller
+        # and faster to join on than the text. AUTOINCREMENT makes sure the
+        # ids of deleted morphs are never reused, since Seen_Morphs can
+        # still refer to them.
         with self.con:
             self.con.execute(
                 """
                     CREATE TABLE IF NOT EXISTS Morphs
                     (
+                        morph_id INTEGER PRIMARY KEY AUTOINCREMENT,
                         lemma TEXT,
                         inflection TEXT,
                         highest_learning_interval INTEGER,
-                        PRIMARY KEY (lemma, inflection)
+                        UNIQUE (lemma, inflection)
+                    )
+                    """
+            )
+
+    def create_morph_frequency_table(self) -> None:
+        # How many cards each morph is on, and its priority when the
+        # collection frequency is used, see rebuild_morph_frequency_table()
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Morph_Frequency
+                    (
+                        morph_id INTEGER PRIMARY KEY,
+                        frequency INTEGER,
+                        priority INTEGER
                     )
                     """
             )
@@ -80,12 +277,109 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
                 """
                     CREATE TABLE IF NOT EXISTS Seen_Morphs
                     (
+                        morph_id INTEGER PRIMARY KEY
+                    )
+                    """
+            )
+
+    def create_notes_table(self) -> None:
+        # Stores what the morphs of a note were extracted from, that way
+        # recalc can skip the notes that have not changed since last time.
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Notes
+                    (
+                        note_id INTEGER PRIMARY KEY ASC,
+                        note_mod INTEGER,
+                        filter_hash TEXT,
+                        expression_hash TEXT
+                    )
+                    """
+            )
+
+    def create_highlights_table(self) -> None:
+        # Stores a hash of what the highlighted field of a card was generated
+        # from, and what it was set to, that way recalc can skip highlighting
+        # the cards where neither the text nor the morph statuses have changed.
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Highlights
+                    (
+                        card_id INTEGER PRIMARY KEY ASC,
+                        highlight_hash TEXT
+                    )
+                    """
+            )
+
+    def create_morphemizer_cache_table(self) -> None:
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Morphemizer_Cache
+                    (
+                        cache_key TEXT PRIMARY KEY,
+                        morphs TEXT,
+                        last_used INTEGER
+                    )
+                    """
+            )
+
+    def create_known_morphs_files_tables(self) -> None:
+        # The parsed contents of the files in the 'known-morphs' folder,
+        # that way recalc only has to read the files that are new or have
+        # changed since last time, see recalc._update_known_morphs_files()
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Known_Morphs_Files
+                    (
+                        file_path TEXT PRIMARY KEY,
+                        file_size INTEGER,
+                        file_mtime INTEGER
+                    )
+                    """
+            )
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Known_Morphs_File_Morphs
+                    (
+                        file_path TEXT,
                         lemma TEXT,
                         inflection TEXT,
-                        PRIMARY KEY (lemma, inflection)
+                        PRIMARY KEY(file_path, lemma, inflection)
+                    ) WITHOUT ROWID
+                    """
+            )
+
+    def create_frequency_files_tables(self) -> None:
+        # The priorities of the morphs in the frequency files, that way the
+        # files only have to be parsed again when they change, see
+        # recalc._get_morph_frequency_file_priority()
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Frequency_Files
+                    (
+                        file_name TEXT PRIMARY KEY,
+                        file_size INTEGER,
+                        file_mtime INTEGER
                     )
                     """
             )
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Frequency_File_Morphs
+                    (
+                        file_name TEXT,
+                        lemma TEXT,
+                        inflection TEXT,
+                        priority INTEGER,
+                        PRIMARY KEY(file_name, lemma, inflection)
+                    ) WITHOUT ROWID
+                    """
+            )
 
     def insert_many_into_card_table(
         self, card_list: list[dict[str, Union[int, str, bool]]]
@@ -93,46 +387,137 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
         with self.con:
             self.con.executemany(
                 """
-                    INSERT OR IGNORE INTO Cards VALUES
+                    INSERT OR REPLACE INTO Cards VALUES
                     (
                        :card_id,
                        :note_id,
                        :note_type_id,
                        :card_type,
                        :fields,
-                       :tags
+                       :tags,
+                       :learning_interval
                     )
                     """,
                 card_list,
             )
 
-    def insert_many_into_morph_table(
-        self, morph_list: list[dict[str, Union[int, str, bool]]]
+    def insert_known_morphs_file(
+        self,
+        file_path: str,
+        file_size: int,
+        file_mtime: int,
+        morphs: list[tuple[str, str]],
     ) -> None:
         with self.con:
+            self.con.execute(
+                """
+                    DELETE FROM Known_Morphs_File_Morphs
+                    WHERE file_path = ?
+                    """,
+                (file_path,),
+            )
+            self.con.execute(
+                """
+                    INSERT OR REPLACE INTO Known_Morphs_Files VALUES (?, ?, ?)
+                    """,
+                (file_path, file_size, file_mtime),
+            )
             self.con.executemany(
                 """
-                    INSERT INTO Morphs 
-                    VALUES
-                    (
-                       :lemma,
-                       :inflection,
-                       :highest_learning_interval
-                    )
+                    INSERT OR IGNORE INTO Known_Morphs_File_Morphs VALUES (?, ?, ?)
+                    """,
+                [(file_path, lemma, inflection) for lemma, inflection in morphs],
+            )
+
+    def delete_known_morphs_files(self, file_paths: list[str]) -> None:
+        with self.con:
+            self.con.executemany(
+                """
+                    DELETE FROM Known_Morphs_File_Morphs
+                    WHERE file_path = ?
+                    """,
+                [(file_path,) for file_path in file_paths],
+            )
+            self.con.executemany(
+                """
+                    DELETE FROM Known_Morphs_Files
+                    WHERE file_path = ?
+                    """,
+                [(file_path,) for file_path in file_paths],
+            )
+
+    def insert_known_morphs_files_into_morph_table(
+        self, highest_learning_interval: int
+    ) -> None:
+        # 'WHERE true' is needed for sqlite to parse the upsert of a SELECT
+        with self.con:
+            self.con.execute(
+                """
+                    INSERT INTO Morphs (lemma, inflection, highest_learning_interval)
+                    SELECT DISTINCT lemma, inflection, ?
+                    FROM Known_Morphs_File_Morphs
+                    WHERE true
                     ON CONFLICT(lemma, inflection) DO UPDATE SET
-                        highest_learning_interval = :highest_learning_interval
-                    WHERE highest_learning_interval < :highest_learning_interval
-                """,
-                morph_list,
+                        highest_learning_interval = excluded.highest_learning_interval
+                    WHERE highest_learning_interval < excluded.highest_learning_interval
+                    """,
+                (highest_learning_interval,),
+            )
+
+    def insert_frequency_file(
+        self,
+        file_name: str,
+        file_size: int,
+        file_mtime: int,
+        morph_priorities: list[tuple[str, str, int]],
+    ) -> None:
+        # If a morph is in the file more than once, the last priority is used
+        with self.con:
+            self.con.execute(
+                """
+                    DELETE FROM Frequency_File_Morphs
+                    WHERE file_name = ?
+                    """,
+                (file_name,),
+            )
+            self.con.execute(
+                """
+                    INSERT OR REPLACE INTO Frequency_Files VALUES (?, ?, ?)
+                    """,
+                (file_name, file_size, file_mtime),
+            )
+            self.con.executemany(
+                """
+                    INSERT OR REPLACE INTO Frequency_File_Morphs VALUES (?, ?, ?, ?)
+                    """,
+                [
+                    (file_name, lemma, inflection, priority)
+                    for lemma, inflection, priority in morph_priorities
+                ],
             )
 
     def insert_many_into_card_morph_map_table(
-        self, card_morph_list: list[dict[str, Union[int, str, bool]]]
+        self, card_morph_list: list[dict[str, Any]]
     ) -> None:
+        # The rows are staged in a temporary table, that way the morphs that
+        # are not in the Morphs table yet can be added first, which gives
+        # them an id, and the ids can then be looked up with a join. The
+        # learning intervals of the new morphs are set when the Morphs
+        # table is rebuilt.
         with self.con:
+            self.con.execute(
+                """
+                    CREATE TEMP TABLE IF NOT EXISTS Staged_Card_Morphs
+                    (
+                        card_id INTEGER,
+                        lemma TEXT,
+                        inflection TEXT
+                    )
+                    """
+            )
             self.con.executemany(
                 """
-                    INSERT OR IGNORE INTO Card_Morph_Map VALUES
+                    INSERT INTO temp.Staged_Card_Morphs VALUES
                     (
                        :card_id,
                        :morph_lemma,
@@ -141,58 +526,539 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
                     """,
                 card_morph_list,
             )
+            self.con.execute(
+                """
+                    INSERT OR IGNORE INTO Morphs (lemma, inflection, highest_learning_interval)
+                    SELECT DISTINCT lemma, inflection, 0
+                    FROM temp.Staged_Card_Morphs
+                    """
+            )
+            self.con.execute(
+                """
+                    INSERT OR IGNORE INTO Card_Morph_Map (card_id, morph_id)
+                    SELECT Staged_Card_Morphs.card_id, Morphs.morph_id
+                    FROM temp.Staged_Card_Morphs
+                    INNER JOIN Morphs ON
+                        Staged_Card_Morphs.lemma = Morphs.lemma AND Staged_Card_Morphs.inflection = Morphs.inflection
+                    """
+            )
+            self.con.execute("DELETE FROM temp.Staged_Card_Morphs")
 
-    def get_readable_card_morphs(self, card_id: int) -> list[tuple[str, str]]:
-        card_morphs: list[tuple[str, str]] = []
+    def insert_many_into_notes_table(
+        self, note_list: list[dict[str, Union[int, str]]]
+    ) -> None:
+        with self.con:
+            self.con.executemany(
+                """
+                    INSERT OR REPLACE INTO Notes VALUES
+                    (
+                       :note_id,
+                       :note_mod,
+                       :filter_hash,
+                       :expression_hash
+                    )
+                    """,
+                note_list,
+            )
 
+    def insert_many_into_highlights_table(
+        self, highlight_list: list[dict[str, Union[int, str]]]
+    ) -> None:
         with self.con:
-            card_morphs_raw = self.con.execute(
+            self.con.executemany(
                 """
-                    SELECT morph_lemma, morph_inflection
-                    FROM Card_Morph_Map
-                    WHERE card_id = ?
+                    INSERT OR REPLACE INTO Highlights VALUES
+                    (
+                       :card_id,
+                       :highlight_hash
+                    )
                     """,
-                (card_id,),
+                highlight_list,
+            )
+
+    def insert_many_into_morphemizer_cache_table(
+        self, cache_list: list[dict[str, Union[int, str]]]
+    ) -> None:
+        with self.con:
+            self.con.executemany(
+                """
+                    INSERT OR REPLACE INTO Morphemizer_Cache VALUES
+                    (
+                       :cache_key,
+                       :morphs,
+                       :last_used
+                    )
+                    """,
+                cache_list,
+            )
+
+    def get_morphemizer_cache_entries(self, cache_keys: list[str]) -> dict[str, str]:
+        cache_entries: dict[str, str] = {}
+
+        # sqlite has a limit on the number of parameters in a query,
+        # so we have to look up the keys in batches.
+        batch_size = 500
+
+        with self.con:
+            for index in range(0, len(cache_keys), batch_size):
+                batch = cache_keys[index : index + batch_size]
+                placeholders = ", ".join("?" * len(batch))
+                cache_entries_raw = self.con.execute(
+                    f"""
+                        SELECT cache_key, morphs
+                        FROM Morphemizer_Cache
+                        WHERE cache_key IN ({placeholders})
+                        """,
+                    batch,
+                ).fetchall()
+
+                for row in cache_entries_raw:
+                    cache_entries[row[0]] = row[1]
+
+        return cache_entries
+
+    def update_morphemizer_cache_last_used(
+        self, cache_keys: list[str], last_used: int
+    ) -> None:
+        with self.con:
+            self.con.executemany(
+                """
+                    UPDATE Morphemizer_Cache
+                    SET last_used = ?
+                    WHERE cache_key = ?
+                    """,
+                [(last_used, cache_key) for cache_key in cache_keys],
+            )
+
+    def evict_from_morphemizer_cache(self, max_entries: int) -> None:
+        # removes the least recently used entries
+        with self.con:
+            self.con.execute(
+                """
+                    DELETE FROM Morphemizer_Cache
+                    WHERE cache_key IN (
+                        SELECT cache_key
+                        FROM Morphemizer_Cache
+                        ORDER BY last_used DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                    """,
+                (max_entries,),
+            )
+
+    def get_notes_fingerprints(
+        self, note_ids: Sequence[int]
+    ) -> dict[int, tuple[int, str, str]]:
+        notes_fingerprints: dict[int, tuple[int, str, str]] = {}
+
+        # sqlite has a limit on the number of parameters in a query,
+        # so we have to look up the notes in batches.
+        batch_size = 500
+
+        with self.con:
+            for index in range(0, len(note_ids), batch_size):
+                batch = note_ids[index : index + batch_size]
+                placeholders = ", ".join("?" * len(batch))
+                notes_raw = self.con.execute(
+                    f"""
+                        SELECT note_id, note_mod, filter_hash, expression_hash
+                        FROM Notes
+                        WHERE note_id IN ({placeholders})
+                        """,
+                    batch,
+                ).fetchall()
+
+                for row in notes_raw:
+                    notes_fingerprints[row[0]] = (row[1], row[2], row[3])
+
+        return notes_fingerprints
+
+    def get_highlight_hashes(
+        self, note_type_id: int, first_card_id: int, last_card_id: int
+    ) -> dict[int, str]:
+        # the card ids are inclusive, see recalc._update_cards_and_notes()
+        with self.con:
+            highlights_raw = self.con.execute(
+                """
+                    SELECT Highlights.card_id, Highlights.highlight_hash
+                    FROM Highlights
+                    INNER JOIN Cards ON
+                        Highlights.card_id = Cards.card_id
+                    WHERE Cards.note_type_id = ?
+                        AND Highlights.card_id BETWEEN ? AND ?
+                    """,
+                (note_type_id, first_card_id, last_card_id),
             ).fetchall()
 
-            for row in card_morphs_raw:
-                card_morphs.append((row[0], row[1]))
+        return dict(highlights_raw)
 
-        return card_morphs
+    def get_known_morphs_files(self) -> dict[str, tuple[int, int]]:
+        with self.con:
+            files_raw = self.con.execute(
+                """
+                    SELECT file_path, file_size, file_mtime
+                    FROM Known_Morphs_Files
+                    """
+            ).fetchall()
 
-    def get_all_morphs_seen_today(self) -> set[str]:
-        self.create_seen_morph_table()
-        card_morphs: set[str] = set("")
+        return {row[0]: (row[1], row[2]) for row in files_raw}
 
+    def get_frequency_file_fingerprint(
+        self, file_name: str
+    ) -> Optional[tuple[int, int]]:
         with self.con:
-            card_morphs_raw = self.con.execute(
+            row = self.con.execute(
                 """
-                    SELECT lemma, inflection
-                    FROM Seen_Morphs
+                    SELECT file_size, file_mtime
+                    FROM Frequency_Files
+                    WHERE file_name = ?
+                    """,
+                (file_name,),
+            ).fetchone()
+
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def get_frequency_file_morph_priorities(self, file_name: str) -> dict[int, int]:
+        # morphs that are not in the collection are never looked up, so we skip them
+        with self.con:
+            priorities_raw = self.con.execute(
+                """
+                    SELECT Morphs.morph_id, Frequency_File_Morphs.priority
+                    FROM Frequency_File_Morphs
+                    INNER JOIN Morphs ON
+                        Frequency_File_Morphs.lemma = Morphs.lemma
+                        AND Frequency_File_Morphs.inflection = Morphs.inflection
+                    WHERE Frequency_File_Morphs.file_name = ?
+                    """,
+                (file_name,),
+            ).fetchall()
+
+        return dict(priorities_raw)
+
+    def get_morph_collection_priorities(self) -> dict[int, int]:
+        with self.con:
+            priorities_raw = self.con.execute(
+                """
+                    SELECT morph_id, priority
+                    FROM Morph_Frequency
                     """
             ).fetchall()
 
+        return dict(priorities_raw)
+
+    def get_card_amount(self, note_type_id: int) -> int:
+        with self.con:
+            result: int = self.con.execute(
+                """
+                    SELECT COUNT(*)
+                    FROM Cards
+                    WHERE note_type_id = ?
+                    """,
+                (note_type_id,),
+            ).fetchone()[0]
+
+        return result
+
+    def has_cards(self) -> bool:
+        with self.con:
+            result: int = self.con.execute(
+                """
+                    SELECT EXISTS (SELECT 1 FROM Cards)
+                    """
+            ).fetchone()[0]
+
+        return result == 1
+
+    def get_cached_card_ids(self, card_ids: Sequence[int]) -> set[int]:
+        # returns the card ids that are in the Cards table
+        return self._get_card_ids_in_table(card_ids, "main.Cards")
+
+    ################################################################
+    #                        HANDLED CARDS
+    ################################################################
+    # Recalc processes the cards in chunks, so the cards and notes
+    # that have been handled are kept track of in temporary tables,
+    # which keeps the memory usage low. When recalc is done, the
+    # cards and notes that have not been handled, i.e. have been
+    # deleted or no longer match any note filters, are removed.
+    ################################################################
+
+    def create_handled_tables(self) -> None:
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TEMP TABLE IF NOT EXISTS Handled_Cards
+                    (
+                        card_id INTEGER PRIMARY KEY
+                    )
+                    """
+            )
+            self.con.execute(
+                """
+                    CREATE TEMP TABLE IF NOT EXISTS Handled_Notes
+                    (
+                        note_id INTEGER PRIMARY KEY
+                    )
+                    """
+            )
+            self.con.execute("DELETE FROM temp.Handled_Cards")
+            self.con.execute("DELETE FROM temp.Handled_Notes")
+
+    def mark_as_handled(self, card_ids: Sequence[int], note_ids: Sequence[int]) -> None:
+        with self.con:
+            self.con.executemany(
+                """
+                    INSERT OR IGNORE INTO temp.Handled_Cards VALUES (?)
+                    """,
+                [(card_id,) for card_id in card_ids],
+            )
+            self.con.executemany(
+                """
+                    INSERT OR IGNORE INTO temp.Handled_Notes VALUES (?)
+                    """,
+                [(note_id,) for note_id in note_ids],
+            )
+
+    def get_handled_card_ids(self, card_ids: Sequence[int]) -> set[int]:
+        return self._get_card_ids_in_table(card_ids, "temp.Handled_Cards")
+
+    def delete_unhandled_cards_and_notes(self) -> None:
+        with self.con:
+            self.con.execute(
+                """
+                    DELETE FROM Card_Morph_Map
+                    WHERE card_id IN (
+                        SELECT card_id
+                        FROM Cards
+                        WHERE card_id NOT IN (
+                            SELECT card_id
+                            FROM temp.Handled_Cards
+                        )
+                    )
+                    """
+            )
+            self.con.execute(
+                """
+                    DELETE FROM Cards
+                    WHERE card_id NOT IN (
+                        SELECT card_id
+                        FROM temp.Handled_Cards
+                    )
+                    """
+            )
+            self.con.execute(
+                """
+                    DELETE FROM Highlights
+                    WHERE card_id NOT IN (
+                        SELECT card_id
+                        FROM temp.Handled_Cards
+                    )
+                    """
+            )
+            self.con.execute(
+                """
+                    DELETE FROM Notes
+                    WHERE note_id NOT IN (
+                        SELECT note_id
+                        FROM temp.Handled_Notes
+                    )
+                    """
+            )
+
+    def _get_card_ids_in_table(self, card_ids: Sequence[int], table: str) -> set[int]:
+        with self.con:
+            self._fill_searched_cards_table(card_ids)
+            # using f-string is fine here, the table is never user input
+            card_ids_raw = self.con.execute(
+                f"""
+                    SELECT Searched_Cards.card_id
+                    FROM temp.Searched_Cards
+                    INNER JOIN {table} ON
+                        {table}.card_id = Searched_Cards.card_id
+                    """
+            ).fetchall()
+
+        return {row[0] for row in card_ids_raw}
+
+    def delete_card_morph_map_of_cards(self, card_ids: list[int]) -> None:
+        with self.con:
+            self.con.executemany(
+                """
+                    DELETE FROM Card_Morph_Map
+                    WHERE card_id = ?
+                    """,
+                [(card_id,) for card_id in card_ids],
+            )
+
+    def rebuild_morph_table(self, keep_known_morphs_files_morphs: bool = False) -> None:
+        # The learning intervals of cards change all the time without their
+        # notes being modified, so instead of patching the morphs one by one
+        # we aggregate them again from the cards, which is fast in sqlite.
+        # The morphs are kept (instead of being deleted and inserted again)
+        # so their ids stay the same, only the morphs that are no longer
+        # found on any cards are removed.
+        #
+        # The morphs of the known morphs files are upserted right after
+        # this (see insert_known_morphs_files_into_morph_table), so they are
+        # kept as well, otherwise they would get new ids on every recalc.
+        # Until then their highest learning interval is 0.
+        #
+        # Note: this relies on Card_Morph_Map_Morph_Index, so the indexes
+        # have to be created before this is called.
+        known_morphs_files_condition: str = ""
+        if keep_known_morphs_files_morphs:
+            known_morphs_files_condition = """
+                    AND (lemma, inflection) NOT IN (
+                        SELECT lemma, inflection
+                        FROM Known_Morphs_File_Morphs
+                    )"""
+        with self.con:
+            self.con.execute(
+                f"""
+                    DELETE FROM Morphs
+                    WHERE morph_id NOT IN (
+                        SELECT morph_id
+                        FROM Card_Morph_Map
+                    ){known_morphs_files_condition}
+                    """
+            )
+            self.con.execute(
+                """
+                    UPDATE Morphs
+                    SET highest_learning_interval = COALESCE((
+                        SELECT MAX(Cards.learning_interval)
+                        FROM Card_Morph_Map
+                        INNER JOIN Cards ON
+                            Card_Morph_Map.card_id = Cards.card_id
+                        WHERE Card_Morph_Map.morph_id = Morphs.morph_id
+                    ), 0)
+                    """
+            )
+
+    def rebuild_morph_frequency_table(self) -> None:
+        # The most frequent morph gets priority 0, and morphs with the same
+        # frequency are ordered by lemma and inflection. This only depends on
+        # Card_Morph_Map, so it's rebuilt right after the Morphs table.
+        #
+        # Note: this relies on Card_Morph_Map_Morph_Index for the GROUP BY.
+        with self.con:
+            self.con.execute("DELETE FROM Morph_Frequency")
+            self.con.execute(
+                """
+                    INSERT INTO Morph_Frequency (morph_id, frequency, priority)
+                    SELECT
+                        Card_Morph_Map.morph_id,
+                        COUNT(*),
+                        ROW_NUMBER() OVER (
+                            ORDER BY COUNT(*) DESC, Morphs.lemma, Morphs.inflection
+                        ) - 1
+                    FROM Card_Morph_Map
+                    INNER JOIN Morphs ON
+                        Card_Morph_Map.morph_id = Morphs.morph_id
+                    GROUP BY Card_Morph_Map.morph_id
+                    """
+            )
+
+    def rebuild_card_unknown_morphs_table(self) -> None:
+        # The reviewer looks up the unknown morphs of every new card it
+        # considers, so they are stored per card instead of joining
+        # Card_Morph_Map with Morphs for each card. The unknown morphs only
+        # change on recalc, which calls this after the Morphs table has been
+        # updated. The table is created here, instead of in create_all_tables,
+        # so it never exists without being filled, see
+        # get_unknown_morphs_of_card().
+        with self.con:
+            self.con.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS Card_Unknown_Morphs
+                    (
+                        card_id INTEGER,
+                        morph_id INTEGER,
+                        PRIMARY KEY(card_id, morph_id)
+                    ) WITHOUT ROWID
+                    """
+            )
+            self.con.execute("DELETE FROM Card_Unknown_Morphs")
+            self.con.execute(
+                """
+                    INSERT INTO Card_Unknown_Morphs (card_id, morph_id)
+                    SELECT Card_Morph_Map.card_id, Card_Morph_Map.morph_id
+                    FROM Card_Morph_Map
+                    INNER JOIN Morphs ON
+                        Card_Morph_Map.morph_id = Morphs.morph_id
+                    WHERE Morphs.highest_learning_interval = 0
+                    """
+            )
+
+    def get_readable_card_morphs(self, card_id: int) -> list[tuple[str, str]]:
+        card_morphs: list[tuple[str, str]] = []
+
+        with self.con:
+            card_morphs_raw = self.con.execute(
+                """
+                    SELECT Morphs.lemma, Morphs.inflection
+                    FROM Card_Morph_Map
+                    INNER JOIN Morphs ON
+                        Card_Morph_Map.morph_id = Morphs.morph_id
+                    WHERE Card_Morph_Map.card_id = ?
+                    ORDER BY Morphs.lemma, Morphs.inflection
+                    """,
+                (card_id,),
+            ).fetchall()
+
             for row in card_morphs_raw:
-                card_morphs.add(row[0] + row[1])
+                card_morphs.append((row[0], row[1]))
 
         return card_morphs
 
+    def get_all_morphs_seen_today(self) -> set[int]:
+        # The returned set is shared with the cache, so it must not be modified
+        with _seen_morphs_lock:
+            seen_morphs: Optional[set[int]] = _seen_morphs_cache.get(self.path)
+            if seen_morphs is None:
+                self.create_seen_morph_table()
+                with self.con:
+                    seen_morphs = {
+                        row[0]
+                        for row in self.con.execute(
+                            """
+                                SELECT morph_id
+                                FROM Seen_Morphs
+                                """
+                        )
+                    }
+                _seen_morphs_cache[self.path] = seen_morphs
+        return seen_morphs
+
     def update_seen_morphs_today_single_card(self, card_id: int) -> None:
         with self.con:
-            self.con.execute(
+            card_morphs: list[tuple[int]] = self.con.execute(
                 """
-                    INSERT OR IGNORE INTO Seen_Morphs (lemma, inflection)
-                    SELECT morph_lemma, morph_inflection
+                    SELECT morph_id
                     FROM Card_Morph_Map
                     WHERE card_id = ?
                     """,
                 (card_id,),
+            ).fetchall()
+            self.con.executemany(
+                """
+                    INSERT OR IGNORE INTO Seen_Morphs (morph_id)
+                    VALUES (?)
+                    """,
+                card_morphs,
             )
 
+        with _seen_morphs_lock:
+            seen_morphs: Optional[set[int]] = _seen_morphs_cache.get(self.path)
+            if seen_morphs is not None:
+                seen_morphs.update(row[0] for row in card_morphs)
+
     def get_morphs_of_card(
         self, card_id: int, search_unknowns: bool = False
-    ) -> Optional[set[tuple[str, str]]]:
-        morphs: set[tuple[str, str]] = set()
+    ) -> Optional[set[int]]:
+        morphs: set[int] = set()
 
         if search_unknowns:
             where_query_string = "WHERE Card_Morph_Map.card_id = ? AND Morphs.highest_learning_interval = 0"
@@ -202,17 +1068,42 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
         with self.con:
             card_morphs = self.con.execute(
                 """
-                    SELECT DISTINCT morph_lemma, morph_inflection
+                    SELECT DISTINCT Morphs.morph_id
                     FROM Card_Morph_Map
                     INNER JOIN Morphs ON
-                        Card_Morph_Map.morph_lemma = Morphs.lemma AND Card_Morph_Map.morph_inflection = Morphs.inflection
+                        Card_Morph_Map.morph_id = Morphs.morph_id
                     """
                 + where_query_string,
                 (card_id,),
             ).fetchall()
 
             for card_morph in card_morphs:
-                morphs.add((card_morph[0], card_morph[1]))
+                morphs.add(card_morph[0])
+
+        if len(morphs) == 0:
+            return None
+
+        return morphs
+
+    def get_unknown_morphs_of_card(self, card_id: int) -> Optional[set[int]]:
+        # Same as get_morphs_of_card(card_id, search_unknowns=True), but
+        # with a lookup in the table recalc prepares.
+        try:
+            with self.con:
+                morphs: set[int] = {
+                    row[0]
+                    for row in self.con.execute(
+                        """
+                            SELECT morph_id
+                            FROM Card_Unknown_Morphs
+                            WHERE card_id = ?
+                            """,
+                        (card_id,),
+                    )
+                }
+        except sqlite3.OperationalError:
+            # recalc has not been run since the table was added
+            return self.get_morphs_of_card(card_id, search_unknowns=True)
 
         if len(morphs) == 0:
             return None
@@ -225,38 +1116,39 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
         search_unknowns: bool = False,
         search_lemma_only: bool = False,
     ) -> Optional[set[int]]:
-        # The where_query_string is a necessary hack to overcome the sqlite problem
-        # of not allowing variable length parameters
-
         card_ids: set[int] = set()
-        card_morphs: Optional[set[tuple[str, str]]] = self.get_morphs_of_card(
+        card_morphs: Optional[set[int]] = self.get_morphs_of_card(
             card_id, search_unknowns
         )
         if card_morphs is None:
             return None
 
         if search_lemma_only:
-            where_query_string = "WHERE" + "".join(
-                [f" (morph_lemma = '{morph[0]}') OR" for morph in card_morphs]
-            )
+            query = """
+                SELECT DISTINCT Card_Morph_Map.card_id
+                FROM Card_Morph_Map
+                WHERE Card_Morph_Map.morph_id IN (
+                    SELECT morph_id
+                    FROM Morphs
+                    WHERE lemma IN (
+                        SELECT Morphs.lemma
+                        FROM temp.Searched_Morphs
+                        INNER JOIN Morphs ON
+                            Searched_Morphs.morph_id = Morphs.morph_id
+                    )
+                )
+                """
         else:
-            where_query_string = "WHERE" + "".join(
-                [
-                    f" (morph_lemma = '{morph[0]}' AND morph_inflection = '{morph[1]}') OR"
-                    for morph in card_morphs
-                ]
-            )
-
-        where_query_string = where_query_string[:-3]  # removes last ' OR'
+            query = """
+                SELECT DISTINCT Card_Morph_Map.card_id
+                FROM temp.Searched_Morphs
+                INNER JOIN Card_Morph_Map ON
+                    Card_Morph_Map.morph_id = Searched_Morphs.morph_id
+                """
 
         with self.con:
-            raw_card_ids = self.con.execute(
-                """
-                SELECT DISTINCT card_id
-                FROM Card_Morph_Map
-                """
-                + where_query_string,
-            ).fetchall()
+            self._fill_searched_morphs_table(card_morphs)
+            raw_card_ids = self.con.execute(query).fetchall()
 
             for card_id_raw in raw_card_ids:
                 card_ids.add(card_id_raw[0])
@@ -266,6 +1158,45 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
 
         return card_ids
 
+    def _fill_searched_morphs_table(self, morph_ids: set[int]) -> None:
+        # sqlite does not allow a variable number of parameters in a query,
+        # so instead of building the query with the morphs in it, we put
+        # them in a temporary table (only visible to this connection) and
+        # join on that.
+        self.con.execute(
+            """
+                CREATE TEMP TABLE IF NOT EXISTS Searched_Morphs
+                (
+                    morph_id INTEGER PRIMARY KEY
+                )
+                """
+        )
+        self.con.execute("DELETE FROM temp.Searched_Morphs")
+        self.con.executemany(
+            """
+                INSERT OR IGNORE INTO temp.Searched_Morphs VALUES (?)
+                """,
+            [(morph_id,) for morph_id in morph_ids],
+        )
+
+    def _fill_searched_cards_table(self, card_ids: Sequence[int]) -> None:
+        # see _fill_searched_morphs_table
+        self.con.execute(
+            """
+                CREATE TEMP TABLE IF NOT EXISTS Searched_Cards
+                (
+                    card_id INTEGER PRIMARY KEY
+                )
+                """
+        )
+        self.con.execute("DELETE FROM temp.Searched_Cards")
+        self.con.executemany(
+            """
+                INSERT OR IGNORE INTO temp.Searched_Cards VALUES (?)
+                """,
+            [(card_id,) for card_id in card_ids],
+        )
+
     def get_highest_learning_interval(self, base: str, inflected: str) -> Optional[int]:
         with self.con:
             highest_learning_interval = self.con.execute(
@@ -304,14 +1235,26 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
         with self.con:
             self.con.execute("DROP TABLE IF EXISTS Cards;")
             self.con.execute("DROP TABLE IF EXISTS Morphs;")
+            self.con.execute("DROP TABLE IF EXISTS Morph_Frequency;")
             self.con.execute("DROP TABLE IF EXISTS Card_Morph_Map;")
             self.con.execute("DROP TABLE IF EXISTS Seen_Morphs;")
+            self.con.execute("DROP TABLE IF EXISTS Notes;")
+            self.con.execute("DROP TABLE IF EXISTS Highlights;")
+            self.con.execute("DROP TABLE IF EXISTS Card_Unknown_Morphs;")
+            self.con.execute("DROP TABLE IF EXISTS Morphemizer_Cache;")
+            self.con.execute("DROP TABLE IF EXISTS Known_Morphs_Files;")
+            self.con.execute("DROP TABLE IF EXISTS Known_Morphs_File_Morphs;")
+            self.con.execute("DROP TABLE IF EXISTS Frequency_Files;")
+            self.con.execute("DROP TABLE IF EXISTS Frequency_File_Morphs;")
+        _discard_seen_morphs_cache()
 
     @staticmethod
     def drop_seen_morphs_table() -> None:
         am_db = AnkiMorphsDB()
         with am_db.con:
             am_db.con.execute("DROP TABLE IF EXISTS Seen_Morphs;")
+        am_db.con.close()
+        _discard_seen_morphs_cache()
 
     @staticmethod
     def rebuild_seen_morphs_today() -> None:
@@ -340,26 +1283,23 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
         am_db = AnkiMorphsDB()
         cards_studied_today: Sequence[int] = AnkiMorphsDB.get_new_cards_seen_today()
 
-        where_query_string = ""
-        if len(cards_studied_today) > 0:
-            where_query_string = "WHERE" + "".join(
-                [f" card_id = {card_id} OR" for card_id in cards_studied_today]
-            )
-            where_query_string = where_query_string[:-3]  # removes the last " OR"
-
         am_db.drop_seen_morphs_table()
         am_db.create_seen_morph_table()
 
         with am_db.con:
             # don't insert any morphs if no cards have been studied
-            if where_query_string != "":
+            if len(cards_studied_today) > 0:
+                am_db._fill_searched_cards_table(cards_studied_today)
                 am_db.con.execute(
                     """
-                        INSERT OR IGNORE INTO Seen_Morphs (lemma, inflection)
-                        SELECT morph_lemma, morph_inflection
+                        INSERT OR IGNORE INTO Seen_Morphs (morph_id)
+                        SELECT morph_id
                         FROM Card_Morph_Map
+                        WHERE card_id IN (
+                            SELECT card_id
+                            FROM temp.Searched_Cards
+                        )
                         """
-                    + where_query_string
                 )
         am_db.con.close()
 
@@ -396,17 +1336,23 @@ class AnkiMorphsDB:  # pylint:disable=too-many-public-methods
 
     @staticmethod
     def insert_names_to_seen_morphs() -> None:
+        # Names that are not in the Morphs table can't be on any cards,
+        # so there is no need to mark them as seen.
         name_morphs: list[tuple[str, str]] = get_names_from_file_as_morphs()
         am_db = AnkiMorphsDB()
 
         with am_db.con:
             am_db.con.executemany(
                 """
-                    INSERT OR IGNORE INTO Seen_Morphs VALUES (?, ?)
+                    INSERT OR IGNORE INTO Seen_Morphs (morph_id)
+                    SELECT morph_id
+                    FROM Morphs
+                    WHERE lemma = ? AND inflection = ?
                     """,
                 name_morphs,
             )
         am_db.con.close()
+        _discard_seen_morphs_cache()
 
     @staticmethod
     def get_known_morphs(highest_learning_interval: int) -> list[tuple[str, str]]:
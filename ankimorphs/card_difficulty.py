@@ -0,0 +1,176 @@
+from array import array
+from itertools import accumulate, groupby, repeat
+
+from .ankimorphs_config import AnkiMorphsConfig
+from .ankimorphs_db import AnkiMorphsDB
+
+# Anki stores the 'due' value of cards as a 32-bit integer
+# on the backend, with '2147483647' being the max value before
+# overflow. To prevent overflow when cards are repositioned,
+# we decrement the second digit (from the left) of the max value,
+# which should give plenty of leeway (10^8).
+_DEFAULT_DIFFICULTY: int = 2047483647
+
+_MORPH_UNKNOWN_PENALTY: int = 500000
+
+
+class CardMorphMatrix:
+    ################################################################
+    #                       CARD MORPH MATRIX
+    ################################################################
+    # The morphs of the cards of a note type, stored in a compressed
+    # sparse row (CSR) format: the morphs of the card at row i are
+    # morph_ids[indptr[i]:indptr[i + 1]], sorted by lemma and
+    # inflection. The unknown_flags and learning_flags have the same
+    # layout as morph_ids, so the difficulty of all the cards can be
+    # calculated with a handful of C-level passes over flat buffers
+    # instead of walking Morpheme objects card by card.
+    #
+    # Anki does not ship with numpy, so we use the array module and
+    # bytes instead, which gets us most of the way there.
+    ################################################################
+
+    __slots__ = (
+        "card_ids",
+        "indptr",
+        "morph_ids",
+        "unknown_flags",
+        "learning_flags",
+    )
+
+    def __init__(
+        self, am_db: AnkiMorphsDB, am_config: AnkiMorphsConfig, note_type_id: int
+    ) -> None:
+        # Sorting the morphs (ORDER BY) is crucial to avoid bugs.
+        # The rows are grouped by card, so the lengths of the rows are
+        # counted from the same result, that way they always match.
+        entries = am_db.con.execute(
+            """
+            SELECT Card_Morph_Map.card_id,
+                Card_Morph_Map.morph_id,
+                Morphs.highest_learning_interval = 0,
+                Morphs.highest_learning_interval != 0
+                    AND Morphs.highest_learning_interval <= ?
+            FROM Card_Morph_Map
+            INNER JOIN Cards ON
+                Card_Morph_Map.card_id = Cards.card_id
+            INNER JOIN Morphs ON
+                Card_Morph_Map.morph_id = Morphs.morph_id
+            WHERE Cards.note_type_id = ?
+            ORDER BY Card_Morph_Map.card_id, Morphs.lemma, Morphs.inflection
+            """,
+            (am_config.recalc_interval_for_known, note_type_id),
+        ).fetchall()
+
+        self.card_ids = array("q")
+        self.indptr = array("q", [0])
+        self.morph_ids = array("q")
+        self.unknown_flags: bytes = b""
+        self.learning_flags: bytes = b""
+
+        if len(entries) == 0:
+            return
+
+        entry_card_ids, morph_ids, unknown_flags, learning_flags = zip(*entries)
+        lengths: list[int] = []
+        for card_id, card_entries in groupby(entry_card_ids):
+            self.card_ids.append(card_id)
+            lengths.append(sum(1 for _ in card_entries))
+        self.indptr.extend(accumulate(lengths))
+        self.morph_ids.extend(morph_ids)
+        self.unknown_flags = bytes(unknown_flags)
+        self.learning_flags = bytes(learning_flags)
+
+    def get_card_difficulties(  # pylint:disable=too-many-locals
+        self, am_config: AnkiMorphsConfig, morph_priority: dict[int, int]
+    ) -> dict[int, tuple[int, int, bool]]:
+        ####################################################################################
+        #                                      ALGORITHM
+        ####################################################################################
+        # We want our algorithm to determine difficulty based on the following importance:
+        #     1. If the card has unknown morphs (unknown_morph_penalty)
+        #     2. The priority of the card's morphs (morph_priority_penalty)
+        #
+        # Stated in a different way: one unknown morph must be penalized more than any number
+        # of known morphs with low priorities. To achieve this, we get the constraint:
+        #     unknown_morph_penalty > sum(morph_priority_penalty) #(1.1)
+        #
+        # We need to set some arbitrary limits to make the algorithm practical:
+        #     1. Assume max(morph_priority_penalty) = 50k (a frequency list of 50k morphs) #(2.1)
+        #     2. Limit max(sum(morph_priority_penalty)) = max(morph_priority_penalty) * 10 #(2.2)
+        #
+        # With the equations #(1.1), #(2.1), and #(2.2) we get:
+        #     morph_unknown_penalty = 500,000
+        #
+        # A morph that does not have a priority (e.g. it is not in the frequency file)
+        # resets the sum of the card's morph priorities to morph_unknown_penalty - 1, and
+        # the priorities of the morphs that come after it are added on top. This means the
+        # sum is determined by the last morph without a priority, and the suffix sum after
+        # it, which we get from the prefix sums of the priorities.
+        #
+        # Returns {card_id: (difficulty, number of unknown morphs, has learning morphs)},
+        # cards without morphs are not included and should get _DEFAULT_DIFFICULTY.
+        ####################################################################################
+
+        # C-level gathers of the priorities of all the morphs in the matrix
+        has_priority: bytes = bytes(map(morph_priority.__contains__, self.morph_ids))
+        priority_sums = array(
+            "q",
+            accumulate(
+                map(morph_priority.get, self.morph_ids, repeat(0)),
+                initial=0,
+            ),
+        )
+
+        unknown_flags: bytes = self.unknown_flags
+        learning_flags: bytes = self.learning_flags
+        indptr = self.indptr
+        skip_only_known_morphs_cards: bool = am_config.skip_only_known_morphs_cards
+        max_priority_penalty: int = _MORPH_UNKNOWN_PENALTY - 1
+
+        card_difficulties: dict[int, tuple[int, int, bool]] = {}
+
+        for row, card_id in enumerate(self.card_ids):
+            start: int = indptr[row]
+            end: int = indptr[row + 1]
+
+            unknowns: int = unknown_flags.count(1, start, end)
+            has_learning_morph: bool = learning_flags.find(1, start, end) != -1
+
+            if unknowns == 0 and skip_only_known_morphs_cards:
+                # Move stale cards to the end of the queue
+                card_difficulties[card_id] = (
+                    _DEFAULT_DIFFICULTY,
+                    unknowns,
+                    has_learning_morph,
+                )
+                continue
+
+            last_without_priority: int = has_priority.rfind(0, start, end)
+            if last_without_priority == -1:
+                difficulty = priority_sums[end] - priority_sums[start]
+            else:
+                # Heavily penalizes if a morph is not in frequency file
+                difficulty = (
+                    max_priority_penalty
+                    + priority_sums[end]
+                    - priority_sums[last_without_priority + 1]
+                )
+
+            # Cap morph priority penalties as described in #(2.2)
+            difficulty = min(difficulty, max_priority_penalty)
+            difficulty += unknowns * _MORPH_UNKNOWN_PENALTY
+
+            # cap difficulty to prevent 32-bit integer overflow
+            card_difficulties[card_id] = (
+                min(difficulty, _DEFAULT_DIFFICULTY),
+                unknowns,
+                has_learning_morph,
+            )
+
+        return card_difficulties
+
+
+def get_default_difficulty() -> tuple[int, int, bool]:
+    # card does not have morphs or is buggy in some way
+    return _DEFAULT_DIFFICULTY, 0, False
@@ -0,0 +1,141 @@
+from typing import Optional
+
+from anki.models import FieldDict, ModelManager, NotetypeDict, NotetypeId
+
+from . import ankimorphs_globals, text_highlighting
+from .ankimorphs_config import AnkiMorphsConfig, AnkiMorphsConfigFilter
+from .fingerprint_utils import get_highlight_hash
+from .morpheme import Morpheme
+
+
+def add_extra_fields(
+    config_filter: AnkiMorphsConfigFilter,
+    note_type_id: NotetypeId,
+    model_manager: ModelManager,
+) -> None:
+    note_type_dict: Optional[NotetypeDict] = model_manager.get(note_type_id)
+    assert note_type_dict is not None
+    existing_field_names = model_manager.field_names(note_type_dict)
+    new_field: FieldDict
+
+    if config_filter.extra_unknowns:
+        if ankimorphs_globals.EXTRA_FIELD_UNKNOWNS not in existing_field_names:
+            new_field = model_manager.new_field(ankimorphs_globals.EXTRA_FIELD_UNKNOWNS)
+            model_manager.add_field(note_type_dict, new_field)
+            model_manager.update_dict(note_type_dict)
+
+    if config_filter.extra_unknowns_count:
+        if ankimorphs_globals.EXTRA_FIELD_UNKNOWNS_COUNT not in existing_field_names:
+            new_field = model_manager.new_field(
+                ankimorphs_globals.EXTRA_FIELD_UNKNOWNS_COUNT
+            )
+            model_manager.add_field(note_type_dict, new_field)
+            model_manager.update_dict(note_type_dict)
+
+    if config_filter.extra_highlighted:
+        if ankimorphs_globals.EXTRA_FIELD_HIGHLIGHTED not in existing_field_names:
+            new_field = model_manager.new_field(
+                ankimorphs_globals.EXTRA_FIELD_HIGHLIGHTED
+            )
+            model_manager.add_field(note_type_dict, new_field)
+            model_manager.update_dict(note_type_dict)
+
+    if config_filter.extra_difficulty:
+        if ankimorphs_globals.EXTRA_FIELD_DIFFICULTY not in existing_field_names:
+            new_field = model_manager.new_field(
+                ankimorphs_globals.EXTRA_FIELD_DIFFICULTY
+            )
+            model_manager.add_field(note_type_dict, new_field)
+            model_manager.update_dict(note_type_dict)
+
+
+def get_card_unknown_morphs(
+    card_morph_map_cache: dict[int, list[Morpheme]], card_id: int
+) -> list[Morpheme]:
+    # the morphs are already sorted, so the unknowns are in the same order
+    return [
+        morph
+        for morph in card_morph_map_cache.get(card_id, [])
+        if morph.highest_learning_interval == 0
+    ]
+
+
+def update_unknowns_field(
+    am_config: AnkiMorphsConfig,
+    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
+    fields: list[str],
+    unknowns: list[Morpheme],
+) -> None:
+    focus_morph_string: str
+
+    if am_config.recalc_unknowns_field_shows_inflections:
+        focus_morph_string = "".join(f"{unknown.inflection}, " for unknown in unknowns)
+    else:
+        focus_morph_string = "".join(f"{unknown.lemma}, " for unknown in unknowns)
+
+    focus_morph_string = focus_morph_string[:-2]  # removes last comma and whitespace
+    index: int = note_type_field_name_dict[ankimorphs_globals.EXTRA_FIELD_UNKNOWNS][0]
+    fields[index] = focus_morph_string
+
+
+def update_unknowns_count_field(
+    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
+    fields: list[str],
+    unknowns: int,
+) -> None:
+    index: int = note_type_field_name_dict[
+        ankimorphs_globals.EXTRA_FIELD_UNKNOWNS_COUNT
+    ][0]
+    fields[index] = str(unknowns)
+
+
+def update_difficulty_field(
+    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
+    fields: list[str],
+    difficulty: int,
+) -> None:
+    index: int = note_type_field_name_dict[ankimorphs_globals.EXTRA_FIELD_DIFFICULTY][0]
+    fields[index] = str(difficulty)
+
+
+def update_highlighted_field(  # pylint:disable=too-many-arguments
+    am_config: AnkiMorphsConfig,
+    config_filter: AnkiMorphsConfigFilter,
+    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
+    card_morph_map_cache: dict[int, list[Morpheme]],
+    card_id: int,
+    fields: list[str],
+    highlight_hash: Optional[str],
+) -> Optional[str]:
+    # Returns the new highlight hash of the card if it has changed
+    try:
+        card_morphs: list[Morpheme] = card_morph_map_cache[card_id]
+    except KeyError:
+        # card does not have morphs or is buggy in some way
+        return None
+
+    assert config_filter.field_index is not None
+    text_to_highlight = fields[config_filter.field_index]
+    highlighted_index: int = note_type_field_name_dict[
+        ankimorphs_globals.EXTRA_FIELD_HIGHLIGHTED
+    ][0]
+
+    if highlight_hash is not None and highlight_hash == get_highlight_hash(
+        am_config, card_morphs, text_to_highlight, fields[highlighted_index]
+    ):
+        # the field already has the highlighted text
+        return None
+
+    highlighted_text = text_highlighting.get_highlighted_text(
+        am_config,
+        card_morphs,
+        text_to_highlight,
+    )
+    fields[highlighted_index] = highlighted_text
+
+    new_highlight_hash: str = get_highlight_hash(
+        am_config, card_morphs, text_to_highlight, highlighted_text
+    )
+    if new_highlight_hash == highlight_hash:
+        return None
+    return new_highlight_hash
@@ -0,0 +1,97 @@
+import hashlib
+import uuid
+from typing import Any, Optional
+
+from .ankimorphs_config import AnkiMorphsConfig, AnkiMorphsConfigFilter
+from .morpheme import Morpheme
+from .name_file_utils import get_names_from_file
+from .text_highlighting import get_morph_status
+
+
+def note_has_changed(
+    note_fingerprint: Optional[tuple[int, str, str]],
+    note_mod: int,
+    filter_hash: str,
+    expression_hash: str,
+) -> bool:
+    if note_fingerprint is None:
+        return True  # new note
+
+    cached_mod, cached_filter_hash, cached_expression_hash = note_fingerprint
+
+    if cached_filter_hash != filter_hash:
+        return True
+
+    if cached_mod == note_mod:
+        return False
+
+    return cached_expression_hash != expression_hash
+
+
+def get_preprocess_hash(am_config: AnkiMorphsConfig) -> str:
+    # The preprocess settings affect which morphs are extracted from
+    # the expressions, so if any of them change we have to extract
+    # the morphs from all the notes again.
+    names: list[str] = []
+    if am_config.preprocess_ignore_names_textfile:
+        names = sorted(get_names_from_file())
+
+    return get_hash(
+        am_config.preprocess_ignore_bracket_contents,
+        am_config.preprocess_ignore_round_bracket_contents,
+        am_config.preprocess_ignore_slim_round_bracket_contents,
+        am_config.preprocess_ignore_names_morphemizer,
+        am_config.preprocess_ignore_names_textfile,
+        *names,
+    )
+
+
+def get_filter_hash(
+    preprocess_hash: str,
+    config_filter: AnkiMorphsConfigFilter,
+    morphemizer_key: Optional[str],
+) -> str:
+    # The morphs of the notes also have to be extracted again when the
+    # morphemizer changes, which includes the version of the spaCy model
+    # (see MorphemizerCache.morphemizer_key). If the version is unknown
+    # we can't tell if the model has changed, so the hash is unique to
+    # this recalc, which makes the morphs of all the notes be extracted.
+    if morphemizer_key is None:
+        morphemizer_key = f"unknown: {uuid.uuid4()}"
+
+    return get_hash(
+        preprocess_hash,
+        config_filter.morphemizer_name,
+        config_filter.field_index,
+        morphemizer_key,
+    )
+
+
+def get_highlight_hash(
+    am_config: AnkiMorphsConfig,
+    card_morphs: list[Morpheme],
+    text_to_highlight: str,
+    highlighted_text: str,
+) -> str:
+    # The highlighted text only depends on the text, the morphs and their
+    # statuses, and whether ruby characters are ignored. The highlighted
+    # text itself is included so that the field is highlighted again if
+    # it was changed outside of recalc, e.g. edited by hand.
+    morph_statuses: list[str] = []
+    for morph in card_morphs:
+        morph_statuses.append(morph.inflection)
+        morph_statuses.append(get_morph_status(am_config, morph))
+
+    return get_hash(
+        am_config.preprocess_ignore_bracket_contents,
+        text_to_highlight,
+        highlighted_text,
+        *morph_statuses,
+    )
+
+
+def get_hash(*values: Any) -> str:
+    # python's built-in hash() is randomized between sessions,
+    # so we can't use it for values that are stored in the db.
+    joined_values: str = "\x1f".join(str(value) for value in values)
+    return hashlib.blake2b(joined_values.encode("utf-8"), digest_size=16).hexdigest()
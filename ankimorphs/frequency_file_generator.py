@@ -10,10 +10,13 @@ from aqt.operations import QueryOp
 from aqt.qt import QFileDialog, QMainWindow  # pylint:disable=no-name-in-module
 
 from . import spacy_wrapper
+from .ankimorphs_config import AnkiMorphsConfig
+from .ankimorphs_db import AnkiMorphsDB
 from .exceptions import CancelledOperationException, EmptyFileSelectionException
 from .generator_dialog import GeneratorDialog
-from .morpheme import Morpheme, MorphOccurrence
+from .morpheme import MorphOccurrence
 from .morphemizer import Morphemizer, SpacyMorphemizer
+from .morphemizer_cache import MorphemizerCache
 from .ui.frequency_file_generator_ui import Ui_FrequencyFileGeneratorWindow
 
 
@@ -85,14 +88,19 @@ class FrequencyFileGeneratorDialog(GeneratorDialog):
 
         input_files: list[Path] = self._gather_input_files()
         morph_frequency_dict: dict[str, MorphOccurrence] = {}
-        nlp = None  # spacy.Language
+        spacy_pipeline: Optional[spacy_wrapper.SpacyPipeline] = None
         morphemizer: Morphemizer = self._morphemizers[self.ui.comboBox.currentIndex()]
         assert morphemizer is not None
 
+        am_db = AnkiMorphsDB()
+        morphemizer_cache = MorphemizerCache(am_db, morphemizer.get_description())
+
         if isinstance(morphemizer, SpacyMorphemizer):
             selected: str = self.ui.comboBox.itemText(self.ui.comboBox.currentIndex())
             spacy_model = selected.removeprefix("spaCy: ")
-            nlp = spacy_wrapper.get_nlp(spacy_model)
+            spacy_pipeline = spacy_wrapper.get_spacy_pipeline(
+                spacy_model, AnkiMorphsConfig().get_spacy_pipe_settings(spacy_model)
+            )
 
         for input_file in input_files:
             if mw.progress.want_cancel():  # user clicked 'x'
@@ -106,12 +114,9 @@ class FrequencyFileGeneratorDialog(GeneratorDialog):
             )
 
             with open(input_file, encoding="utf-8") as file:
-                # NB! Never use readlines(), it loads the entire file to memory
-                for counter, line in enumerate(file):
-                    print(f"line: {counter}")
-                    morphs: list[Morpheme] = self._get_morphs_from_line(
-                        morphemizer, nlp, line
-                    )
+                for morphs in self._get_morphs_from_file(
+                    file, morphemizer_cache, morphemizer, spacy_pipeline
+                ):
                     for morph in morphs:
                         key = morph.lemma + morph.inflection
                         if key in morph_frequency_dict:
@@ -119,6 +124,9 @@ class FrequencyFileGeneratorDialog(GeneratorDialog):
                         else:
                             morph_frequency_dict[key] = MorphOccurrence(morph)
 
+        morphemizer_cache.save()
+        am_db.con.close()
+
         sorted_morph_frequency = dict(
             sorted(
                 morph_frequency_dict.items(),
@@ -1,8 +1,10 @@
+import itertools
 import os
 import re
+from collections.abc import Iterator
 from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Optional, Union
+from typing import Any, Callable, Optional, TextIO, Union
 
 import aqt
 from aqt import mw
@@ -13,8 +15,9 @@ from . import ankimorphs_globals, morphemizer, text_preprocessing
 from .exceptions import CancelledOperationException, EmptyFileSelectionException
 from .morpheme import Morpheme
 from .morphemizer import Morphemizer
+from .morphemizer_cache import MorphemizerCache
+from .spacy_wrapper import SpacyPipeline
 from .text_preprocessing import (
-    remove_names_textfile,
     round_brackets_regex,
     slim_round_brackets_regexp,
     square_brackets_regex,
@@ -22,6 +25,8 @@ from .text_preprocessing import (
 from .ui.frequency_file_generator_ui import Ui_FrequencyFileGeneratorWindow
 from .ui.readability_report_generator_ui import Ui_ReadabilityReportGeneratorWindow
 
+_LINES_BATCH_SIZE: int = 1000
+
 
 class GeneratorDialog(QMainWindow):
     # Since there is so much overlap between the frequency file generator and the
@@ -127,47 +132,76 @@ class GeneratorDialog(QMainWindow):
 
         return expression
 
-    def _get_morphs_from_line(  # type: ignore[no-untyped-def]
-        self, _morphemizer: Morphemizer, nlp, line: str
-    ) -> list[Morpheme]:
-        # todo: this is horrible, create a callback or something
-        if nlp is None:
-            return self._get_morphs_from_line_morphemizer(_morphemizer, line)
-        return self._get_morphs_from_line_spacy(nlp, line)
-
-    def _get_morphs_from_line_spacy(self, nlp, line: str) -> list[Morpheme]:  # type: ignore[no-untyped-def]
-        # nlp: spacy.Language
-
-        morphs: list[Morpheme] = []
-        expression = self._filter_expression(line)
-
-        doc = nlp(expression)
+    def _get_morphs_from_file(
+        self,
+        file: TextIO,
+        morphemizer_cache: MorphemizerCache,
+        _morphemizer: Morphemizer,
+        spacy_pipeline: Optional[SpacyPipeline],
+    ) -> Iterator[list[Morpheme]]:
+        # Yields the morphs of every line in the file. The lines are processed
+        # in batches, which makes spacy and the cache lookups much faster.
+        while True:
+            # NB! Never use readlines(), it loads the entire file to memory
+            lines: list[str] = list(itertools.islice(file, _LINES_BATCH_SIZE))
+            if len(lines) == 0:
+                break
+            yield from self._get_morphs_from_lines(
+                lines, morphemizer_cache, _morphemizer, spacy_pipeline
+            )
 
-        for w in doc:
-            if not w.is_alpha:
-                continue
+    def _get_morphs_from_lines(
+        self,
+        lines: list[str],
+        morphemizer_cache: MorphemizerCache,
+        _morphemizer: Morphemizer,
+        spacy_pipeline: Optional[SpacyPipeline],
+    ) -> list[list[Morpheme]]:
+        expressions: list[str] = [self._filter_expression(line) for line in lines]
+        all_morphs: list[Optional[list[Morpheme]]] = morphemizer_cache.get_morphs(
+            expressions
+        )
+        uncached_indexes: list[int] = [
+            index for index, morphs in enumerate(all_morphs) if morphs is None
+        ]
 
-            if self.ui.namesMorphemizerCheckBox.isChecked():
-                if w.pos == 96:  # PROPN
-                    continue
+        uncached_expressions: list[str] = [
+            expressions[index] for index in uncached_indexes
+        ]
 
-            morphs.append(
-                Morpheme(
-                    lemma=w.lemma_,
-                    inflection=w.text,
+        if spacy_pipeline is not None:
+            for index, doc in zip(
+                uncached_indexes, spacy_pipeline.pipe(uncached_expressions)
+            ):
+                morphs = text_preprocessing.get_spacy_morphs(doc)
+                morphemizer_cache.add_morphs(expressions[index], morphs)
+                all_morphs[index] = morphemizer_cache.morph_registry.intern_morphs(
+                    morphs
+                )
+        else:
+            for index, morphs in zip(
+                uncached_indexes,
+                _morphemizer.get_morphemes_from_exprs(uncached_expressions),
+            ):
+                morphemizer_cache.add_morphs(expressions[index], morphs)
+                all_morphs[index] = morphemizer_cache.morph_registry.intern_morphs(
+                    morphs
                 )
-            )
-
-        if self.ui.namesFileCheckBox.isChecked():
-            morphs = remove_names_textfile(morphs)
 
-        return morphs
+        processed_morphs: list[list[Morpheme]] = []
+        for _morphs in all_morphs:
+            assert _morphs is not None
+            processed_morphs.append(
+                self._filter_morphs(_morphs, spacy_pipeline is not None)
+            )
+        return processed_morphs
 
-    def _get_morphs_from_line_morphemizer(
-        self, _morphemizer: Morphemizer, line: str
+    def _filter_morphs(
+        self, morphs: list[Morpheme], is_spacy_morphs: bool
     ) -> list[Morpheme]:
-        expression = self._filter_expression(line)
-        morphs: list[Morpheme] = _morphemizer.get_morphemes_from_expr(expression)
+        if is_spacy_morphs:
+            # this is the same as spacy's token.is_alpha
+            morphs = [morph for morph in morphs if morph.inflection.isalpha()]
         if self.ui.namesMorphemizerCheckBox.isChecked():
             morphs = text_preprocessing.remove_names_morphemizer(morphs)
         if self.ui.namesFileCheckBox.isChecked():
@@ -5,6 +5,7 @@ import os
 import re
 import subprocess
 import sys
+import threading
 from typing import Optional
 
 from .morpheme import Morpheme
@@ -99,18 +100,33 @@ def get_morpheme(  # pylint:disable=too-many-return-statements
 control_chars_re = re.compile("[\x00-\x1f\x7f-\x9f]")
 
 
-def get_morphemes_mecab(expression) -> list[Morpheme]:
-    # HACK: mecab sometimes does not produce the right morphs if there are no extra characters in the expression,
-    # so we just add a whitespace and a japanese punctuation mark "。" the end to prevent the problem.
-    expression += " 。"
+def get_morphemes_mecab(expression, mecab_process=None) -> list[Morpheme]:
+    return get_morphemes_mecab_batch([expression], mecab_process)[0]
 
-    # Remove Unicode control codes before sending to MeCab.
-    expression = control_chars_re.sub("", expression)
 
-    _morphs = [get_morpheme(m.split("\t")) for m in interact(expression).split("\r")]
-
-    _morphs = [_morph for _morph in _morphs if _morph is not None]
-    return _morphs
+def get_morphemes_mecab_batch(
+    expressions: list[str], mecab_process: Optional[subprocess.Popen[bytes]] = None
+) -> list[list[Morpheme]]:
+    """Returns the morphemes of each of the expressions, in the same order as the expressions.
+    All the expressions are sent to mecab at once, which is a lot faster than sending them one by one.
+    """
+    mecab_expressions = []
+    for expression in expressions:
+        # HACK: mecab sometimes does not produce the right morphs if there are no extra characters in the expression,
+        # so we just add a whitespace and a japanese punctuation mark "。" the end to prevent the problem.
+        expression += " 。"
+
+        # Remove Unicode control codes before sending to MeCab. This also removes
+        # newlines, so each expression produces exactly one line of output.
+        mecab_expressions.append(control_chars_re.sub("", expression))
+
+    morphs_of_expressions = []
+    for output in interact_batch(mecab_expressions, mecab_process):
+        _morphs = [get_morpheme(m.split("\t")) for m in output.split("\r")]
+        morphs_of_expressions.append(
+            [_morph for _morph in _morphs if _morph is not None]
+        )
+    return morphs_of_expressions
 
 
 # [Str] -> subprocess.STARTUPINFO -> IO MecabProc
@@ -185,11 +201,19 @@ def spawn_mecab(base_cmd, startupinfo):
 
 
 @functools.cache
-def mecab():  # pylint: disable=too-many-branches,too-many-statements
+def mecab():
     """Start a MeCab subprocess and return it.
     `mecab` reads expressions from stdin at runtime, so only one
     instance is needed.  That's why this function is memoized.
     """
+    return start_mecab()
+
+
+def start_mecab() -> tuple[subprocess.Popen[bytes], str]:
+    """Start a new MeCab subprocess, this is used directly when
+    multiple instances are needed, e.g. by the recalc workers.
+    """
+    # pylint: disable=too-many-branches,too-many-statements
 
     global mecab_source  # make it global so we can query it later  # pylint: disable=global-statement
 
@@ -220,22 +244,48 @@ def mecab():  # pylint: disable=too-many-branches,too-many-statements
     )
 
 
-def interact(expr):  # Str -> IO Str
+def interact(expr, mecab_process=None):  # Str -> IO Str
     """ "interacts" with 'mecab' command: writes expression to stdin of 'mecab' process and gets all the morpheme
     info from its stdout."""
-    mecab_process, _ = mecab()
-    expr = expr.encode(mecab_encoding, "ignore")
+    return interact_batch([expr], mecab_process)[0]
+
+
+def interact_batch(
+    exprs: list[str], mecab_process: Optional[subprocess.Popen[bytes]] = None
+) -> list[str]:
+    """Writes all the expressions to stdin of the 'mecab' process in one go, and returns one line of
+    output per expression (mecab terminates the output of each expression with the EOS format '\\n').
+
+    mecab writes its output while it is still reading the input, so if we only read stdout after writing
+    everything, both pipe buffers can fill up and the processes would wait on each other forever.
+    The output is therefore read on a separate thread while the input is being written.
+    """
+    if len(exprs) == 0:
+        return []
+
+    if mecab_process is None:
+        mecab_process, _ = mecab()
+
+    encoding = mecab_encoding
+    stdin = mecab_process.stdin
+    stdout = mecab_process.stdout
+    assert encoding is not None and stdin is not None and stdout is not None
 
     # The line terminator is always b'\n' for binary files: https://docs.python.org/3/library/io.html#io.IOBase
-    mecab_process.stdin.write(expr + b"\n")
-    # The buffer will be written out to the underlying RawIOBase object when flush() is called
-    mecab_process.stdin.flush()
-    mecab_process.stdout.flush()
+    encoded_exprs: list[bytes] = [expr.encode(encoding, "ignore") for expr in exprs]
+    output_lines: list[str] = []
+
+    def read_output() -> None:
+        for _ in range(len(encoded_exprs)):
+            line = stdout.readline()
+            output_lines.append(str(line.rstrip(b"\r\n"), encoding))
 
-    entire_output = ""
-    lines_to_read = len(expr.split(b"\n"))
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
 
-    for line in mecab_process.stdout.readlines(lines_to_read):
-        entire_output += str(line.rstrip(b"\r\n"), mecab_encoding)
+    stdin.write(b"\n".join(encoded_exprs) + b"\n")
+    # The buffer will be written out to the underlying RawIOBase object when flush() is called
+    stdin.flush()
 
-    return entire_output
+    reader.join()
+    return output_lines
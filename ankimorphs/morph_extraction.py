@@ -0,0 +1,101 @@
+from typing import Callable, Optional
+
+from . import spacy_wrapper
+from .ankimorphs_config import AnkiMorphsConfig, AnkiMorphsConfigFilter
+from .morpheme import Morpheme
+from .morphemizer import SpacyMorphemizer, get_morphemizer_by_name
+from .morphemizer_cache import MorphemizerCache
+from .text_preprocessing import (
+    filter_morphemizer_morphs,
+    filter_spacy_morphs,
+    get_spacy_morphs,
+)
+
+
+def get_morphs_from_expressions(  # pylint:disable=too-many-locals
+    am_config: AnkiMorphsConfig,
+    config_filter: AnkiMorphsConfigFilter,
+    morphemizer_cache: MorphemizerCache,
+    expressions: list[str],
+    update_progress: Callable[[int, int], None],
+) -> list[set[Morpheme]]:
+    ################################################################
+    #                       MORPH EXTRACTION
+    ################################################################
+    # Returns the filtered morphs of the expressions, in the same
+    # order as the expressions.
+    #
+    # The morphemizers are only used on the expressions that are not
+    # already in the morphemizer cache. The remaining expressions
+    # can be split across multiple workers (see 'spacy_pipe_settings'
+    # and 'recalc_morphemizer_workers'), but the morphs are always
+    # returned in the same order regardless of the number of workers,
+    # so the output of recalc is reproducible.
+    #
+    # update_progress is called with (counter, max_value) for every
+    # expression that is morphemized, and it can raise an exception
+    # to cancel the extraction.
+    #
+    # The new morphs are added to the morphemizer_cache, but it's up
+    # to the caller to save it.
+    ################################################################
+
+    if len(expressions) == 0:
+        # e.g. none of the notes have changed since the last recalc
+        return []
+
+    all_morphs: list[Optional[list[Morpheme]]] = morphemizer_cache.get_morphs(
+        expressions
+    )
+    uncached_indexes: list[int] = [
+        index for index, morphs in enumerate(all_morphs) if morphs is None
+    ]
+    uncached_text: list[str] = [expressions[index] for index in uncached_indexes]
+    uncached_amount = len(uncached_indexes)
+
+    spacy_pipeline: Optional[spacy_wrapper.SpacyPipeline] = None
+    morphemizer = get_morphemizer_by_name(config_filter.morphemizer_name)
+    assert morphemizer is not None
+    is_spacy: bool = isinstance(morphemizer, SpacyMorphemizer)
+
+    if is_spacy and uncached_amount > 0:
+        spacy_model = config_filter.morphemizer_description.removeprefix("spaCy: ")
+        spacy_pipeline = spacy_wrapper.get_spacy_pipeline(
+            spacy_model, am_config.get_spacy_pipe_settings(spacy_model)
+        )
+
+    # Since function overloading isn't a thing in python, we use
+    # this ugly branching with near identical code. An alternative
+    # approach of using variable number of arguments (*args) would
+    # require an extra function call, so this is faster.
+    if spacy_pipeline is not None:
+        for counter, doc in enumerate(spacy_pipeline.pipe(uncached_text)):
+            update_progress(counter, uncached_amount)
+            index = uncached_indexes[counter]
+            morphs = get_spacy_morphs(doc)
+            morphemizer_cache.add_morphs(expressions[index], morphs)
+            all_morphs[index] = morphemizer_cache.morph_registry.intern_morphs(morphs)
+    else:
+        for counter, morphs in enumerate(
+            morphemizer.get_morphemes_from_exprs(
+                uncached_text, am_config.recalc_morphemizer_workers
+            )
+        ):
+            update_progress(counter, uncached_amount)
+            index = uncached_indexes[counter]
+            morphemizer_cache.add_morphs(expressions[index], morphs)
+            all_morphs[index] = morphemizer_cache.morph_registry.intern_morphs(morphs)
+
+    # We don't want to store duplicate morphs because it can lead
+    # to the same morph being counted twice, which is bad for the
+    # difficulty algorithm. We therefore convert the lists of morphs
+    # we receive from the morphemizers into sets.
+    filtered_morphs: list[set[Morpheme]] = []
+    for _morphs in all_morphs:
+        assert _morphs is not None
+        if is_spacy:
+            filtered_morphs.append(set(filter_spacy_morphs(am_config, _morphs)))
+        else:
+            filtered_morphs.append(set(filter_morphemizer_morphs(am_config, _morphs)))
+
+    return filtered_morphs
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Optional
 
 
 class Morpheme:
@@ -8,7 +8,8 @@ class Morpheme:
         "part_of_speech",
         "sub_part_of_speech",
         "highest_learning_interval",
-        "lemma_and_inflection",
+        "morph_id",
+        "_hash",
     )
 
     def __init__(  # pylint:disable=too-many-arguments
@@ -18,6 +19,7 @@ class Morpheme:
         part_of_speech: str = "",
         sub_part_of_speech: str = "",
         highest_learning_interval: Optional[int] = None,
+        morph_id: Optional[int] = None,
     ):
         """
         Lemma: dictionary form, e.g.: break
@@ -25,6 +27,7 @@ class Morpheme:
         Part of speech: grammatical category, e.g.: nouns, verb.
         Sub Part of speech: no idea, probably more fine-grained categories. Used by Mecab.
         Highest Learning Interval: used to determine the 'known' status of the morph.
+        Morph ID: the id of the morph in ankimorphs.db, used as a cheap lookup key.
         """
         # mecab uses pos and sub_pos to determine proper nouns.
 
@@ -33,24 +36,74 @@ class Morpheme:
         self.part_of_speech = part_of_speech  # determined by mecab tool. for example: u'動詞' or u'助動詞', u'形容詞'
         self.sub_part_of_speech = sub_part_of_speech
         self.highest_learning_interval: Optional[int] = highest_learning_interval
-        self.lemma_and_inflection: str = self.lemma + self.inflection
+        self.morph_id: Optional[int] = morph_id
+
+        # morphs are hashed a lot (sets, dicts), and the lemma and
+        # inflection never change, so the hash is only computed once
+        self._hash: int = hash((lemma, inflection))
 
     def __eq__(self, other: object) -> bool:
         assert isinstance(other, Morpheme)
-        return all(
-            [
-                self.lemma == other.lemma,
-                self.inflection == other.inflection,
-            ]
-        )
+        return self.lemma == other.lemma and self.inflection == other.inflection
 
     def __hash__(self) -> int:
-        return hash((self.lemma, self.inflection))
+        return self._hash
 
     def is_proper_noun(self) -> bool:
         return self.sub_part_of_speech == "固有名詞" or self.part_of_speech == "PROPN"
 
 
+class MorphemeRegistry:
+    # Interns the morphs, i.e. equal morphs are only created once and
+    # the same instance is returned every time after that. A common
+    # morph can be on tens of thousands of cards, so this saves a lot
+    # of memory, and set and dict lookups of the same instance are
+    # faster since they don't have to compare the strings.
+    #
+    # Note: the morphs are shared, so they must not be modified.
+    __slots__ = ("_morphs",)
+
+    def __init__(self) -> None:
+        self._morphs: dict[tuple[Any, ...], Morpheme] = {}
+
+    def get_morph(  # pylint:disable=too-many-arguments
+        self,
+        lemma: str,
+        inflection: str,
+        part_of_speech: str = "",
+        sub_part_of_speech: str = "",
+        highest_learning_interval: Optional[int] = None,
+        morph_id: Optional[int] = None,
+    ) -> Morpheme:
+        key = (
+            lemma,
+            inflection,
+            part_of_speech,
+            sub_part_of_speech,
+            highest_learning_interval,
+            morph_id,
+        )
+        try:
+            return self._morphs[key]
+        except KeyError:
+            morph = Morpheme(*key)
+            self._morphs[key] = morph
+            return morph
+
+    def intern_morphs(self, morphs: list[Morpheme]) -> list[Morpheme]:
+        return [
+            self.get_morph(
+                morph.lemma,
+                morph.inflection,
+                morph.part_of_speech,
+                morph.sub_part_of_speech,
+                morph.highest_learning_interval,
+                morph.morph_id,
+            )
+            for morph in morphs
+        ]
+
+
 class MorphOccurrence:
     __slots__ = (
         "morph",
@@ -1,10 +1,18 @@
 import functools
 import re
 import subprocess
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from . import spacy_wrapper
-from .mecab_wrapper import get_mecab_identity, get_morphemes_mecab
+from .mecab_wrapper import (
+    get_mecab_identity,
+    get_morphemes_mecab,
+    get_morphemes_mecab_batch,
+    start_mecab,
+)
 from .morpheme import Morpheme
 
 ####################################################################################################
@@ -30,6 +38,16 @@ class Morphemizer:
         """
         return []
 
+    def get_morphemes_from_exprs(  # pylint:disable=unused-argument
+        self, expressions: list[str], workers: int = 1
+    ) -> Iterator[list[Morpheme]]:
+        """
+        Yields the morphemes of the expressions in the same order as the expressions.
+        Morphemizers that can split the work across multiple workers override this.
+        """
+        for expression in expressions:
+            yield self.get_morphemes_from_expr(expression)
+
     def get_description(self) -> str:
         """
         Returns a single line, for which languages this Morphemizer is.
@@ -73,6 +91,9 @@ def get_morphemizer_by_name(name: str) -> Optional[Morphemizer]:
 
 space_char_regex = re.compile(" ")
 
+# The number of expressions that are sent to mecab at a time
+_MECAB_BATCH_SIZE: int = 500
+
 
 class MecabMorphemizer(Morphemizer):
     """
@@ -86,6 +107,69 @@ class MecabMorphemizer(Morphemizer):
             expression = space_char_regex.sub("", expression)
         return get_morphemes_mecab(expression)
 
+    def get_morphemes_from_exprs(
+        self, expressions: list[str], workers: int = 1
+    ) -> Iterator[list[Morpheme]]:
+        ################################################################
+        #                         MECAB WORKERS
+        ################################################################
+        # Sending the expressions to mecab one at a time means most of
+        # the time is spent waiting on the pipes, so instead we send
+        # them in batches (chunks) of unique expressions.
+        #
+        # mecab runs as a separate process, so by giving each worker
+        # thread its own mecab process we can use multiple cores
+        # without having to start new python processes (which is
+        # not possible from within Anki).
+        #
+        # executor.map returns the results in the same order as the
+        # chunks, so the output is independent of the number of
+        # workers and how they are scheduled.
+        ################################################################
+        unique_expressions: list[str] = list(dict.fromkeys(expressions))
+        chunks: list[list[str]] = [
+            [
+                # Remove simple spaces that could be added by other add-ons and break the parsing.
+                space_char_regex.sub("", expression)
+                for expression in unique_expressions[index : index + _MECAB_BATCH_SIZE]
+            ]
+            for index in range(0, len(unique_expressions), _MECAB_BATCH_SIZE)
+        ]
+
+        if workers <= 1 or len(chunks) <= 1:
+            yield from _get_morphemes_in_order(
+                expressions,
+                unique_expressions,
+                (get_morphemes_mecab_batch(chunk) for chunk in chunks),
+            )
+            return
+
+        worker_data = threading.local()
+        mecab_processes = []
+        mecab_processes_lock = threading.Lock()
+
+        def get_morphemes_from_chunk(chunk: list[str]) -> list[list[Morpheme]]:
+            if not hasattr(worker_data, "mecab_process"):
+                worker_data.mecab_process, _ = start_mecab()
+                with mecab_processes_lock:
+                    mecab_processes.append(worker_data.mecab_process)
+            return get_morphemes_mecab_batch(chunk, worker_data.mecab_process)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            yield from _get_morphemes_in_order(
+                expressions,
+                unique_expressions,
+                executor.map(get_morphemes_from_chunk, chunks),
+            )
+        finally:
+            # cancel_futures prevents the remaining chunks from being
+            # processed if the caller stops early, e.g. on cancel.
+            executor.shutdown(wait=True, cancel_futures=True)
+            for mecab_process in mecab_processes:
+                mecab_process.terminate()
+                mecab_process.wait()
+
     def get_description(self) -> str:
         try:
             identity = get_mecab_identity()
@@ -94,6 +178,26 @@ class MecabMorphemizer(Morphemizer):
         return f"{identity}: Japanese"
 
 
+def _get_morphemes_in_order(
+    expressions: list[str],
+    unique_expressions: list[str],
+    chunks_morphs: Iterable[list[list[Morpheme]]],
+) -> Iterator[list[Morpheme]]:
+    unique_morphs = zip(
+        unique_expressions,
+        (morphs for chunk_morphs in chunks_morphs for morphs in chunk_morphs),
+    )
+    morphs_by_expression: dict[str, list[Morpheme]] = {}
+    for expression in expressions:
+        # the unique expressions are in the order of their first
+        # occurrence, so the next result belongs to this expression.
+        if expression not in morphs_by_expression:
+            # pylint:disable=stop-iteration-return
+            unique_expression, morphs = next(unique_morphs)
+            morphs_by_expression[unique_expression] = morphs
+        yield morphs_by_expression[expression]
+
+
 ####################################################################################################
 # Space Morphemizer
 ####################################################################################################
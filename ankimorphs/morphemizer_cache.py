@@ -0,0 +1,157 @@
+import json
+import time
+from typing import Optional, Union
+
+from . import fingerprint_utils, spacy_wrapper
+from .ankimorphs_db import AnkiMorphsDB
+from .morpheme import Morpheme, MorphemeRegistry
+
+# Increment this when changes are made to how the morphemizers (or the
+# spacy pipelines) produce morphs, that way outdated morphs are not used.
+_CACHE_VERSION: int = 1
+
+# Each entry is typically a couple of hundred bytes, so this
+# keeps the cache at a reasonable size on disk.
+_MAX_CACHE_ENTRIES: int = 250000
+
+
+class MorphemizerCache:  # pylint:disable=too-many-instance-attributes
+    ################################################################
+    #                      MORPHEMIZER CACHE
+    ################################################################
+    # Extracting morphs is by far the slowest part of recalc and the
+    # generators, and the same expressions are often morphemized
+    # again, e.g. after the preprocess settings change or when the
+    # same files are used in the generators. We therefore store the
+    # morphs the morphemizers produce in ankimorphs.db.
+    #
+    # The entries are keyed by a hash of the morphemizer, the model
+    # version, and the expression. The bracket preprocess settings
+    # are applied to the expression before it is hashed, so they are
+    # implicitly part of the key. Names are removed *after* the morphs
+    # are retrieved, so marking a name does not invalidate the cache.
+    #
+    # The least recently used entries are evicted when the cache
+    # grows beyond _MAX_CACHE_ENTRIES.
+    #
+    # If the version of a spaCy model can't be determined (e.g. it's
+    # not installed as a package) the cache is not used, since we
+    # can't tell when the model changes. The morphemizer_key is None
+    # in that case.
+    #
+    # The morphs are interned with morph_registry, so a morph that is
+    # found in many expressions is only stored once in memory. The
+    # callers should intern the morphs they get from the morphemizers
+    # with it as well.
+    ################################################################
+
+    def __init__(self, am_db: AnkiMorphsDB, morphemizer_description: str) -> None:
+        self.am_db = am_db
+        self.am_db.create_morphemizer_cache_table()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.morph_registry = MorphemeRegistry()
+        self.morphemizer_key: Optional[str] = _get_morphemizer_key(
+            morphemizer_description
+        )
+        self._timestamp: int = int(time.time())
+        self._used_keys: list[str] = []
+        self._new_entries: list[dict[str, Union[int, str]]] = []
+        self._needs_eviction: bool = False
+
+    def get_morphs(self, expressions: list[str]) -> list[Optional[list[Morpheme]]]:
+        # Returns the cached morphs in the same order as the expressions,
+        # expressions that are not in the cache get None instead.
+        if self.morphemizer_key is None:
+            self.misses += len(expressions)
+            return [None] * len(expressions)
+
+        cache_keys: list[str] = [
+            self._get_cache_key(expression) for expression in expressions
+        ]
+        cache_entries: dict[str, str] = self.am_db.get_morphemizer_cache_entries(
+            cache_keys
+        )
+        cached_morphs: list[Optional[list[Morpheme]]] = []
+
+        for cache_key in cache_keys:
+            morphs_json: Optional[str] = cache_entries.get(cache_key)
+            if morphs_json is None:
+                self.misses += 1
+                cached_morphs.append(None)
+                continue
+
+            self.hits += 1
+            self._used_keys.append(cache_key)
+            cached_morphs.append(
+                [
+                    self.morph_registry.get_morph(
+                        lemma=morph[0],
+                        inflection=morph[1],
+                        part_of_speech=morph[2],
+                        sub_part_of_speech=morph[3],
+                    )
+                    for morph in json.loads(morphs_json)
+                ]
+            )
+
+        return cached_morphs
+
+    def add_morphs(self, expression: str, morphs: list[Morpheme]) -> None:
+        if self.morphemizer_key is None:
+            return
+
+        morphs_json: str = json.dumps(
+            [
+                [
+                    morph.lemma,
+                    morph.inflection,
+                    morph.part_of_speech,
+                    morph.sub_part_of_speech,
+                ]
+                for morph in morphs
+            ],
+            ensure_ascii=False,
+        )
+        self._new_entries.append(
+            {
+                "cache_key": self._get_cache_key(expression),
+                "morphs": morphs_json,
+                "last_used": self._timestamp,
+            }
+        )
+
+    def flush(self) -> None:
+        # Writes the changes to the db without evicting old entries, which
+        # is relatively slow, so this can be used to save the cache in chunks.
+        self.am_db.update_morphemizer_cache_last_used(self._used_keys, self._timestamp)
+        self.am_db.insert_many_into_morphemizer_cache_table(self._new_entries)
+        if len(self._new_entries) > 0:
+            self._needs_eviction = True
+        self._used_keys = []
+        self._new_entries = []
+
+    def save(self) -> None:
+        self.flush()
+        if self._needs_eviction:
+            self.am_db.evict_from_morphemizer_cache(_MAX_CACHE_ENTRIES)
+            self._needs_eviction = False
+
+    def _get_cache_key(self, expression: str) -> str:
+        assert self.morphemizer_key is not None
+        return fingerprint_utils.get_hash(self.morphemizer_key, expression)
+
+
+def _get_morphemizer_key(morphemizer_description: str) -> Optional[str]:
+    # The description identifies the morphemizer, e.g. "spaCy: ja_core_news_sm",
+    # and for mecab it contains the identity of the mecab being used.
+    if not morphemizer_description.startswith("spaCy: "):
+        return f"{_CACHE_VERSION}:{morphemizer_description}"
+
+    # the spacy models can be updated independently of AnkiMorphs
+    model_version: Optional[str] = spacy_wrapper.get_model_version(
+        morphemizer_description.removeprefix("spaCy: ")
+    )
+    if model_version is None:
+        return None
+    return f"{_CACHE_VERSION}:{morphemizer_description}:{model_version}"
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from functools import partial
 from pathlib import Path
-from typing import TextIO
+from typing import Optional, TextIO
 
 from anki.collection import Collection
 from aqt import mw
@@ -22,6 +22,7 @@ from .exceptions import CancelledOperationException, EmptyFileSelectionException
 from .generator_dialog import GeneratorDialog
 from .morpheme import Morpheme, MorphOccurrence
 from .morphemizer import Morphemizer, SpacyMorphemizer
+from .morphemizer_cache import MorphemizerCache
 from .table_utils import QTableWidgetIntegerItem, QTableWidgetPercentItem
 from .ui.readability_report_generator_ui import Ui_ReadabilityReportGeneratorWindow
 
@@ -145,14 +146,20 @@ class ReadabilityReportGeneratorDialog(  # pylint:disable=too-many-instance-attr
         # without this sorting, the initial report will have a (seemingly) random order
         input_files.sort(key=lambda _file: _file.name)
 
-        nlp = None  # spacy.Language
+        am_config = AnkiMorphsConfig()
+        spacy_pipeline: Optional[spacy_wrapper.SpacyPipeline] = None
         morphemizer: Morphemizer = self._morphemizers[self.ui.comboBox.currentIndex()]
         assert morphemizer is not None
 
         if isinstance(morphemizer, SpacyMorphemizer):
             selected: str = self.ui.comboBox.itemText(self.ui.comboBox.currentIndex())
             spacy_model = selected.removeprefix("spaCy: ")
-            nlp = spacy_wrapper.get_nlp(spacy_model)
+            spacy_pipeline = spacy_wrapper.get_spacy_pipeline(
+                spacy_model, am_config.get_spacy_pipe_settings(spacy_model)
+            )
+
+        am_db = AnkiMorphsDB()
+        morphemizer_cache = MorphemizerCache(am_db, morphemizer.get_description())
 
         # sorting has to be disabled before populating because bugs can occur
         self.ui.numericalTableWidget.setSortingEnabled(False)
@@ -177,10 +184,12 @@ class ReadabilityReportGeneratorDialog(  # pylint:disable=too-many-instance-attr
 
             with open(input_file, encoding="utf-8") as file:
                 file_morphs: dict[str, MorphOccurrence] = self._create_file_morphs_dict(
-                    file, morphemizer, nlp
+                    file, morphemizer_cache, morphemizer, spacy_pipeline
                 )
                 files_morph_dicts[input_file] = file_morphs
 
+        morphemizer_cache.save()
+
         mw.taskman.run_on_main(
             partial(
                 mw.progress.update,
@@ -188,9 +197,6 @@ class ReadabilityReportGeneratorDialog(  # pylint:disable=too-many-instance-attr
             )
         )
 
-        am_config = AnkiMorphsConfig()
-        am_db = AnkiMorphsDB()
-
         self.ui.numericalTableWidget.setRowCount(len(input_files) + 1)
         self.ui.percentTableWidget.setRowCount(len(input_files) + 1)
 
@@ -226,12 +232,17 @@ class ReadabilityReportGeneratorDialog(  # pylint:disable=too-many-instance-attr
 
         am_db.con.close()
 
-    def _create_file_morphs_dict(self, file: TextIO, morphemizer, nlp) -> dict[str, MorphOccurrence]:  # type: ignore[no-untyped-def]
-        # nlp: spacy.Language
-
+    def _create_file_morphs_dict(
+        self,
+        file: TextIO,
+        morphemizer_cache: MorphemizerCache,
+        morphemizer: Morphemizer,
+        spacy_pipeline: Optional[spacy_wrapper.SpacyPipeline],
+    ) -> dict[str, MorphOccurrence]:
         file_morphs: dict[str, MorphOccurrence] = {}
-        for line in file:
-            morphs: list[Morpheme] = self._get_morphs_from_line(morphemizer, nlp, line)
+        for morphs in self._get_morphs_from_file(
+            file, morphemizer_cache, morphemizer, spacy_pipeline
+        ):
             for morph in morphs:
                 key = morph.lemma + morph.inflection
                 if key in file_morphs:
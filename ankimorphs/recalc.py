@@ -1,47 +1,54 @@
 import csv
-import functools
 import os
 import time
-from collections import Counter
-from collections.abc import Sequence
+from collections.abc import Iterator
 from functools import partial
 from pathlib import Path
 from typing import Any, Optional, Union
 
-from anki.cards import Card
+from anki.cards import Card, CardId
 from anki.collection import Collection
 from anki.consts import CARD_TYPE_NEW, CardQueue
-from anki.models import FieldDict, ModelManager, NotetypeDict, NotetypeId
-from anki.notes import Note
+from anki.models import ModelManager, NotetypeId
+from anki.notes import Note, NoteId
 from anki.tags import TagManager
+from anki.utils import split_fields
 from aqt import mw
 from aqt.operations import QueryOp
 from aqt.qt import QMessageBox  # pylint:disable=no-name-in-module
 from aqt.utils import tooltip
 
-from . import ankimorphs_config, ankimorphs_globals, spacy_wrapper, text_highlighting
+from . import (
+    anki_data_utils,
+    ankimorphs_config,
+    extra_field_utils,
+    fingerprint_utils,
+    recalc_profiler,
+)
 from .anki_data_utils import AnkiCardData, AnkiDBRowData, AnkiMorphsCardData
 from .ankimorphs_config import AnkiMorphsConfig, AnkiMorphsConfigFilter
 from .ankimorphs_db import AnkiMorphsDB
+from .card_difficulty import CardMorphMatrix, get_default_difficulty
 from .exceptions import (
     CancelledOperationException,
     DefaultSettingsException,
     FrequencyFileNotFoundException,
 )
-from .morpheme import Morpheme
-from .morphemizer import SpacyMorphemizer, get_morphemizer_by_name
-from .text_preprocessing import (
-    get_processed_expression,
-    get_processed_morphemizer_morphs,
-    get_processed_spacy_morphs,
-)
+from .morph_extraction import get_morphs_from_expressions
+from .morpheme import Morpheme, MorphemeRegistry
+from .morphemizer_cache import MorphemizerCache
+from .text_preprocessing import get_processed_expression
+
+# Repositioning a group of cards is a single backend call, which is
+# faster than loading and updating the cards one by one once the
+# group has more than a few dozen cards.
+_MIN_REPOSITION_GROUP_SIZE: int = 50
+
+_RECALC_UNDO: str = "AnkiMorphs Recalc"
 
-# Anki stores the 'due' value of cards as a 32-bit integer
-# on the backend, with '2147483647' being the max value before
-# overflow. To prevent overflow when cards are repositioned,
-# we decrement the second digit (from the left) of the max value,
-# which should give plenty of leeway (10^8).
-_DEFAULT_DIFFICULTY: int = 2047483647
+# The number of cards that are updated at a time, the data of the cards
+# in a chunk (fields, tags, morphs) is kept in memory.
+_CARDS_PER_CHUNK: int = 5000
 
 # When recalc is finished, the total duration is printed
 # to the terminal. We have a global start time variable
@@ -66,6 +73,7 @@ def recalc() -> None:
 
     mw.progress.start(label="Recalculating")
     _start_time = time.time()
+    recalc_profiler.start()
 
     operation = QueryOp(
         parent=mw,
@@ -86,282 +94,338 @@ def _recalc_background_op(collection: Collection) -> None:
     _update_cards_and_notes(am_config)
 
 
-def _cache_anki_data(  # pylint:disable=too-many-locals, too-many-branches, too-many-statements
+def _cache_anki_data(  # pylint:disable=too-many-locals
     am_config: AnkiMorphsConfig,
 ) -> None:
     # Extracting morphs from cards is expensive, so caching them yields a significant
     # performance gain.
-    #
-    # Note: this function is a monstrosity, but at some point it's better to have
-    # most of the logic in the same function in a way that gives a better overview
-    # of all the things that are happening. Refactoring this into even smaller pieces
-    # will in effect lead to spaghetti code.
 
     assert mw is not None
 
-    # Rebuilding the entire ankimorphs db every time is faster and much simpler than
-    # updating it since we can bulk queries to the anki db.
+    ################################################################
+    #                      INCREMENTAL UPDATES
+    ################################################################
+    # Most notes don't change between recalcs, so we only extract
+    # morphs from the notes that have been added or modified since
+    # the last recalc. The data that is cheap to get (intervals,
+    # tags, etc.) is refreshed for all cards, and the tables in
+    # ankimorphs.db are patched in place.
+    #
+    # A note is considered unchanged if both its 'mod' timestamp
+    # and the settings that affect its morphs (filter_hash) are the
+    # same as last time. If the 'mod' has changed, e.g. because a
+    # tag was added, we compare a hash of the expression instead,
+    # which means that the morphs only have to be extracted when
+    # the text actually changed.
+    ################################################################
+    #                          STREAMING
+    ################################################################
+    # To keep the memory usage flat regardless of the size of the
+    # collection, the cards are processed in chunks of whole notes
+    # (anki_data_utils.NOTES_PER_CHUNK): the anki data of a chunk is fetched, the
+    # morphs are extracted, and the results are written to
+    # ankimorphs.db before the next chunk is fetched. All the writes
+    # happen in one transaction, see AnkiMorphsDB.bulk_load(), so
+    # ankimorphs.db is left untouched if recalc fails or is cancelled.
+    ################################################################
+
     am_db = AnkiMorphsDB()
-    am_db.drop_all_tables()
     am_db.create_all_tables()
 
     # We only want to cache the morphs on the note-filter that have 'read' enabled
     read_enabled_config_filters: list[AnkiMorphsConfigFilter] = (
         ankimorphs_config.get_read_enabled_filters()
     )
+    preprocess_hash: str = fingerprint_utils.get_preprocess_hash(am_config)
 
-    # These lists contain data that will be inserted into ankimorphs.db
-    card_table_data: list[dict[str, Any]] = []
-    morph_table_data: list[dict[str, Any]] = []
-    card_morph_map_table_data: list[dict[str, Any]] = []
+    # If there is nothing to update in place, e.g. on the first recalc,
+    # the tables are built from scratch, see AnkiMorphsDB.bulk_load()
+    with am_db.bulk_load(rebuild=not am_db.has_cards()) as bulk_db:
+        bulk_db.create_handled_tables()
 
-    for config_filter in read_enabled_config_filters:
-        if config_filter.note_type == "":
-            raise DefaultSettingsException  # handled in on_failure()
+        for config_filter in read_enabled_config_filters:
+            if config_filter.note_type == "":
+                raise DefaultSettingsException  # handled in on_failure()
 
-        cards_data_dict: dict[int, AnkiCardData] = _create_card_data_dict(
-            am_config,
-            config_filter,
-        )
-        card_amount = len(cards_data_dict)
-
-        # Batching the text makes spacy much faster, so we flatten the data into the all_text list.
-        # To get back to the card_id for every entry in the all_text list, we create a separate list with the keys.
-        # These two lists have to be synchronized, i.e., the indexes align, that way they can be used for lookup later.
-        all_text: list[str] = []
-        all_keys: list[int] = []
-
-        for key, _card_data in cards_data_dict.items():
-            # Some spaCy models label all capitalized words as proper nouns,
-            # which is pretty bad. To prevent this, we lower case everything.
-            # This in turn makes some models not label proper nouns correctly,
-            # but this is preferable because we also have the 'Mark as Name'
-            # feature that can be used in that case.
-            expression = get_processed_expression(
-                am_config, _card_data.expression.lower()
+            morphemizer_cache = MorphemizerCache(
+                bulk_db, config_filter.morphemizer_description
             )
-            all_text.append(expression)
-            all_keys.append(key)
-
-        nlp = None  # spacy.Language
-        morphemizer = get_morphemizer_by_name(config_filter.morphemizer_name)
-        assert morphemizer is not None
-
-        if isinstance(morphemizer, SpacyMorphemizer):
-            spacy_model = config_filter.morphemizer_description.removeprefix("spaCy: ")
-            nlp = spacy_wrapper.get_nlp(spacy_model)
-
-        # Since function overloading isn't a thing in python, we use
-        # this ugly branching with near identical code. An alternative
-        # approach of using variable number of arguments (*args) would
-        # require an extra function call, so this is faster.
-        #
-        # We don't want to store duplicate morphs because it can lead
-        # to the same morph being counted twice, which is bad for the
-        # difficulty algorithm. We therefore convert the lists of morphs
-        # we receive from the morphemizers into sets.
-        if nlp is not None:
-            for index, doc in enumerate(nlp.pipe(all_text)):
-                update_progress_potentially_cancel(
-                    label=f"Extracting morphs from\n{config_filter.note_type} cards\n card: {index} of {card_amount}",
-                    counter=index,
-                    max_value=card_amount,
-                )
-                morphs = set(get_processed_spacy_morphs(am_config, doc))
-                key = all_keys[index]
-                cards_data_dict[key].morphs = morphs
-        else:
-            for index, _expression in enumerate(all_text):
-                update_progress_potentially_cancel(
-                    label=f"Extracting morphs from\n{config_filter.note_type} cards\n card: {index} of {card_amount}",
-                    counter=index,
-                    max_value=card_amount,
-                )
-                morphs = set(
-                    get_processed_morphemizer_morphs(
-                        morphemizer, _expression, am_config
-                    )
-                )
-                key = all_keys[index]
-                cards_data_dict[key].morphs = morphs
-
-        for counter, card_id in enumerate(cards_data_dict):
-            update_progress_potentially_cancel(
-                label=f"Caching {config_filter.note_type} cards\n card: {counter} of {card_amount}",
-                counter=counter,
-                max_value=card_amount,
+            filter_hash: str = fingerprint_utils.get_filter_hash(
+                preprocess_hash, config_filter, morphemizer_cache.morphemizer_key
             )
-            card_data: AnkiCardData = cards_data_dict[card_id]
-
-            if card_data.automatically_known_tag or card_data.manually_known_tag:
-                highest_interval = am_config.recalc_interval_for_known
-            elif card_data.type == 1:  # 1: learning
-                # cards in the 'learning' state have an interval of zero, but we don't
-                # want to treat them as 'unknown', so we change the value manually.
-                highest_interval = 1
-            else:
-                highest_interval = card_data.interval
-
-            card_table_data.append(
-                {
-                    "card_id": card_id,
-                    "note_id": card_data.note_id,
-                    "note_type_id": config_filter.note_type_id,
-                    "card_type": card_data.type,
-                    "fields": card_data.fields,
-                    "tags": card_data.tags,
-                }
+            card_amount: int = anki_data_utils.get_anki_card_amount(
+                am_config, config_filter
             )
+            counter: int = 0
 
-            if card_data.morphs is None:
-                continue
+            for anki_rows in anki_data_utils.get_anki_data_chunks(
+                am_config, config_filter
+            ):
+                _cache_anki_data_chunk(
+                    am_config,
+                    bulk_db,
+                    config_filter,
+                    filter_hash,
+                    morphemizer_cache,
+                    anki_rows,
+                    progress=(counter, card_amount),
+                )
+                counter += len(anki_rows)
 
-            for morph in card_data.morphs:
-                morph_table_data.append(
-                    {
-                        "lemma": morph.lemma,
-                        "inflection": morph.inflection,
-                        "highest_learning_interval": highest_interval,
-                    }
+            morphemizer_cache.save()
+            recalc_profiler.count("morphemizer_cache_hits", morphemizer_cache.hits)
+            recalc_profiler.count("morphemizer_cache_misses", morphemizer_cache.misses)
+
+        if am_config.recalc_read_known_morphs_folder is True:
+            _update_known_morphs_files(bulk_db)
+
+        mw.taskman.run_on_main(
+            partial(mw.progress.update, label="Saving to ankimorphs.db")
+        )
+
+        with recalc_profiler.phase("rebuild_ankimorphs_db"):
+            # cards that have been deleted or no longer match any of the filters
+            bulk_db.delete_unhandled_cards_and_notes()
+            bulk_db.create_indexes()
+            bulk_db.rebuild_morph_table(
+                keep_known_morphs_files_morphs=am_config.recalc_read_known_morphs_folder
+            )
+            bulk_db.rebuild_morph_frequency_table()
+            if am_config.recalc_read_known_morphs_folder is True:
+                bulk_db.insert_known_morphs_files_into_morph_table(
+                    am_config.recalc_interval_for_known
                 )
-                card_morph_map_table_data.append(
+            bulk_db.rebuild_card_unknown_morphs_table()
+        # bulk_db.print_table("Cards")
+    am_db.con.close()
+
+
+def _cache_anki_data_chunk(  # pylint:disable=too-many-arguments, too-many-locals, too-many-statements
+    am_config: AnkiMorphsConfig,
+    am_db: AnkiMorphsDB,
+    config_filter: AnkiMorphsConfigFilter,
+    filter_hash: str,
+    morphemizer_cache: MorphemizerCache,
+    anki_rows: list[AnkiDBRowData],
+    progress: tuple[int, int],
+) -> None:
+    assert mw is not None
+
+    # if the card matches multiple note filters, the first one is used
+    with recalc_profiler.phase("create_card_data"):
+        cards_data_dict: dict[int, AnkiCardData] = _create_card_data_dict(
+            am_config,
+            config_filter,
+            anki_rows,
+            am_db.get_handled_card_ids([row.card_id for row in anki_rows]),
+        )
+    notes_fingerprints: dict[int, tuple[int, str, str]] = am_db.get_notes_fingerprints(
+        list({card_data.note_id: None for card_data in cards_data_dict.values()})
+    )
+    cached_card_ids: set[int] = am_db.get_cached_card_ids(list(cards_data_dict))
+    counter_offset, card_amount = progress
+
+    # These lists contain data that will be inserted into ankimorphs.db
+    card_table_data: list[dict[str, Any]] = []
+    card_morph_map_table_data: list[dict[str, Any]] = []
+    notes_table_data: list[dict[str, Any]] = []
+
+    handled_notes: dict[int, bool] = {}  # note_id -> note has changed
+    changed_card_ids: list[int] = []
+
+    # The cards of a note share the expression, so the morphs are extracted
+    # once per note and then given to all the cards of the note that need
+    # them. Batching the text makes spacy much faster, so the expressions
+    # are collected in a dict (note_id -> expression), which keeps the order.
+    note_expressions: dict[int, str] = {}
+    preprocess_phase = recalc_profiler.phase("preprocess")
+
+    for key, _card_data in cards_data_dict.items():
+        note_id: int = _card_data.note_id
+        note_has_changed: Optional[bool] = handled_notes.get(note_id)
+
+        if note_has_changed is None:
+            expression_hash: str = fingerprint_utils.get_hash(_card_data.expression)
+            note_has_changed = fingerprint_utils.note_has_changed(
+                notes_fingerprints.get(note_id),
+                _card_data.note_mod,
+                filter_hash,
+                expression_hash,
+            )
+            handled_notes[note_id] = note_has_changed
+            if notes_fingerprints.get(note_id) != (
+                _card_data.note_mod,
+                filter_hash,
+                expression_hash,
+            ):
+                notes_table_data.append(
                     {
-                        "card_id": card_id,
-                        "morph_lemma": morph.lemma,
-                        "morph_inflection": morph.inflection,
+                        "note_id": note_id,
+                        "note_mod": _card_data.note_mod,
+                        "filter_hash": filter_hash,
+                        "expression_hash": expression_hash,
                     }
                 )
 
-    morphs_from_files: list[dict[str, Any]] = []
-    if am_config.recalc_read_known_morphs_folder is True:
-        morphs_from_files = _get_morphs_from_files(am_config)
+        if not note_has_changed and key in cached_card_ids:
+            continue
 
-    mw.taskman.run_on_main(partial(mw.progress.update, label="Saving to ankimorphs.db"))
+        changed_card_ids.append(key)
 
-    am_db.insert_many_into_morph_table(morph_table_data + morphs_from_files)
-    am_db.insert_many_into_card_table(card_table_data)
-    am_db.insert_many_into_card_morph_map_table(card_morph_map_table_data)
-    # am_db.print_table("Cards")
-    am_db.con.close()
+        if note_id in note_expressions:
+            continue
 
+        # Some spaCy models label all capitalized words as proper nouns,
+        # which is pretty bad. To prevent this, we lower case everything.
+        # This in turn makes some models not label proper nouns correctly,
+        # but this is preferable because we also have the 'Mark as Name'
+        # feature that can be used in that case.
+        with preprocess_phase:
+            note_expressions[note_id] = get_processed_expression(
+                am_config, _card_data.expression.lower()
+            )
 
-def _get_morphs_from_files(am_config: AnkiMorphsConfig) -> list[dict[str, Any]]:
-    assert mw is not None
+    with recalc_profiler.phase(f"morphemize ({config_filter.note_type})"):
+        all_morphs: list[set[Morpheme]] = get_morphs_from_expressions(
+            am_config,
+            config_filter,
+            morphemizer_cache,
+            list(note_expressions.values()),
+            update_progress=partial(
+                _update_extraction_progress, config_filter.note_type, progress
+            ),
+        )
+    recalc_profiler.count("expressions_morphemized", len(note_expressions))
+    note_morphs: dict[int, set[Morpheme]] = dict(zip(note_expressions, all_morphs))
+    for card_id in changed_card_ids:
+        changed_card_data: AnkiCardData = cards_data_dict[card_id]
+        changed_card_data.morphs = note_morphs[changed_card_data.note_id]
+
+    for counter, card_id in enumerate(cards_data_dict, start=counter_offset):
+        update_progress_potentially_cancel(
+            label=f"Caching {config_filter.note_type} cards\n card: {counter} of {card_amount}",
+            counter=counter,
+            max_value=card_amount,
+        )
+        card_data: AnkiCardData = cards_data_dict[card_id]
+
+        if card_data.automatically_known_tag or card_data.manually_known_tag:
+            learning_interval = am_config.recalc_interval_for_known
+        elif card_data.type == 1:  # 1: learning
+            # cards in the 'learning' state have an interval of zero, but we don't
+            # want to treat them as 'unknown', so we change the value manually.
+            learning_interval = 1
+        else:
+            learning_interval = card_data.interval
+
+        card_table_data.append(
+            {
+                "card_id": card_id,
+                "note_id": card_data.note_id,
+                "note_type_id": config_filter.note_type_id,
+                "card_type": card_data.type,
+                "fields": card_data.fields,
+                "tags": card_data.tags,
+                "learning_interval": learning_interval,
+            }
+        )
 
-    morphs_from_files: list[dict[str, Any]] = []
-    known_morphs_dir: str = os.path.join(mw.pm.profileFolder(), "known-morphs")
-    known_morphs_dir_path: Path = Path(known_morphs_dir)
-    input_files: list[Path] = []
+        if card_data.morphs is None:
+            continue
 
-    for path in known_morphs_dir_path.rglob("*.csv"):
-        input_files.append(path)
+        for morph in card_data.morphs:
+            card_morph_map_table_data.append(
+                {
+                    "card_id": card_id,
+                    "morph_lemma": morph.lemma,
+                    "morph_inflection": morph.inflection,
+                }
+            )
+
+    with recalc_profiler.phase("write_ankimorphs_db"):
+        morphemizer_cache.flush()
+        am_db.delete_card_morph_map_of_cards(changed_card_ids)
+        am_db.insert_many_into_card_table(card_table_data)
+        am_db.insert_many_into_card_morph_map_table(card_morph_map_table_data)
+        am_db.insert_many_into_notes_table(notes_table_data)
+        am_db.mark_as_handled(list(cards_data_dict), list(handled_notes))
+    recalc_profiler.count("card_morphs_written", len(card_morph_map_table_data))
+
+
+def _update_known_morphs_files(am_db: AnkiMorphsDB) -> None:
+    # The parsed files are stored in ankimorphs.db, so only the files
+    # that are new or have changed (or been removed) since the last
+    # recalc have to be handled.
+    assert mw is not None
 
-    for input_file in input_files:
+    known_morphs_dir_path: Path = Path(
+        os.path.join(mw.pm.profileFolder(), "known-morphs")
+    )
+    cached_files: dict[str, tuple[int, int]] = am_db.get_known_morphs_files()
+
+    for input_file in known_morphs_dir_path.rglob("*.csv"):
         if mw.progress.want_cancel():  # user clicked 'x'
             raise CancelledOperationException
 
+        file_path: str = input_file.relative_to(known_morphs_dir_path).as_posix()
+        file_stat: os.stat_result = input_file.stat()
+        file_fingerprint: tuple[int, int] = (file_stat.st_size, file_stat.st_mtime_ns)
+
+        if cached_files.pop(file_path, None) == file_fingerprint:
+            continue
+
         mw.taskman.run_on_main(
             partial(
                 mw.progress.update,
-                label=f"Importing known morphs from file: <br>{input_file.relative_to(known_morphs_dir_path)}",
+                label=f"Importing known morphs from file: <br>{file_path}",
             )
         )
 
+        morphs: list[tuple[str, str]] = []
         with open(input_file, encoding="utf-8") as csvfile:
             morph_reader = csv.reader(csvfile, delimiter=",")
             next(morph_reader, None)  # skip the headers
             for row in morph_reader:
                 lemma: str = row[0]
                 inflection: str = row[1]
+                morphs.append((lemma, inflection))
 
-                morphs_from_files.append(
-                    {
-                        "lemma": lemma,
-                        "inflection": inflection,
-                        "highest_learning_interval": am_config.recalc_interval_for_known,
-                    }
-                )
+        am_db.insert_known_morphs_file(file_path, *file_fingerprint, morphs)
+        recalc_profiler.count("known_morphs_files_read")
 
-    return morphs_from_files
+    # the files that are left have been removed from the folder
+    am_db.delete_known_morphs_files(list(cached_files))
 
 
 def _create_card_data_dict(
     am_config: AnkiMorphsConfig,
     config_filter: AnkiMorphsConfigFilter,
+    anki_rows: list[AnkiDBRowData],
+    handled_card_ids: set[int],
 ) -> dict[int, AnkiCardData]:
     assert mw is not None
 
     tag_manager = TagManager(mw.col)
-    tags: dict[str, str] = config_filter.tags
-    model_id: Optional[int] = config_filter.note_type_id
     card_data_dict: dict[int, AnkiCardData] = {}
+    # the note is only parsed for the first of its cards
+    note_cards_data: dict[int, AnkiCardData] = {}
 
-    for anki_row_data in _get_anki_data(am_config, model_id, tags).values():
-        card_data = AnkiCardData(am_config, config_filter, tag_manager, anki_row_data)
+    for anki_row_data in anki_rows:
+        if anki_row_data.card_id in handled_card_ids:
+            continue
+        card_data = AnkiCardData(
+            am_config,
+            config_filter,
+            tag_manager,
+            anki_row_data,
+            note_cards_data.get(anki_row_data.note_id),
+        )
         card_data_dict[anki_row_data.card_id] = card_data
+        note_cards_data.setdefault(anki_row_data.note_id, card_data)
 
     return card_data_dict
 
 
-def _get_anki_data(
-    am_config: AnkiMorphsConfig, model_id: Optional[int], tags_object: dict[str, str]
-) -> dict[int, AnkiDBRowData]:
-    ################################################################
-    #                        SQL QUERY
-    ################################################################
-    # This sql query is horrible, partly because of the limitation
-    # in sqlite where you can't really build a query with variable
-    # parameter length (tags in this case)
-    # More info:
-    # https://stackoverflow.com/questions/5766230/select-from-sqlite-table-where-rowid-in-list-using-python-sqlite3-db-api-2-0
-    #
-    # EXAMPLE FINAL SQL QUERY:
-    #   SELECT cards.id, cards.ivl, cards.type, cards.queue, notes.id, notes.flds, notes.tags
-    #   FROM cards
-    #   INNER JOIN notes ON
-    #       cards.nid = notes.id
-    #   WHERE notes.mid = 1691076536776 AND (cards.queue != -1 OR notes.tags LIKE '% am-known-manually %') AND notes.tags LIKE '% movie %'
-    ################################################################
-
-    assert mw
-    assert mw.col.db
-
-    ignore_suspended_cards = ""
-    if am_config.preprocess_ignore_suspended_cards_content:
-        # If this part is included, then we don't get cards that are suspended EXCEPT for
-        # the cards that were 'set known and skip' and later suspended. We want to always
-        # include those cards otherwise we can lose track of known morphs
-        ignore_suspended_cards = f" AND (cards.queue != -1 OR notes.tags LIKE '% {am_config.tag_known_manually} %')"
-
-    excluded_tags = tags_object["exclude"]
-    included_tags = tags_object["include"]
-    tags_search_string = ""
-
-    if len(excluded_tags) > 0:
-        tags_search_string += "".join(
-            [f" AND notes.tags NOT LIKE '% {_tag} %'" for _tag in excluded_tags]
-        )
-    if len(included_tags) > 0:
-        tags_search_string += "".join(
-            [f" AND notes.tags LIKE '% {_tag} %'" for _tag in included_tags]
-        )
-
-    result: list[Sequence[Any]] = mw.col.db.all(
-        """
-        SELECT cards.id, cards.ivl, cards.type, cards.queue, notes.id, notes.flds, notes.tags
-        FROM cards
-        INNER JOIN notes ON
-            cards.nid = notes.id
-        """
-        + f"WHERE notes.mid = {model_id}{ignore_suspended_cards}{tags_search_string}",
-    )
-
-    anki_db_row_data_dict: dict[int, AnkiDBRowData] = {}
-    for anki_data in map(AnkiDBRowData, result):
-        anki_db_row_data_dict[anki_data.card_id] = anki_data
-    return anki_db_row_data_dict
-
-
 def _update_cards_and_notes(  # pylint:disable=too-many-locals, too-many-statements, too-many-branches
     am_config: AnkiMorphsConfig,
 ) -> None:
@@ -374,103 +438,178 @@ def _update_cards_and_notes(  # pylint:disable=too-many-locals, too-many-stateme
     modify_config_filters: list[AnkiMorphsConfigFilter] = (
         ankimorphs_config.get_modify_enabled_filters()
     )
-    card_morph_map_cache: dict[int, list[Morpheme]] = _get_card_morph_map_cache(am_db)
+    # a morph is on many cards, but it only needs one instance
+    morph_registry = MorphemeRegistry()
     handled_cards: dict[int, None] = {}  # we only care about the key lookup, not values
-    modified_cards: list[Card] = []
-    modified_notes: list[Note] = []
+    tag_manager = TagManager(mw.col)
+
+    ################################################################
+    #                        FETCH AND DIFF
+    ################################################################
+    # Loading the card and note objects requires two round trips
+    # to the anki backend per card, which is slow, and most cards
+    # don't change between recalcs anyway. The fields and tags of
+    # the notes were cached in ankimorphs.db earlier in this recalc,
+    # and the due and queue values are fetched in bulk, so we
+    # calculate the new values from those and only load the card and
+    # note objects of the ones that actually differ.
+    #
+    # Every card starts from the original note values, so if multiple
+    # cards of the same note change it, the last one wins, just like
+    # when the note objects were loaded per card.
+    #
+    # The cards are handled _CARDS_PER_CHUNK at a time, in the order
+    # of their ids (keyset pagination), and only the data of the
+    # cards in the current chunk is loaded, so the memory usage does
+    # not grow with the size of the collection. Only the values of
+    # the cards and notes that have to be modified are kept.
+    ################################################################
+    modified_cards_values: dict[int, tuple[int, int]] = {}  # card_id -> (due, queue)
+    repositioned_cards: dict[int, list[CardId]] = {}  # due -> card_ids
+    modified_notes_values: dict[int, tuple[list[str], list[str]]] = {}
+    modified_highlights: list[dict[str, Union[int, str]]] = []
 
-    # clear the morph collection frequency cache between recalcs
-    _get_morph_collection_priority.cache_clear()
+    # filters that use the same frequency file share its priorities
+    frequency_file_priorities: dict[str, dict[int, int]] = {}
 
     for config_filter in modify_config_filters:
         assert config_filter.note_type_id is not None
         note_type_id: NotetypeId = NotetypeId(config_filter.note_type_id)
 
-        _add_extra_fields(config_filter, note_type_id, model_manager)
+        extra_field_utils.add_extra_fields(config_filter, note_type_id, model_manager)
         note_type_dict = model_manager.get(note_type_id)
         assert note_type_dict is not None
         note_type_field_name_dict = model_manager.field_map(note_type_dict)
 
-        morph_priority: dict[str, int] = _get_morph_priority(am_db, config_filter)
-        cards_data_dict: dict[int, AnkiMorphsCardData] = _get_am_cards_data_dict(
+        with recalc_profiler.phase("score_difficulty"):
+            morph_priority: dict[int, int] = _get_morph_priority(
+                am_db, config_filter, frequency_file_priorities
+            )
+            card_difficulties: dict[int, tuple[int, int, bool]] = CardMorphMatrix(
+                am_db, am_config, config_filter.note_type_id
+            ).get_card_difficulties(am_config, morph_priority)
+        # the cached fields don't include the extra fields that were just added
+        field_amount: int = len(note_type_field_name_dict)
+        card_amount: int = am_db.get_card_amount(config_filter.note_type_id)
+        counter: int = 0
+        highlight_phase = recalc_profiler.phase("highlight")
+
+        for cards_data_dict in _get_am_cards_data_chunks(
             am_db, config_filter.note_type_id
-        )
-        card_amount = len(cards_data_dict)
-
-        for counter, card_id in enumerate(cards_data_dict):
-            update_progress_potentially_cancel(
-                label=f"Updating {config_filter.note_type} cards\n card: {counter} of {card_amount}",
-                counter=counter,
-                max_value=card_amount,
+        ):
+            first_card_id: int = next(iter(cards_data_dict))
+            last_card_id: int = next(reversed(cards_data_dict))
+            cards_due_and_queue: dict[int, tuple[int, int]] = (
+                anki_data_utils.get_anki_cards_due_and_queue(
+                    note_type_id, first_card_id, last_card_id
+                )
+            )
+            card_morph_map_cache: dict[int, list[Morpheme]] = _get_card_morph_map_cache(
+                am_db,
+                morph_registry,
+                config_filter.note_type_id,
+                (first_card_id, last_card_id),
+            )
+            highlight_hashes: dict[int, str] = am_db.get_highlight_hashes(
+                config_filter.note_type_id, first_card_id, last_card_id
             )
 
-            # check if the card has already been handled in a previous note filter
-            if card_id in handled_cards:
-                continue
-
-            card = mw.col.get_card(card_id)
-            note = card.note()
-
-            # make sure to get the values and not references
-            original_due = int(card.due)
-            original_queue = int(card.queue)  # queue: suspended, buried, etc.
-            original_fields = note.fields.copy()
-            original_tags = note.tags.copy()
-
-            if card.type == CARD_TYPE_NEW:
-                (
-                    card_difficulty,
-                    card_unknown_morphs,
-                    card_has_learning_morphs,
-                ) = _get_card_difficulty_and_unknowns_and_learning_status(
-                    am_config,
-                    card_id,
-                    card_morph_map_cache,
-                    morph_priority,
+            for card_id, am_card_data in cards_data_dict.items():
+                update_progress_potentially_cancel(
+                    label=f"Updating {config_filter.note_type} cards\n card: {counter} of {card_amount}",
+                    counter=counter,
+                    max_value=card_amount,
                 )
+                counter += 1
 
-                card.due = card_difficulty
+                # check if the card has already been handled in a previous note filter
+                if card_id in handled_cards:
+                    continue
 
-                _update_tags_and_queue(
-                    am_config,
-                    note,
-                    card,
-                    len(card_unknown_morphs),
-                    card_has_learning_morphs,
+                due_and_queue: Optional[tuple[int, int]] = cards_due_and_queue.get(
+                    card_id
                 )
-
-                if config_filter.extra_unknowns:
-                    _update_unknowns_field(
-                        am_config, note_type_field_name_dict, note, card_unknown_morphs
-                    )
-                if config_filter.extra_unknowns_count:
-                    _update_unknowns_count_field(
-                        note_type_field_name_dict, note, card_unknown_morphs
+                if due_and_queue is None:
+                    continue  # the card has been deleted in the meantime
+
+                original_due, original_queue = due_and_queue  # queue: suspended, etc.
+                original_fields: list[str] = split_fields(am_card_data.fields)
+                original_fields += [""] * (field_amount - len(original_fields))
+                original_tags: list[str] = tag_manager.split(am_card_data.tags)
+
+                due: int = original_due
+                queue: int = original_queue
+                fields: list[str] = original_fields.copy()
+                tags: list[str] = original_tags.copy()
+
+                if am_card_data.card_type == CARD_TYPE_NEW:
+                    (
+                        card_difficulty,
+                        card_unknowns,
+                        card_has_learning_morphs,
+                    ) = card_difficulties.get(card_id, get_default_difficulty())
+
+                    due = card_difficulty
+
+                    queue = _update_tags_and_queue(
+                        am_config,
+                        tags,
+                        queue,
+                        card_unknowns,
+                        card_has_learning_morphs,
                     )
-                if config_filter.extra_difficulty:
-                    _update_difficulty_field(
-                        note_type_field_name_dict, note, card_difficulty
-                    )
-
-            if config_filter.extra_highlighted:
-                _update_highlighted_field(
-                    am_config,
-                    config_filter,
-                    note_type_field_name_dict,
-                    card_morph_map_cache,
-                    card.id,
-                    note,
-                )
-
-            # we only want anki to update the cards and notes that have actually changed
-            if card.due != original_due or card.queue != original_queue:
-                modified_cards.append(card)
-
-            if original_fields != note.fields or original_tags != note.tags:
-                modified_notes.append(note)
-
-            handled_cards[card_id] = None  # this marks the card as handled
 
+                    if config_filter.extra_unknowns:
+                        extra_field_utils.update_unknowns_field(
+                            am_config,
+                            note_type_field_name_dict,
+                            fields,
+                            extra_field_utils.get_card_unknown_morphs(
+                                card_morph_map_cache, card_id
+                            ),
+                        )
+                    if config_filter.extra_unknowns_count:
+                        extra_field_utils.update_unknowns_count_field(
+                            note_type_field_name_dict, fields, card_unknowns
+                        )
+                    if config_filter.extra_difficulty:
+                        extra_field_utils.update_difficulty_field(
+                            note_type_field_name_dict, fields, card_difficulty
+                        )
+
+                if config_filter.extra_highlighted:
+                    with highlight_phase:
+                        highlight_hash: Optional[str] = (
+                            extra_field_utils.update_highlighted_field(
+                                am_config,
+                                config_filter,
+                                note_type_field_name_dict,
+                                card_morph_map_cache,
+                                card_id,
+                                fields,
+                                highlight_hashes.get(card_id),
+                            )
+                        )
+                    if highlight_hash is not None:
+                        modified_highlights.append(
+                            {"card_id": card_id, "highlight_hash": highlight_hash}
+                        )
+
+                # we only want anki to update the cards and notes that have actually changed
+                if queue != original_queue:
+                    modified_cards_values[card_id] = (due, queue)
+                elif due != original_due:
+                    repositioned_cards.setdefault(due, []).append(CardId(card_id))
+
+                if original_fields != fields or original_tags != tags:
+                    modified_notes_values[am_card_data.note_id] = (fields, tags)
+
+                handled_cards[card_id] = None  # this marks the card as handled
+
+    # If applying the changes fails, the hashes won't match the highlighted
+    # fields of the cards next time, so they are highlighted again.
+    am_db.insert_many_into_highlights_table(modified_highlights)
+    recalc_profiler.count("highlights_updated", len(modified_highlights))
     am_db.con.close()
 
     mw.taskman.run_on_main(
@@ -480,69 +619,109 @@ def _update_cards_and_notes(  # pylint:disable=too-many-locals, too-many-stateme
         )
     )
 
-    mw.col.update_cards(modified_cards)
-    mw.col.update_notes(modified_notes)
+    _apply_changes_to_collection(
+        repositioned_cards, modified_cards_values, modified_notes_values
+    )
 
 
-def _add_extra_fields(
-    config_filter: AnkiMorphsConfigFilter,
-    note_type_id: NotetypeId,
-    model_manager: ModelManager,
+def _apply_changes_to_collection(
+    repositioned_cards: dict[int, list[CardId]],
+    modified_cards_values: dict[int, tuple[int, int]],
+    modified_notes_values: dict[int, tuple[list[str], list[str]]],
 ) -> None:
-    note_type_dict: Optional[NotetypeDict] = model_manager.get(note_type_id)
-    assert note_type_dict is not None
-    existing_field_names = model_manager.field_names(note_type_dict)
-    new_field: FieldDict
-
-    if config_filter.extra_unknowns:
-        if ankimorphs_globals.EXTRA_FIELD_UNKNOWNS not in existing_field_names:
-            new_field = model_manager.new_field(ankimorphs_globals.EXTRA_FIELD_UNKNOWNS)
-            model_manager.add_field(note_type_dict, new_field)
-            model_manager.update_dict(note_type_dict)
-
-    if config_filter.extra_unknowns_count:
-        if ankimorphs_globals.EXTRA_FIELD_UNKNOWNS_COUNT not in existing_field_names:
-            new_field = model_manager.new_field(
-                ankimorphs_globals.EXTRA_FIELD_UNKNOWNS_COUNT
-            )
-            model_manager.add_field(note_type_dict, new_field)
-            model_manager.update_dict(note_type_dict)
+    ################################################################
+    #                        REPOSITIONING
+    ################################################################
+    # Most new cards only get a new due value, and many of them get
+    # the same one, e.g. the cards that have _DEFAULT_DIFFICULTY.
+    # Repositioning a group of new cards to the same due value is a
+    # single backend call that doesn't require loading the cards, so
+    # the large groups are repositioned, and the rest of the cards
+    # are loaded and updated in one go like the notes.
+    #
+    # All the changes are merged into a single undo entry.
+    ################################################################
+    assert mw is not None
 
-    if config_filter.extra_highlighted:
-        if ankimorphs_globals.EXTRA_FIELD_HIGHLIGHTED not in existing_field_names:
-            new_field = model_manager.new_field(
-                ankimorphs_globals.EXTRA_FIELD_HIGHLIGHTED
-            )
-            model_manager.add_field(note_type_dict, new_field)
-            model_manager.update_dict(note_type_dict)
+    if not (repositioned_cards or modified_cards_values or modified_notes_values):
+        return
 
-    if config_filter.extra_difficulty:
-        if ankimorphs_globals.EXTRA_FIELD_DIFFICULTY not in existing_field_names:
-            new_field = model_manager.new_field(
-                ankimorphs_globals.EXTRA_FIELD_DIFFICULTY
-            )
-            model_manager.add_field(note_type_dict, new_field)
-            model_manager.update_dict(note_type_dict)
+    undo_entry: int = mw.col.add_custom_undo_entry(_RECALC_UNDO)
+    modified_cards: list[Card] = []
 
+    for due, card_ids in repositioned_cards.items():
+        if len(card_ids) >= _MIN_REPOSITION_GROUP_SIZE:
+            with recalc_profiler.phase("reposition_cards"):
+                mw.col.sched.reposition_new_cards(
+                    card_ids,
+                    starting_from=due,
+                    step_size=0,
+                    randomize=False,
+                    shift_existing=False,
+                )
+            recalc_profiler.count("cards_repositioned", len(card_ids))
+            # anki only keeps the last 30 undo steps, so we can't merge them all at the end
+            mw.col.merge_undo_entries(undo_entry)
+            continue
+        for card_id in card_ids:
+            card = mw.col.get_card(card_id)
+            card.due = due
+            modified_cards.append(card)
 
-def _get_card_morph_map_cache(am_db: AnkiMorphsDB) -> dict[int, list[Morpheme]]:
+    for card_id, (due, queue) in modified_cards_values.items():
+        card = mw.col.get_card(CardId(card_id))
+        card.due = due
+        card.queue = CardQueue(queue)
+        modified_cards.append(card)
+
+    modified_notes: list[Note] = []
+    for note_id, (fields, tags) in modified_notes_values.items():
+        note = mw.col.get_note(NoteId(note_id))
+        note.fields = fields
+        note.tags = tags
+        modified_notes.append(note)
+
+    with recalc_profiler.phase("update_cards"):
+        mw.col.update_cards(modified_cards)
+    with recalc_profiler.phase("update_notes"):
+        mw.col.update_notes(modified_notes)
+    mw.col.merge_undo_entries(undo_entry)
+    recalc_profiler.count("cards_updated", len(modified_cards))
+    recalc_profiler.count("notes_updated", len(modified_notes))
+
+
+def _get_card_morph_map_cache(
+    am_db: AnkiMorphsDB,
+    morph_registry: MorphemeRegistry,
+    note_type_id: int,
+    card_id_range: tuple[int, int],
+) -> dict[int, list[Morpheme]]:
+    # Returns the morphs of the cards of the note type with ids in the
+    # (inclusive) card_id_range, the morphs are interned with morph_registry
     card_morph_map_cache: dict[int, list[Morpheme]] = {}
 
     # Sorting the morphs (ORDER BY) is crucial to avoid bugs
     card_morph_map_cache_raw = am_db.con.execute(
         """
-        SELECT Card_Morph_Map.card_id, Morphs.lemma, Morphs.inflection, Morphs.highest_learning_interval
+        SELECT Card_Morph_Map.card_id, Morphs.lemma, Morphs.inflection, Morphs.highest_learning_interval, Morphs.morph_id
         FROM Card_Morph_Map
+        INNER JOIN Cards ON
+            Card_Morph_Map.card_id = Cards.card_id
         INNER JOIN Morphs ON
-            Card_Morph_Map.morph_lemma = Morphs.lemma AND Card_Morph_Map.morph_inflection = Morphs.inflection
+            Card_Morph_Map.morph_id = Morphs.morph_id
+        WHERE Cards.note_type_id = ? AND Card_Morph_Map.card_id BETWEEN ? AND ?
         ORDER BY Morphs.lemma, Morphs.inflection
         """,
+        (note_type_id, *card_id_range),
     ).fetchall()
 
     for row in card_morph_map_cache_raw:
         card_id = row[0]
-        morph = Morpheme(
-            lemma=row[1], inflection=row[2], highest_learning_interval=row[3]
+        morph = morph_registry.get_morph(
+            lemma=row[1],
+            inflection=row[2],
+            highest_learning_interval=row[3],
+            morph_id=row[4],
         )
 
         if card_id not in card_morph_map_cache:
@@ -556,224 +735,93 @@ def _get_card_morph_map_cache(am_db: AnkiMorphsDB) -> dict[int, list[Morpheme]]:
 def _get_morph_priority(
     am_db: AnkiMorphsDB,
     am_config_filter: AnkiMorphsConfigFilter,
-) -> dict[str, int]:
+    frequency_file_priorities: dict[str, dict[int, int]],
+) -> dict[int, int]:
+    # The priorities are keyed by the morph ids. The priorities of the
+    # frequency files are stored in frequency_file_priorities (file name ->
+    # priorities), which only lives as long as the current recalc.
     if am_config_filter.morph_priority_index == 0:
-        morph_priority = _get_morph_collection_priority(am_db)
-    else:
-        morph_priority = _get_morph_frequency_file_priority(
-            am_config_filter.morph_priority
-        )
-    return morph_priority
-
+        return am_db.get_morph_collection_priorities()
 
-@functools.cache
-def _get_morph_collection_priority(am_db: AnkiMorphsDB) -> dict[str, int]:
-    # Sorting the morphs (ORDER BY) is crucial to avoid bugs
-    morph_priority = am_db.con.execute(
-        """
-        SELECT morph_lemma, morph_inflection
-        FROM Card_Morph_Map
-        ORDER BY morph_lemma, morph_inflection
-        """,
-    ).fetchall()
-
-    temp_list = []
-    for row in morph_priority:
-        temp_list.append(row[0] + row[1])
-
-    card_morph_map_cache_sorted: dict[str, int] = dict(Counter(temp_list).most_common())
-
-    # reverse the values, the lower the priority number is, the more it is prioritized
-    for index, key in enumerate(card_morph_map_cache_sorted):
-        card_morph_map_cache_sorted[key] = index
-
-    return card_morph_map_cache_sorted
+    frequency_file_name: str = am_config_filter.morph_priority
+    if frequency_file_name not in frequency_file_priorities:
+        frequency_file_priorities[frequency_file_name] = (
+            _get_morph_frequency_file_priority(am_db, frequency_file_name)
+        )
+    return frequency_file_priorities[frequency_file_name]
 
 
-def _get_morph_frequency_file_priority(frequency_file_name: str) -> dict[str, int]:
+def _get_morph_frequency_file_priority(
+    am_db: AnkiMorphsDB, frequency_file_name: str
+) -> dict[int, int]:
+    # The parsed frequency files are stored in ankimorphs.db, so a file
+    # only has to be parsed again when it has changed.
     assert mw is not None
 
-    morph_priority: dict[str, int] = {}
     frequency_file_path = os.path.join(
         mw.pm.profileFolder(), "frequency-files", frequency_file_name
     )
     try:
-        with open(frequency_file_path, mode="r+", encoding="utf-8") as csvfile:
-            morph_reader = csv.reader(csvfile, delimiter=",")
-            next(morph_reader, None)  # skip the headers
-            for index, row in enumerate(morph_reader):
-                if index > 50000:
-                    # the difficulty algorithm ignores values > 50K
-                    # so any rows after this will be ignored anyway
-                    break
-                key = row[0] + row[1]
-                morph_priority[key] = index
+        file_stat: os.stat_result = os.stat(frequency_file_path)
+        file_fingerprint: tuple[int, int] = (file_stat.st_size, file_stat.st_mtime_ns)
+
+        cached_fingerprint: Optional[tuple[int, int]] = (
+            am_db.get_frequency_file_fingerprint(frequency_file_name)
+        )
+        if cached_fingerprint != file_fingerprint:
+            morph_priorities: list[tuple[str, str, int]] = []
+            with open(frequency_file_path, mode="r+", encoding="utf-8") as csvfile:
+                morph_reader = csv.reader(csvfile, delimiter=",")
+                next(morph_reader, None)  # skip the headers
+                for index, row in enumerate(morph_reader):
+                    if index > 50000:
+                        # the difficulty algorithm ignores values > 50K
+                        # so any rows after this will be ignored anyway
+                        break
+                    morph_priorities.append((row[0], row[1], index))
+
+            am_db.insert_frequency_file(
+                frequency_file_name, *file_fingerprint, morph_priorities
+            )
+            recalc_profiler.count("frequency_files_read")
     except FileNotFoundError as error:
         raise FrequencyFileNotFoundException(frequency_file_path) from error
-    return morph_priority
 
+    return am_db.get_frequency_file_morph_priorities(frequency_file_name)
 
-def _get_am_cards_data_dict(
-    am_db: AnkiMorphsDB, note_type_id: int
-) -> dict[int, AnkiMorphsCardData]:
-    assert mw is not None
-    assert mw.col.db is not None
-
-    result = am_db.con.execute(
-        """
-        SELECT card_id, note_id, note_type_id, card_type, fields, tags
-        FROM Cards
-        WHERE note_type_id = ?
-        """,
-        (note_type_id,),
-    ).fetchall()
-
-    am_db_row_data_dict: dict[int, AnkiMorphsCardData] = {}
-    for am_data in map(AnkiMorphsCardData, result):
-        am_db_row_data_dict[am_data.card_id] = am_data
-    return am_db_row_data_dict
-
-
-def _get_card_difficulty_and_unknowns_and_learning_status(
-    am_config: AnkiMorphsConfig,
-    card_id: int,
-    card_morph_map_cache: dict[int, list[Morpheme]],
-    morph_priority: dict[str, int],
-) -> tuple[int, list[Morpheme], bool]:
-    ####################################################################################
-    #                                      ALGORITHM
-    ####################################################################################
-    # We want our algorithm to determine difficulty based on the following importance:
-    #     1. If the card has unknown morphs (unknown_morph_penalty)
-    #     2. The priority of the card's morphs (morph_priority_penalty)
-    #
-    # Stated in a different way: one unknown morph must be penalized more than any number
-    # of known morphs with low priorities. To achieve this, we get the constraint:
-    #     unknown_morph_penalty > sum(morph_priority_penalty) #(1.1)
-    #
-    # We need to set some arbitrary limits to make the algorithm practical:
-    #     1. Assume max(morph_priority_penalty) = 50k (a frequency list of 50k morphs) #(2.1)
-    #     2. Limit max(sum(morph_priority_penalty)) = max(morph_priority_penalty) * 10 #(2.2)
-    #
-    # With the equations #(1.1), #(2.1), and #(2.2) we get:
-    #     morph_unknown_penalty = 500,000
-    ####################################################################################
-
-    morph_unknown_penalty = 500000
-    unknown_morphs: list[Morpheme] = []
-    has_learning_morph: bool = False
 
-    try:
-        card_morphs: list[Morpheme] = card_morph_map_cache[card_id]
-    except KeyError:
-        # card does not have morphs or is buggy in some way
-        return _DEFAULT_DIFFICULTY, unknown_morphs, has_learning_morph
-
-    difficulty = 0
-
-    for morph in card_morphs:
-        assert morph.highest_learning_interval is not None
-
-        if morph.highest_learning_interval == 0:
-            unknown_morphs.append(morph)
-        elif morph.highest_learning_interval <= am_config.recalc_interval_for_known:
-            has_learning_morph = True
-
-        if morph.lemma_and_inflection not in morph_priority:
-            # Heavily penalizes if a morph is not in frequency file
-            difficulty = morph_unknown_penalty - 1
-        else:
-            difficulty += morph_priority[morph.lemma_and_inflection]
-
-    if len(unknown_morphs) == 0 and am_config.skip_only_known_morphs_cards:
-        # Move stale cards to the end of the queue
-        return _DEFAULT_DIFFICULTY, unknown_morphs, has_learning_morph
-
-    if difficulty >= morph_unknown_penalty:
-        # Cap morph priority penalties as described in #(2.2)
-        difficulty = morph_unknown_penalty - 1
-
-    difficulty += len(unknown_morphs) * morph_unknown_penalty
-
-    # cap difficulty to prevent 32-bit integer overflow
-    difficulty = min(difficulty, _DEFAULT_DIFFICULTY)
-
-    return difficulty, unknown_morphs, has_learning_morph
-
-
-def _update_unknowns_field(
-    am_config: AnkiMorphsConfig,
-    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
-    note: Note,
-    unknowns: list[Morpheme],
-) -> None:
-    focus_morph_string: str
-
-    if am_config.recalc_unknowns_field_shows_inflections:
-        focus_morph_string = "".join(f"{unknown.inflection}, " for unknown in unknowns)
-    else:
-        focus_morph_string = "".join(f"{unknown.lemma}, " for unknown in unknowns)
-
-    focus_morph_string = focus_morph_string[:-2]  # removes last comma and whitespace
-    index: int = note_type_field_name_dict[ankimorphs_globals.EXTRA_FIELD_UNKNOWNS][0]
-    note.fields[index] = focus_morph_string
-
-
-def _update_unknowns_count_field(
-    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
-    note: Note,
-    unknowns: list[Morpheme],
-) -> None:
-    index: int = note_type_field_name_dict[
-        ankimorphs_globals.EXTRA_FIELD_UNKNOWNS_COUNT
-    ][0]
-    note.fields[index] = str(len(unknowns))
-
-
-def _update_difficulty_field(
-    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
-    note: Note,
-    difficulty: int,
-) -> None:
-    index: int = note_type_field_name_dict[ankimorphs_globals.EXTRA_FIELD_DIFFICULTY][0]
-    note.fields[index] = str(difficulty)
-
-
-def _update_highlighted_field(  # pylint:disable=too-many-arguments
-    am_config: AnkiMorphsConfig,
-    config_filter: AnkiMorphsConfigFilter,
-    note_type_field_name_dict: dict[str, tuple[int, FieldDict]],
-    card_morph_map_cache: dict[int, list[Morpheme]],
-    card_id: int,
-    note: Note,
-) -> None:
-    try:
-        card_morphs: list[Morpheme] = card_morph_map_cache[card_id]
-    except KeyError:
-        # card does not have morphs or is buggy in some way
-        return
-
-    assert config_filter.field_index is not None
-    text_to_highlight = note.fields[config_filter.field_index]
-    highlighted_text = text_highlighting.get_highlighted_text(
-        am_config,
-        card_morphs,
-        text_to_highlight,
-    )
-
-    highlighted_index: int = note_type_field_name_dict[
-        ankimorphs_globals.EXTRA_FIELD_HIGHLIGHTED
-    ][0]
-    note.fields[highlighted_index] = highlighted_text
+def _get_am_cards_data_chunks(
+    am_db: AnkiMorphsDB, note_type_id: int
+) -> Iterator[dict[int, AnkiMorphsCardData]]:
+    # Yields the cards of the note type, _CARDS_PER_CHUNK cards at a time,
+    # paged through by their id, which uses Cards_Note_Type_Index.
+    last_card_id: int = -1
+
+    while True:
+        result = am_db.con.execute(
+            """
+            SELECT card_id, note_id, note_type_id, card_type, fields, tags
+            FROM Cards
+            WHERE note_type_id = ? AND card_id > ?
+            ORDER BY card_id
+            LIMIT ?
+            """,
+            (note_type_id, last_card_id, _CARDS_PER_CHUNK),
+        ).fetchall()
+        if len(result) == 0:
+            return
+
+        last_card_id = result[-1][0]
+        yield {am_data.card_id: am_data for am_data in map(AnkiMorphsCardData, result)}
 
 
 def _update_tags_and_queue(
     am_config: AnkiMorphsConfig,
-    note: Note,
-    card: Card,
+    tags: list[str],
+    queue: int,
     unknowns: int,
     has_learning_morphs: bool,
-) -> None:
+) -> int:
     # There are 3 different tags that we want recalc to update:
     # - am-ready
     # - am-not-ready
@@ -786,6 +834,8 @@ def _update_tags_and_queue(
     # redundant.
     #
     # Note: only new cards are handled in this function!
+    #
+    # The tags are updated in place, and the new queue is returned.
 
     suspended = CardQueue(-1)
     mutually_exclusive_tags: list[str] = [
@@ -794,32 +844,34 @@ def _update_tags_and_queue(
         am_config.tag_known_automatically,
     ]
 
-    if am_config.tag_known_manually in note.tags:
-        remove_exclusive_tags(note, mutually_exclusive_tags)
+    if am_config.tag_known_manually in tags:
+        remove_exclusive_tags(tags, mutually_exclusive_tags)
     elif unknowns == 0:
-        if am_config.recalc_suspend_known_new_cards and card.queue != suspended:
-            card.queue = suspended
-        if am_config.tag_known_automatically not in note.tags:
-            remove_exclusive_tags(note, mutually_exclusive_tags)
+        if am_config.recalc_suspend_known_new_cards and queue != suspended:
+            queue = suspended
+        if am_config.tag_known_automatically not in tags:
+            remove_exclusive_tags(tags, mutually_exclusive_tags)
             # if a card has any learning morphs, then we don't want to
             # give it a 'known' tag because that would automatically
             # give the morphs a 'known'-status instead of 'learning'
             if not has_learning_morphs:
-                note.tags.append(am_config.tag_known_automatically)
+                tags.append(am_config.tag_known_automatically)
     elif unknowns == 1:
-        if am_config.tag_ready not in note.tags:
-            remove_exclusive_tags(note, mutually_exclusive_tags)
-            note.tags.append(am_config.tag_ready)
+        if am_config.tag_ready not in tags:
+            remove_exclusive_tags(tags, mutually_exclusive_tags)
+            tags.append(am_config.tag_ready)
     else:
-        if am_config.tag_not_ready not in note.tags:
-            remove_exclusive_tags(note, mutually_exclusive_tags)
-            note.tags.append(am_config.tag_not_ready)
+        if am_config.tag_not_ready not in tags:
+            remove_exclusive_tags(tags, mutually_exclusive_tags)
+            tags.append(am_config.tag_not_ready)
 
+    return queue
 
-def remove_exclusive_tags(note: Note, mutually_exclusive_tags: list[str]) -> None:
+
+def remove_exclusive_tags(tags: list[str], mutually_exclusive_tags: list[str]) -> None:
     for tag in mutually_exclusive_tags:
-        if tag in note.tags:
-            note.tags.remove(tag)
+        if tag in tags:
+            tags.remove(tag)
 
 
 def _on_success(result: Any) -> None:
@@ -832,6 +884,7 @@ def _on_success(result: Any) -> None:
     mw.toolbar.draw()  # updates stats
     mw.progress.finish()
     tooltip("Finished Recalc", parent=mw)
+    recalc_profiler.finish()
     if _start_time is not None:
         end_time: float = time.time()
         print(f"Recalc duration: {round(end_time - _start_time, 3)} seconds")
@@ -872,6 +925,20 @@ def _on_failure(
     critical_box.exec()
 
 
+def _update_extraction_progress(
+    note_type: str, progress: tuple[int, int], counter: int, max_value: int
+) -> None:
+    # The morphs are extracted a chunk at a time, so the counter and max_value
+    # are relative to the chunk, while progress is (counter_offset, card_amount)
+    del max_value  # unused
+    counter_offset, card_amount = progress
+    update_progress_potentially_cancel(
+        label=f"Extracting morphs from\n{note_type} cards\n card: {counter_offset + counter} of {card_amount}",
+        counter=counter_offset + counter,
+        max_value=card_amount,
+    )
+
+
 def update_progress_potentially_cancel(
     label: str, counter: int, max_value: int
 ) -> None:
@@ -0,0 +1,204 @@
+import html
+import json
+import os
+import time
+from datetime import datetime
+from types import TracebackType
+from typing import Any, Optional
+
+from anki.utils import is_mac, is_win
+from aqt import mw
+from aqt.utils import showText
+
+################################################################
+#                        RECALC PROFILER
+################################################################
+# Records the wall and cpu time of the phases of recalc, along
+# with some counters, so performance regressions can be spotted
+# without attaching a profiler. The report of each run is added
+# to a json log in the profile folder, and the latest report can
+# be viewed from the AnkiMorphs menu.
+#
+# The cpu time is the time of the recalc thread, so the time
+# spent in spacy's worker processes is not included, and the
+# difference between the wall and cpu time is mostly time spent
+# waiting on those (or on the disk).
+#
+# The profiler is a module level singleton since recalc is the
+# only thing that uses it, and threading it through all the
+# recalc functions would be a lot of noise. When no recalc is
+# running the phases and counters are simply ignored.
+################################################################
+
+PROFILE_LOG_FILE_NAME: str = "ankimorphs_recalc_profile.json"
+
+# the log only keeps the most recent reports
+_MAX_LOGGED_REPORTS: int = 50
+
+
+class _Phase:
+    # A class based context manager has less overhead than @contextmanager,
+    # which matters for the phases that are entered once per card.
+    __slots__ = ("wall", "cpu", "calls", "_wall_start", "_cpu_start")
+
+    def __init__(self) -> None:
+        self.wall: float = 0.0
+        self.cpu: float = 0.0
+        self.calls: int = 0
+        self._wall_start: float = 0.0
+        self._cpu_start: float = 0.0
+
+    def __enter__(self) -> None:
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.wall += time.perf_counter() - self._wall_start
+        self.cpu += time.thread_time() - self._cpu_start
+        self.calls += 1
+
+
+class RecalcProfiler:
+    def __init__(self) -> None:
+        self._phases: dict[str, _Phase] = {}
+        self._counters: dict[str, int] = {}
+        self._wall_start: float = time.perf_counter()
+        self._cpu_start: float = time.process_time()
+
+    def phase(self, name: str) -> _Phase:
+        try:
+            return self._phases[name]
+        except KeyError:
+            self._phases[name] = _Phase()
+            return self._phases[name]
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self._counters[name] = self._counters.get(name, 0) + amount
+
+    def get_report(self) -> dict[str, Any]:
+        hits: int = self._counters.get("morphemizer_cache_hits", 0)
+        misses: int = self._counters.get("morphemizer_cache_misses", 0)
+        cache_hit_rate: Optional[float] = None
+        if hits + misses > 0:
+            cache_hit_rate = round(hits / (hits + misses), 4)
+
+        return {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self._wall_start, 3),
+            "cpu_seconds": round(time.process_time() - self._cpu_start, 3),
+            "peak_rss_mb": _get_peak_rss_mb(),
+            "morphemizer_cache_hit_rate": cache_hit_rate,
+            "phases": {
+                name: {
+                    "wall_seconds": round(phase.wall, 3),
+                    "cpu_seconds": round(phase.cpu, 3),
+                    "calls": phase.calls,
+                }
+                for name, phase in self._phases.items()
+            },
+            "counters": dict(self._counters),
+        }
+
+
+# recalc can be cancelled midway, so there is always a fresh profiler
+_profiler: RecalcProfiler = RecalcProfiler()
+
+
+def start() -> None:
+    global _profiler
+    _profiler = RecalcProfiler()
+
+
+def phase(name: str) -> _Phase:
+    return _profiler.phase(name)
+
+
+def count(name: str, amount: int = 1) -> None:
+    _profiler.count(name, amount)
+
+
+def finish() -> dict[str, Any]:
+    # Writes the report of the current recalc to the log and returns it
+    report: dict[str, Any] = _profiler.get_report()
+    reports: list[dict[str, Any]] = _read_reports()
+    reports.append(report)
+
+    with open(_get_log_path(), mode="w", encoding="utf-8") as file:
+        json.dump(reports[-_MAX_LOGGED_REPORTS:], file, indent=2)
+
+    return report
+
+
+def show_latest_report() -> None:
+    assert mw is not None
+
+    reports: list[dict[str, Any]] = _read_reports()
+    if len(reports) == 0:
+        showText("Recalc has not been run yet.", parent=mw, title="Recalc Profile")
+        return
+
+    # the report is a fixed width table, so it has to be shown in a monospace font
+    showText(
+        f"<pre>{html.escape(_format_report(reports[-1]))}</pre>",
+        parent=mw,
+        type="html",
+        title="Recalc Profile",
+        copyBtn=True,
+    )
+
+
+def _format_report(report: dict[str, Any]) -> str:
+    lines: list[str] = [
+        f"Recalc at {report['date']}",
+        f"Total: {report['wall_seconds']}s wall, {report['cpu_seconds']}s cpu",
+        f"Peak memory: {report['peak_rss_mb']} MB",
+        f"Morphemizer cache hit rate: {report['morphemizer_cache_hit_rate']}",
+        "",
+        f"{'Phase':<40}{'Wall (s)':>10}{'CPU (s)':>10}{'Calls':>10}",
+    ]
+    for name, phase_report in report["phases"].items():
+        lines.append(
+            f"{name:<40}{phase_report['wall_seconds']:>10}"
+            f"{phase_report['cpu_seconds']:>10}{phase_report['calls']:>10}"
+        )
+    lines.append("")
+    lines.append(f"{'Counter':<40}{'Value':>10}")
+    for name, value in report["counters"].items():
+        lines.append(f"{name:<40}{value:>10}")
+    lines.append("")
+    lines.append(
+        f"The reports are saved in {PROFILE_LOG_FILE_NAME} in the profile folder"
+    )
+    return "\n".join(lines)
+
+
+def _read_reports() -> list[dict[str, Any]]:
+    try:
+        with open(_get_log_path(), encoding="utf-8") as file:
+            reports: list[dict[str, Any]] = json.load(file)
+            return reports
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def _get_log_path() -> str:
+    assert mw is not None
+    return os.path.join(mw.pm.profileFolder(), PROFILE_LOG_FILE_NAME)
+
+
+def _get_peak_rss_mb() -> Optional[float]:
+    if is_win:
+        # the resource module is not available on windows
+        return None
+
+    import resource  # pylint:disable=import-outside-toplevel
+
+    max_rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if is_mac:
+        return round(max_rss / 1024**2, 1)  # bytes
+    return round(max_rss / 1024, 1)  # kilobytes
@@ -119,8 +119,8 @@ def _get_next_card_background(
         if am_config_filter is None:
             break  # card did not match any (note type and tags) set in the settings GUI
 
-        card_unknown_morphs: Optional[set[tuple[str, str]]] = am_db.get_morphs_of_card(
-            reviewer.card.id, search_unknowns=True
+        card_unknown_morphs: Optional[set[int]] = am_db.get_unknown_morphs_of_card(
+            reviewer.card.id
         )
 
         if card_unknown_morphs is None:
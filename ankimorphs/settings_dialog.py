@@ -431,6 +431,9 @@ class SettingsDialog(QDialog):  # pylint:disable=too-many-instance-attributes
 
     def _populate_recalc_tab(self) -> None:
         self.ui.recalcIntervalSpinBox.setValue(self._config.recalc_interval_for_known)
+        self.ui.recalcMorphemizerWorkersSpinBox.setValue(
+            self._config.recalc_morphemizer_workers
+        )
         self.ui.recalcBeforeSyncCheckBox.setChecked(self._config.recalc_on_sync)
         self.ui.recalcSuspendKnownCheckBox.setChecked(
             self._config.recalc_suspend_known_new_cards
@@ -463,6 +466,9 @@ class SettingsDialog(QDialog):  # pylint:disable=too-many-instance-attributes
         self.ui.recalcIntervalSpinBox.setValue(
             self._default_config.recalc_interval_for_known
         )
+        self.ui.recalcMorphemizerWorkersSpinBox.setValue(
+            self._default_config.recalc_morphemizer_workers
+        )
         self.ui.recalcBeforeSyncCheckBox.setChecked(self._default_config.recalc_on_sync)
         self.ui.recalcSuspendKnownCheckBox.setChecked(
             self._default_config.recalc_suspend_known_new_cards
@@ -604,6 +610,7 @@ class SettingsDialog(QDialog):  # pylint:disable=too-many-instance-attributes
             "shortcut_frequency_file_generator": self.ui.shortcutFrequencyFileGeneratorKeySequenceEdit.keySequence().toString(),
             "shortcut_known_morphs_exporter": self.ui.shortcutKnownMorphsExporterKeySequenceEdit.keySequence().toString(),
             "recalc_interval_for_known": self.ui.recalcIntervalSpinBox.value(),
+            "recalc_morphemizer_workers": self.ui.recalcMorphemizerWorkersSpinBox.value(),
             "recalc_on_sync": self.ui.recalcBeforeSyncCheckBox.isChecked(),
             "recalc_suspend_known_new_cards": self.ui.recalcSuspendKnownCheckBox.isChecked(),
             "recalc_read_known_morphs_folder": self.ui.recalcReadKnownMorphsFolderCheckBox.isChecked(),
@@ -25,14 +25,11 @@ class SkippedCards:
         am_config: AnkiMorphsConfig,
         am_db: AnkiMorphsDB,
         note: Note,
-        card_unknown_morphs_raw: set[tuple[str, str]],
+        card_unknown_morphs: set[int],
     ) -> None:
         self.did_skip_card = False
 
-        morphs_already_seen_morphs_today: set[str] = am_db.get_all_morphs_seen_today()
-        card_unknown_morphs: set[str] = {
-            morph_raw[0] + morph_raw[1] for morph_raw in card_unknown_morphs_raw
-        }
+        morphs_already_seen_morphs_today: set[int] = am_db.get_all_morphs_seen_today()
 
         learn_now_tag: bool = note.has_tag(am_config.tag_learn_card_now)
         known_automatically: bool = note.has_tag(am_config.tag_known_automatically)
@@ -1,14 +1,80 @@
+import multiprocessing
 import os.path
 import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional
 
 from anki.utils import is_win
 from aqt import mw
 
+from .ankimorphs_config import AnkiMorphsConfig
+
 updated_python_path: bool = False
 testing_environment: bool = False
 
 
-def get_nlp(spacy_model_name: str):  # type: ignore[no-untyped-def] # pylint:disable=too-many-branches, too-many-statements
+################################################################
+#                        MODEL REGISTRY
+################################################################
+# Loading a spacy model takes several seconds, so the loaded models
+# are kept in a registry and reused by recalc and the generators,
+# also when multiple note filters use the same model.
+#
+# The models are loaded lazily, and only the most recently used
+# models are kept to limit the memory usage (each model can use
+# hundreds of MB). The disabled pipes, custom pipes, and tokenizer
+# changes in _load_nlp are all determined by the model, so the
+# model name is enough to identify a loaded model.
+#
+# Recalc and the generators run on background threads, so the
+# registry is protected by a lock, which also prevents the same
+# model from being loaded twice at the same time.
+################################################################
+_MAX_LOADED_MODELS: int = 2
+_loaded_models: OrderedDict[str, Any] = OrderedDict()
+_loaded_models_lock = threading.Lock()
+
+
+def get_nlp(spacy_model_name: str):  # type: ignore[no-untyped-def]
+    # -> Optional[spacy.Language]
+    with _loaded_models_lock:
+        if spacy_model_name in _loaded_models:
+            _loaded_models.move_to_end(spacy_model_name)
+            return _loaded_models[spacy_model_name]
+
+        nlp = _load_nlp(spacy_model_name)
+        if nlp is None:
+            # spacy not installed
+            return None
+
+        _loaded_models[spacy_model_name] = nlp
+        while len(_loaded_models) > _MAX_LOADED_MODELS:
+            # removes the least recently used model
+            _loaded_models.popitem(last=False)
+        return nlp
+
+
+def prewarm_models(am_config: AnkiMorphsConfig) -> None:
+    # Loads the spacy models used by the note filters ahead of time, this
+    # runs on a background thread when the profile is opened.
+    installed_models: list[str] = get_installed_models()
+    spacy_models: list[str] = []
+    for config_filter in am_config.filters:
+        spacy_model = config_filter.morphemizer_description.removeprefix("spaCy: ")
+        if (
+            config_filter.read
+            and spacy_model in installed_models
+            and spacy_model not in spacy_models
+        ):
+            spacy_models.append(spacy_model)
+
+    for spacy_model in spacy_models[:_MAX_LOADED_MODELS]:
+        get_nlp(spacy_model)
+
+
+def _load_nlp(spacy_model_name: str):  # type: ignore[no-untyped-def] # pylint:disable=too-many-branches, too-many-statements
     # -> Optional[spacy.Language]
     try:
         import spacy  # pylint:disable=import-outside-toplevel
@@ -319,6 +385,82 @@ def get_nlp(spacy_model_name: str):  # type: ignore[no-untyped-def] # pylint:dis
     return nlp
 
 
+def get_model_version(spacy_model_name: str) -> Optional[str]:
+    # This reads the version from the package metadata,
+    # so the model does not have to be loaded.
+    try:
+        import spacy.util  # pylint:disable=import-outside-toplevel
+    except ModuleNotFoundError:
+        # spacy not installed
+        return None
+
+    version: Optional[str] = spacy.util.get_package_version(spacy_model_name)
+    return version
+
+
+class SpacyPipeline:
+    ################################################################
+    #                      SPACY EXECUTION LAYER
+    ################################################################
+    # All the texts that are processed by spaCy go through this class,
+    # which uses the batch size and number of processes that are
+    # configured for the model in 'spacy_pipe_settings', e.g.:
+    #    "spacy_pipe_settings": {
+    #        "ja_core_news_sm": {"batch_size": 256, "n_process": 4}
+    #    }
+    # Models that are not in 'spacy_pipe_settings' use spaCy's default
+    # batch size and a single process. Multiple processes are only used
+    # when 'n_process' is set explicitly, since spaCy then forks Anki,
+    # which has a lot of threads running, from a background thread.
+    ################################################################
+
+    def __init__(self, nlp, batch_size: Optional[int], n_process: int) -> None:  # type: ignore[no-untyped-def]
+        # nlp: spacy.Language
+        self.nlp = nlp
+        self.batch_size: Optional[int] = batch_size
+        self.n_process: int = _get_n_process(n_process)
+
+    def pipe(self, texts: Iterable[str]) -> Iterator[Any]:
+        # -> Iterator[spacy.tokens.Doc], in the same order as the texts
+        docs: Iterator[Any] = self.nlp.pipe(
+            texts, batch_size=self.batch_size, n_process=self.n_process
+        )
+        return docs
+
+
+def get_spacy_pipeline(
+    spacy_model_name: str, pipe_settings: dict[str, int]
+) -> Optional[SpacyPipeline]:
+    # pipe_settings: see AnkiMorphsConfig.get_spacy_pipe_settings()
+    nlp = get_nlp(spacy_model_name)
+    if nlp is None:
+        # spacy not installed
+        return None
+
+    return SpacyPipeline(
+        nlp,
+        batch_size=pipe_settings.get("batch_size"),
+        n_process=pipe_settings.get("n_process", 1),
+    )
+
+
+def _get_n_process(n_process: int) -> int:
+    # spaCy uses multiprocessing for n_process > 1. When the processes
+    # are spawned instead of forked (windows and macOS) they would start
+    # from Anki's executable, so we only use multiple processes when
+    # they can be forked.
+    #
+    # Note: get_start_method() without allow_none would fix the start
+    # method for Anki and all the other add-ons. When it has not been
+    # set yet, the platform default is the first of all start methods.
+    start_method: Optional[str] = multiprocessing.get_start_method(allow_none=True)
+    if start_method is None:
+        start_method = multiprocessing.get_all_start_methods()[0]
+    if start_method != "fork":
+        return 1
+    return max(n_process, 1)
+
+
 def get_installed_models() -> list[str]:
     try:
         global updated_python_path
@@ -1,10 +1,14 @@
+import functools
 import re
+from collections.abc import Iterator
 from typing import Optional
 
 from . import text_preprocessing
 from .ankimorphs_config import AnkiMorphsConfig
 from .morpheme import Morpheme
 
+_MORPH_REGEX_PATTERN_CACHE_SIZE: int = 20000
+
 
 class SpanElement:
 
@@ -135,6 +139,16 @@ def get_highlighted_text(
     return "".join(highlighted_text_list)
 
 
+def get_morph_status(am_config: AnkiMorphsConfig, morph: Morpheme) -> str:
+    assert morph.highest_learning_interval is not None
+
+    if morph.highest_learning_interval == 0:
+        return "unknown"
+    if morph.highest_learning_interval < am_config.recalc_interval_for_known:
+        return "learning"
+    return "known"
+
+
 def _extract_ruby_characters_and_filter_string(
     am_config: AnkiMorphsConfig, text_to_highlight: str
 ) -> tuple[dict[int, str], str]:
@@ -146,22 +160,22 @@ def _extract_ruby_characters_and_filter_string(
     if not am_config.preprocess_ignore_bracket_contents:
         return ruby_character_dict, text_to_highlight
 
-    while True:
-        # matches first found, left to right
-        match: Optional[re.Match[str]] = re.search(
-            text_preprocessing.square_brackets_regex, text_to_highlight
-        )
-        if match is None:
-            break
-
-        ruby_character_dict[match.start()] = match.group()
-
-        # remove the found match from the string and repeat
-        text_to_highlight = (
-            text_to_highlight[: match.start()] + text_to_highlight[match.end() :]
-        )
+    # The ruby characters are stored with their index in the filtered string,
+    # i.e. the index in the original string minus the length of the ruby
+    # characters that came before them. Removing a match can't create a new
+    # match before it, so the matches are the same as if we removed them one
+    # at a time.
+    removed_length: int = 0
+    for match in text_preprocessing.square_brackets_regex.finditer(text_to_highlight):
+        ruby_character_dict[match.start() - removed_length] = match.group()
+        removed_length += match.end() - match.start()
+
+    if removed_length == 0:
+        return ruby_character_dict, text_to_highlight
 
-    return ruby_character_dict, text_to_highlight
+    return ruby_character_dict, text_preprocessing.square_brackets_regex.sub(
+        "", text_to_highlight
+    )
 
 
 def _extract_span_elements_and_filter_string(
@@ -177,28 +191,39 @@ def _extract_span_elements_and_filter_string(
         reverse=True,
     )
 
+    # Instead of replacing the found morphs with whitespaces in the string, which
+    # creates a new string for every match, we mark the characters they occupy.
+    # A morph can only be placed on characters that are not occupied, which gives
+    # the same result as searching the string with the morphs replaced by whitespaces,
+    # as long as the morph does not contain whitespaces itself.
+    occupied = bytearray(len(text_to_highlight))
+    searched_inflections: set[str] = set()
+
     for morph in morphs_by_size:
         # print(f"morph: {morph.lemma}, {morph.inflection}")
-        assert morph.highest_learning_interval is not None
+        morph_status: str = get_morph_status(am_config, morph)
 
-        if morph.highest_learning_interval == 0:
-            morph_status = "unknown"
-        elif morph.highest_learning_interval < am_config.recalc_interval_for_known:
-            morph_status = "learning"
-        else:
-            morph_status = "known"
+        if morph.inflection in searched_inflections:
+            # all the matches of the inflection are already occupied
+            continue
 
-        # escaping special regex characters is crucial because morphs from malformed text
-        # sometimes can include them, e.g. "?몇"
-        regex_pattern: str = f"{re.escape(morph.inflection)}"
-        morph_matches = re.finditer(
-            regex_pattern, text_to_highlight, flags=re.IGNORECASE
-        )
+        regex_pattern: re.Pattern[str] = _get_morph_regex_pattern(morph.inflection)
+
+        if morph.inflection == "" or " " in morph.inflection:
+            # these can match the whitespaces of previously found morphs,
+            # so they have to be searched for in the filtered string
+            morph_matches = regex_pattern.finditer(
+                _get_filtered_string(text_to_highlight, occupied)
+            )
+        else:
+            searched_inflections.add(morph.inflection)
+            morph_matches = _get_unoccupied_matches(
+                regex_pattern, text_to_highlight, occupied
+            )
 
         for morph_match in morph_matches:
             start_index = morph_match.start()
             end_index = morph_match.end()
-            morph_len = end_index - start_index
 
             # the morph_match.group() maintains the original letter casing of the
             # morph found in the text, which is crucial because we want everything
@@ -206,15 +231,51 @@ def _extract_span_elements_and_filter_string(
             span_elements.append(
                 SpanElement(morph_match.group(), morph_status, start_index, end_index)
             )
+            occupied[start_index:end_index] = b"\x01" * (end_index - start_index)
 
-            # we need to preserve indices, so we replace the morphs with whitespaces
-            text_to_highlight = (
-                text_to_highlight[:start_index]
-                + "".join([" " for _ in range(morph_len)])
-                + text_to_highlight[end_index:]
-            )
+    return span_elements, _get_filtered_string(text_to_highlight, occupied)
+
+
+@functools.lru_cache(maxsize=_MORPH_REGEX_PATTERN_CACHE_SIZE)
+def _get_morph_regex_pattern(inflection: str) -> re.Pattern[str]:
+    # The re module only caches the 512 most recently used patterns,
+    # which the morphs of a collection quickly cycle through.
+    #
+    # escaping special regex characters is crucial because morphs from malformed text
+    # sometimes can include them, e.g. "?몇"
+    return re.compile(re.escape(inflection), flags=re.IGNORECASE)
+
+
+def _get_unoccupied_matches(
+    regex_pattern: re.Pattern[str], text: str, occupied: bytearray
+) -> Iterator[re.Match[str]]:
+    # Equivalent to regex_pattern.finditer(), except the matches that overlap
+    # occupied characters are skipped. A later (overlapping) match might be
+    # unoccupied, so the search continues from the first unoccupied character
+    # after the occupied one, any match that starts before it would overlap it too.
+    position: int = 0
+    while True:
+        match: Optional[re.Match[str]] = regex_pattern.search(text, position)
+        if match is None:
+            return
 
-    return span_elements, text_to_highlight
+        occupied_index: int = occupied.find(1, match.start(), match.end())
+        if occupied_index == -1:
+            yield match
+            position = match.end()
+        else:
+            position = occupied.find(0, occupied_index)
+            if position == -1:
+                return
+
+
+def _get_filtered_string(text: str, occupied: bytearray) -> str:
+    # replaces the occupied characters with whitespaces to preserve the indices
+    if occupied.find(1) == -1:
+        return text
+    return "".join(
+        " " if is_occupied else char for char, is_occupied in zip(text, occupied)
+    )
 
 
 def _get_span_element(
@@ -3,7 +3,6 @@ import re
 from . import name_file_utils
 from .ankimorphs_config import AnkiMorphsConfig
 from .morpheme import Morpheme
-from .morphemizer import Morphemizer
 
 square_brackets_regex = re.compile(r"\[[^]]*]")
 round_brackets_regex = re.compile(r"（[^）]*）")
@@ -11,38 +10,39 @@ slim_round_brackets_regexp = re.compile(r"\([^)]*\)")
 non_alpha_regexp = re.compile(r"[-'\w]")
 
 
-def get_processed_spacy_morphs(am_config: AnkiMorphsConfig, doc) -> list[Morpheme]:  # type: ignore[no-untyped-def]
+def get_spacy_morphs(doc) -> list[Morpheme]:  # type: ignore[no-untyped-def]
     # doc: spacy.tokens.Doc
+    # Returns all the tokens as morphs, i.e. before anything is filtered out,
+    # which is what is stored in the morphemizer cache.
+    return [
+        Morpheme(lemma=w.lemma_, inflection=w.text, part_of_speech=w.pos_) for w in doc
+    ]
 
-    morphs: list[Morpheme] = []
 
-    for w in doc:
-        # print(f"w: {w}")
-        if not non_alpha_regexp.search(w.text):
+def filter_spacy_morphs(
+    am_config: AnkiMorphsConfig, morphs: list[Morpheme]
+) -> list[Morpheme]:
+    filtered_morphs: list[Morpheme] = []
+
+    for morph in morphs:
+        if not non_alpha_regexp.search(morph.inflection):
             continue
 
         if am_config.preprocess_ignore_names_morphemizer:
-            if w.pos == 96:  # PROPN
+            if morph.is_proper_noun():
                 continue
 
-        morphs.append(
-            Morpheme(
-                lemma=w.lemma_,
-                inflection=w.text,
-            )
-        )
+        filtered_morphs.append(morph)
 
     if am_config.preprocess_ignore_names_textfile:
-        morphs = remove_names_textfile(morphs)
+        filtered_morphs = remove_names_textfile(filtered_morphs)
 
-    return morphs
+    return filtered_morphs
 
 
-def get_processed_morphemizer_morphs(
-    morphemizer: Morphemizer, expression: str, am_config: AnkiMorphsConfig
+def filter_morphemizer_morphs(
+    am_config: AnkiMorphsConfig, morphs: list[Morpheme]
 ) -> list[Morpheme]:
-    morphs: list[Morpheme] = morphemizer.get_morphemes_from_expr(expression)
-
     if am_config.preprocess_ignore_names_morphemizer:
         morphs = remove_names_morphemizer(morphs)
 
@@ -234,6 +234,23 @@ class Ui_SettingsDialog(object):
         spacerItem8 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
         self.horizontalLayout_6.addItem(spacerItem8)
         self.verticalLayout_17.addLayout(self.horizontalLayout_6)
+        self.horizontalLayout_13 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_13.setContentsMargins(3, 10, -1, 0)
+        self.horizontalLayout_13.setObjectName("horizontalLayout_13")
+        self.label_20 = QtWidgets.QLabel(parent=self.recalc_tab)
+        self.label_20.setObjectName("label_20")
+        self.horizontalLayout_13.addWidget(self.label_20)
+        self.recalcMorphemizerWorkersSpinBox = QtWidgets.QSpinBox(parent=self.recalc_tab)
+        self.recalcMorphemizerWorkersSpinBox.setMinimum(1)
+        self.recalcMorphemizerWorkersSpinBox.setMaximum(64)
+        self.recalcMorphemizerWorkersSpinBox.setObjectName("recalcMorphemizerWorkersSpinBox")
+        self.horizontalLayout_13.addWidget(self.recalcMorphemizerWorkersSpinBox)
+        self.label_21 = QtWidgets.QLabel(parent=self.recalc_tab)
+        self.label_21.setObjectName("label_21")
+        self.horizontalLayout_13.addWidget(self.label_21)
+        spacerItem9 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        self.horizontalLayout_13.addItem(spacerItem9)
+        self.verticalLayout_17.addLayout(self.horizontalLayout_13)
         self.verticalLayout_14 = QtWidgets.QVBoxLayout()
         self.verticalLayout_14.setContentsMargins(-1, 10, -1, -1)
         self.verticalLayout_14.setObjectName("verticalLayout_14")
@@ -262,15 +279,15 @@ class Ui_SettingsDialog(object):
         self.recalcUnknownFieldRadioButtonGroup.addButton(self.unknownsFieldShowsLemmasRadioButton)
         self.verticalLayout_22.addWidget(self.unknownsFieldShowsLemmasRadioButton)
         self.verticalLayout_17.addLayout(self.verticalLayout_22)
-        spacerItem9 = QtWidgets.QSpacerItem(17, 37, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
-        self.verticalLayout_17.addItem(spacerItem9)
+        spacerItem10 = QtWidgets.QSpacerItem(17, 37, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
+        self.verticalLayout_17.addItem(spacerItem10)
         self.horizontalLayout_9 = QtWidgets.QHBoxLayout()
         self.horizontalLayout_9.setObjectName("horizontalLayout_9")
         self.restoreRecalcPushButton = QtWidgets.QPushButton(parent=self.recalc_tab)
         self.restoreRecalcPushButton.setObjectName("restoreRecalcPushButton")
         self.horizontalLayout_9.addWidget(self.restoreRecalcPushButton)
-        spacerItem10 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
-        self.horizontalLayout_9.addItem(spacerItem10)
+        spacerItem11 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        self.horizontalLayout_9.addItem(spacerItem11)
         self.verticalLayout_17.addLayout(self.horizontalLayout_9)
         self.verticalLayout_18.addLayout(self.verticalLayout_17)
         self.tabWidget.addTab(self.recalc_tab, "")
@@ -336,8 +353,8 @@ class Ui_SettingsDialog(object):
         self.shortcutKnownMorphsExporterKeySequenceEdit.setObjectName("shortcutKnownMorphsExporterKeySequenceEdit")
         self.verticalLayout_15.addWidget(self.shortcutKnownMorphsExporterKeySequenceEdit)
         self.horizontalLayout_5.addLayout(self.verticalLayout_15)
-        spacerItem11 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
-        self.horizontalLayout_5.addItem(spacerItem11)
+        spacerItem12 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        self.horizontalLayout_5.addItem(spacerItem12)
         self.verticalLayout_24.addLayout(self.horizontalLayout_5)
         self.horizontalLayout_12 = QtWidgets.QHBoxLayout()
         self.horizontalLayout_12.setContentsMargins(-1, 10, -1, -1)
@@ -366,18 +383,18 @@ class Ui_SettingsDialog(object):
         self.shortcutBrowseReadyLemmaKeySequenceEdit.setObjectName("shortcutBrowseReadyLemmaKeySequenceEdit")
         self.verticalLayout_23.addWidget(self.shortcutBrowseReadyLemmaKeySequenceEdit)
         self.horizontalLayout_12.addLayout(self.verticalLayout_23)
-        spacerItem12 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
-        self.horizontalLayout_12.addItem(spacerItem12)
+        spacerItem13 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        self.horizontalLayout_12.addItem(spacerItem13)
         self.verticalLayout_24.addLayout(self.horizontalLayout_12)
-        spacerItem13 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
-        self.verticalLayout_24.addItem(spacerItem13)
+        spacerItem14 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Expanding)
+        self.verticalLayout_24.addItem(spacerItem14)
         self.horizontalLayout_10 = QtWidgets.QHBoxLayout()
         self.horizontalLayout_10.setObjectName("horizontalLayout_10")
         self.restoreShortcutsPushButton = QtWidgets.QPushButton(parent=self.shortcuts_tab)
         self.restoreShortcutsPushButton.setObjectName("restoreShortcutsPushButton")
         self.horizontalLayout_10.addWidget(self.restoreShortcutsPushButton)
-        spacerItem14 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
-        self.horizontalLayout_10.addItem(spacerItem14)
+        spacerItem15 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        self.horizontalLayout_10.addItem(spacerItem15)
         self.verticalLayout_24.addLayout(self.horizontalLayout_10)
         self.verticalLayout_25.addLayout(self.verticalLayout_24)
         self.tabWidget.addTab(self.shortcuts_tab, "")
@@ -387,13 +404,13 @@ class Ui_SettingsDialog(object):
         self.restoreAllDefaultsPushButton = QtWidgets.QPushButton(parent=SettingsDialog)
         self.restoreAllDefaultsPushButton.setObjectName("restoreAllDefaultsPushButton")
         self.horizontalLayout.addWidget(self.restoreAllDefaultsPushButton)
-        spacerItem15 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
-        self.horizontalLayout.addItem(spacerItem15)
+        spacerItem16 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        self.horizontalLayout.addItem(spacerItem16)
         self.ankimorphs_version_label = QtWidgets.QLabel(parent=SettingsDialog)
         self.ankimorphs_version_label.setObjectName("ankimorphs_version_label")
         self.horizontalLayout.addWidget(self.ankimorphs_version_label)
-        spacerItem16 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
-        self.horizontalLayout.addItem(spacerItem16)
+        spacerItem17 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        self.horizontalLayout.addItem(spacerItem17)
         self.cancelPushButton = QtWidgets.QPushButton(parent=SettingsDialog)
         self.cancelPushButton.setObjectName("cancelPushButton")
         self.horizontalLayout.addWidget(self.cancelPushButton)
@@ -454,6 +471,9 @@ class Ui_SettingsDialog(object):
         self.recalcReadKnownMorphsFolderCheckBox.setText(_translate("SettingsDialog", "Read files in \'known-morphs\' folder and register morphs as known"))
         self.label_16.setText(_translate("SettingsDialog", "Morphs are considered known when they have a learning interval of"))
         self.label_17.setText(_translate("SettingsDialog", "days or more"))
+        self.label_20.setText(_translate("SettingsDialog", "Extract morphs using"))
+        self.recalcMorphemizerWorkersSpinBox.setToolTip(_translate("SettingsDialog", "Only used by the Japanese (MeCab) morphemizer. spaCy uses the \'n_process\' of \'spacy_pipe_settings\' in the add-on config instead."))
+        self.label_21.setText(_translate("SettingsDialog", "MeCab workers (processes)"))
         self.toolbarStatsUseSeenRadioButton.setText(_translate("SettingsDialog", "U and A shows seen morphs (reviewed at least once)"))
         self.toolbarStatsUseKnownRadioButton.setText(_translate("SettingsDialog", "U and A shows known morphs (specified above)"))
         self.unknownsFieldShowsInflectionsRadioButton.setText(_translate("SettingsDialog", "am-unknowns field shows morph inflections"))
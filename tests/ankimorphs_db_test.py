@@ -0,0 +1,386 @@
+import os
+import random
+from collections import Counter
+from typing import Any
+from unittest import mock
+
+import aqt
+import pytest
+
+from ankimorphs import ankimorphs_db, recalc, recalc_profiler
+from ankimorphs.ankimorphs_db import AnkiMorphsDB
+from ankimorphs.exceptions import FrequencyFileNotFoundException
+
+
+@pytest.fixture
+def fake_environment(tmp_path):
+    mock_mw = mock.Mock(spec=aqt.mw)
+    mock_mw.pm.profileFolder.return_value = str(tmp_path)
+
+    patch_am_db_mw = mock.patch.object(ankimorphs_db, "mw", mock_mw)
+    patch_am_db_mw.start()
+    yield
+    patch_am_db_mw.stop()
+
+
+def _get_morph_ids(am_db: AnkiMorphsDB) -> dict[tuple[str, str], int]:
+    morphs_raw = am_db.con.execute(
+        "SELECT lemma, inflection, morph_id FROM Morphs"
+    ).fetchall()
+    return {(lemma, inflection): morph_id for lemma, inflection, morph_id in morphs_raw}
+
+
+def test_cards_with_same_morphs(fake_environment):  # pylint:disable=unused-argument
+    # morphs with quotes used to break the queries
+    card_morphs = {
+        1: [("it's", "it's"), ("a", "a")],
+        2: [("it's", "it's")],
+        3: [("a", "a"), ("be", "was")],
+        4: [("be", "is")],
+    }
+    learning_intervals = {1: 0, 2: 0, 3: 10, 4: 0}
+
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.insert_many_into_card_table(
+        [
+            {
+                "card_id": card_id,
+                "note_id": card_id,
+                "note_type_id": 1,
+                "card_type": 0,
+                "fields": "",
+                "tags": "",
+                "learning_interval": learning_interval,
+            }
+            for card_id, learning_interval in learning_intervals.items()
+        ]
+    )
+    am_db.insert_many_into_card_morph_map_table(
+        [
+            {"card_id": card_id, "morph_lemma": lemma, "morph_inflection": inflection}
+            for card_id, morphs in card_morphs.items()
+            for lemma, inflection in morphs
+        ]
+    )
+    am_db.create_indexes()
+    am_db.rebuild_morph_table()
+
+    # the reverse lookups should use the index instead of scanning the table
+    query_plan = am_db.con.execute(
+        """
+            EXPLAIN QUERY PLAN
+            SELECT card_id
+            FROM Card_Morph_Map
+            WHERE morph_id = ?
+            """,
+        (1,),
+    ).fetchall()
+    assert "Card_Morph_Map_Morph_Index" in str(query_plan)
+
+    assert am_db.get_ids_of_cards_with_same_morphs(1) == {1, 2, 3}
+    assert am_db.get_ids_of_cards_with_same_morphs(1, search_unknowns=True) == {1, 2}
+    assert am_db.get_ids_of_cards_with_same_morphs(3) == {1, 3}
+    assert am_db.get_ids_of_cards_with_same_morphs(
+        4, search_unknowns=True, search_lemma_only=True
+    ) == {3, 4}
+    assert am_db.get_ids_of_cards_with_same_morphs(5) is None
+
+    # the unknown morphs are looked up with a join until recalc prepares the table
+    for rebuild_table in [False, True]:
+        if rebuild_table:
+            am_db.rebuild_card_unknown_morphs_table()
+        for card_id in [1, 2, 3, 4, 5]:
+            assert am_db.get_unknown_morphs_of_card(
+                card_id
+            ) == am_db.get_morphs_of_card(card_id, search_unknowns=True)
+    assert am_db.get_unknown_morphs_of_card(3) is None
+    am_db.con.close()
+
+
+def test_morph_ids(fake_environment):  # pylint:disable=unused-argument
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.insert_many_into_card_table(
+        [
+            {
+                "card_id": card_id,
+                "note_id": card_id,
+                "note_type_id": 1,
+                "card_type": 0,
+                "fields": "",
+                "tags": "",
+                "learning_interval": card_id,
+            }
+            for card_id in [1, 2]
+        ]
+    )
+    am_db.insert_many_into_card_morph_map_table(
+        [
+            {"card_id": 1, "morph_lemma": "a", "morph_inflection": "a"},
+            {"card_id": 1, "morph_lemma": "b", "morph_inflection": "b"},
+            {"card_id": 2, "morph_lemma": "b", "morph_inflection": "b"},
+        ]
+    )
+    am_db.create_indexes()
+    am_db.rebuild_morph_table()
+    morph_ids = _get_morph_ids(am_db)
+    assert len(set(morph_ids.values())) == 2
+    assert am_db.get_highest_learning_interval("b", "b") == 2
+
+    # the morphs that are still on cards keep their ids, and the ids
+    # of the removed morphs are not reused
+    am_db.delete_card_morph_map_of_cards([1])
+    am_db.insert_many_into_card_morph_map_table(
+        [{"card_id": 1, "morph_lemma": "c", "morph_inflection": "c"}]
+    )
+    am_db.rebuild_morph_table()
+    new_morph_ids = _get_morph_ids(am_db)
+    assert ("a", "a") not in new_morph_ids
+    assert new_morph_ids[("b", "b")] == morph_ids[("b", "b")]
+    assert new_morph_ids[("c", "c")] not in morph_ids.values()
+    assert am_db.get_readable_card_morphs(1) == [("c", "c")]
+    am_db.con.close()
+
+
+def _get_card_table_data(card_ids: list[int]) -> list[dict[str, Any]]:
+    return [
+        {
+            "card_id": card_id,
+            "note_id": card_id,
+            "note_type_id": 1,
+            "card_type": 0,
+            "fields": "",
+            "tags": "",
+            "learning_interval": 0,
+        }
+        for card_id in card_ids
+    ]
+
+
+def test_bulk_load(fake_environment):  # pylint:disable=unused-argument
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.insert_many_into_morphemizer_cache_table(
+        [{"cache_key": "key", "morphs": "[]", "last_used": 1}]
+    )
+    all_card_ids = [1, 2, 3]
+
+    # the rebuild happens in a shadow file that is copied over ankimorphs.db
+    with am_db.bulk_load(rebuild=True) as bulk_db:
+        assert bulk_db.path != am_db.path
+        bulk_db.insert_many_into_card_table(_get_card_table_data([1, 2]))
+        assert not am_db.has_cards()
+
+    assert am_db.get_cached_card_ids(all_card_ids) == {1, 2}
+    assert am_db.get_morphemizer_cache_entries(["key"]) == {"key": "[]"}
+    assert not os.path.exists(am_db.path + ".shadow")
+
+    # everything in the block is one transaction, so nothing is written on failure
+    for rebuild in [False, True]:
+        with pytest.raises(ZeroDivisionError):
+            with am_db.bulk_load(rebuild=rebuild) as bulk_db:
+                bulk_db.delete_card_morph_map_of_cards([1])
+                bulk_db.insert_many_into_card_table(_get_card_table_data([3]))
+                _ = 1 / 0
+
+        assert am_db.get_cached_card_ids(all_card_ids) == {1, 2}
+        assert not os.path.exists(am_db.path + ".shadow")
+
+    # the cards that are not marked as handled are removed
+    with am_db.bulk_load() as bulk_db:
+        assert bulk_db is am_db
+        bulk_db.create_handled_tables()
+        bulk_db.mark_as_handled([2], [2])
+        assert bulk_db.get_handled_card_ids(all_card_ids) == {2}
+        bulk_db.delete_unhandled_cards_and_notes()
+
+    assert am_db.get_cached_card_ids(all_card_ids) == {2}
+    am_db.con.close()
+
+
+def test_seen_morphs(fake_environment):  # pylint:disable=unused-argument
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.insert_many_into_card_table(_get_card_table_data([1, 2]))
+    am_db.insert_many_into_card_morph_map_table(
+        [
+            {"card_id": 1, "morph_lemma": "a", "morph_inflection": "a"},
+            {"card_id": 2, "morph_lemma": "b", "morph_inflection": "b"},
+        ]
+    )
+    am_db.create_indexes()
+    am_db.rebuild_morph_table()
+    morph_ids = _get_morph_ids(am_db)
+
+    # the table is only loaded once, after that the inserts update the set
+    seen_morphs = am_db.get_all_morphs_seen_today()
+    assert seen_morphs == set()
+    am_db.update_seen_morphs_today_single_card(1)
+    assert am_db.get_all_morphs_seen_today() is seen_morphs
+    assert seen_morphs == {morph_ids[("a", "a")]}
+
+    other_db = AnkiMorphsDB()
+    other_db.update_seen_morphs_today_single_card(2)
+    assert other_db.get_all_morphs_seen_today() is seen_morphs
+    assert seen_morphs == set(morph_ids.values())
+    other_db.con.close()
+
+    # the inserts are persisted, so reloading the set gives the same result
+    ankimorphs_db._discard_seen_morphs_cache()  # pylint:disable=protected-access
+    assert am_db.get_all_morphs_seen_today() == set(morph_ids.values())
+
+    AnkiMorphsDB.drop_seen_morphs_table()
+    assert am_db.get_all_morphs_seen_today() == set()
+    am_db.con.close()
+
+
+def test_known_morphs_files(
+    fake_environment, tmp_path
+):  # pylint:disable=unused-argument
+    known_morphs_dir = tmp_path / "known-morphs"
+    (known_morphs_dir / "sub").mkdir(parents=True)
+    first_file = known_morphs_dir / "first.csv"
+    second_file = known_morphs_dir / "sub" / "second.csv"
+    first_file.write_text("Morph-lemma,Morph-inflection\na,a\nb,b\n", encoding="utf-8")
+    second_file.write_text("Morph-lemma,Morph-inflection\nb,b\n", encoding="utf-8")
+
+    mock_mw = mock.Mock(spec=aqt.mw)
+    mock_mw.pm.profileFolder.return_value = str(tmp_path)
+    mock_mw.progress.want_cancel.return_value = False
+
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+
+    def update_known_morphs() -> tuple[list[tuple[str, str]], int]:
+        with mock.patch.object(recalc, "mw", mock_mw), mock.patch.object(
+            recalc_profiler, "mw", mock_mw
+        ):
+            recalc_profiler.start()
+            recalc._update_known_morphs_files(am_db)  # pylint:disable=protected-access
+            files_read = recalc_profiler.finish()["counters"].get(
+                "known_morphs_files_read", 0
+            )
+        am_db.rebuild_morph_table(keep_known_morphs_files_morphs=True)
+        am_db.insert_known_morphs_files_into_morph_table(21)
+        return AnkiMorphsDB.get_known_morphs(highest_learning_interval=21), files_read
+
+    assert update_known_morphs() == ([("a", "a"), ("b", "b")], 2)
+    assert set(am_db.get_known_morphs_files()) == {"first.csv", "sub/second.csv"}
+    morph_ids = _get_morph_ids(am_db)
+
+    # the unchanged files are not read again, and their morphs keep their ids
+    assert update_known_morphs() == ([("a", "a"), ("b", "b")], 0)
+    assert _get_morph_ids(am_db) == morph_ids
+
+    # the changed files replace their old morphs, and removed files are deleted
+    first_file.write_text("Morph-lemma,Morph-inflection\nc,c\n", encoding="utf-8")
+    second_file.unlink()
+    assert update_known_morphs() == ([("c", "c")], 1)
+    assert set(am_db.get_known_morphs_files()) == {"first.csv"}
+    am_db.con.close()
+
+
+def test_frequency_file_priority(
+    fake_environment, tmp_path
+):  # pylint:disable=unused-argument
+    (tmp_path / "frequency-files").mkdir()
+    frequency_file = tmp_path / "frequency-files" / "frequency.csv"
+    frequency_file.write_text(
+        "Morph-lemma,Morph-inflection\nb,b\nnot,in collection\na,a\nb,b\n",
+        encoding="utf-8",
+    )
+
+    mock_mw = mock.Mock(spec=aqt.mw)
+    mock_mw.pm.profileFolder.return_value = str(tmp_path)
+
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.insert_many_into_card_table(_get_card_table_data([1]))
+    am_db.insert_many_into_card_morph_map_table(
+        [
+            {"card_id": 1, "morph_lemma": lemma, "morph_inflection": lemma}
+            for lemma in ["a", "b", "c"]
+        ]
+    )
+    am_db.create_indexes()
+    am_db.rebuild_morph_table()
+    morph_ids = _get_morph_ids(am_db)
+
+    config_filter = mock.Mock(morph_priority_index=1, morph_priority="frequency.csv")
+
+    def get_priorities() -> tuple[dict[tuple[str, str], int], int]:
+        # every recalc starts with an empty dict of frequency file priorities
+        frequency_file_priorities: dict[str, dict[int, int]] = {}
+        with mock.patch.object(recalc, "mw", mock_mw), mock.patch.object(
+            recalc_profiler, "mw", mock_mw
+        ):
+            recalc_profiler.start()
+            # filters with the same frequency file share the priorities
+            # pylint:disable=protected-access
+            priorities = recalc._get_morph_priority(
+                am_db, config_filter, frequency_file_priorities
+            )
+            assert (
+                recalc._get_morph_priority(
+                    am_db, config_filter, frequency_file_priorities
+                )
+                is priorities
+            )
+            files_read = recalc_profiler.finish()["counters"].get(
+                "frequency_files_read", 0
+            )
+        morphs = {morph_id: morph for morph, morph_id in morph_ids.items()}
+        readable_priorities = {
+            morphs[morph_id]: index for morph_id, index in priorities.items()
+        }
+        return readable_priorities, files_read
+
+    # the last occurrence of a morph is used, and the file is only parsed once
+    assert get_priorities() == ({("b", "b"): 3, ("a", "a"): 2}, 1)
+    assert get_priorities() == ({("b", "b"): 3, ("a", "a"): 2}, 0)
+
+    frequency_file.write_text("Morph-lemma,Morph-inflection\nc,c\n", encoding="utf-8")
+    assert get_priorities() == ({("c", "c"): 0}, 1)
+
+    frequency_file.unlink()
+    with pytest.raises(FrequencyFileNotFoundException):
+        get_priorities()
+    am_db.con.close()
+
+
+def test_morph_collection_priorities(
+    fake_environment,
+):  # pylint:disable=unused-argument
+    rng = random.Random(0)
+    lemmas = ["a", "b", "B", "c", "é", "d"]
+    card_morphs = {
+        card_id: rng.sample(lemmas, rng.randint(1, 4)) for card_id in range(1, 30)
+    }
+
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.insert_many_into_card_table(_get_card_table_data(list(card_morphs)))
+    am_db.insert_many_into_card_morph_map_table(
+        [
+            {"card_id": card_id, "morph_lemma": lemma, "morph_inflection": lemma}
+            for card_id, morph_lemmas in card_morphs.items()
+            for lemma in morph_lemmas
+        ]
+    )
+    am_db.create_indexes()
+    am_db.rebuild_morph_table()
+    am_db.rebuild_morph_frequency_table()
+    morph_ids = _get_morph_ids(am_db)
+
+    # the most frequent morphs come first, the ties are ordered by text
+    frequencies = Counter(
+        lemma for morph_lemmas in card_morphs.values() for lemma in morph_lemmas
+    )
+    expected_lemmas = sorted(
+        frequencies, key=lambda lemma: (-frequencies[lemma], lemma)
+    )
+    assert am_db.get_morph_collection_priorities() == {
+        morph_ids[(lemma, lemma)]: index for index, lemma in enumerate(expected_lemmas)
+    }
+    am_db.con.close()
@@ -0,0 +1,464 @@
+import ctypes
+import functools
+import gc
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from collections.abc import Iterator
+from typing import Callable, Optional
+from unittest import mock
+
+import aqt
+import pytest
+from anki.collection import AddNoteRequest, Collection
+from aqt import setupLangAndBackend
+
+from ankimorphs import (
+    FrequencyFileGeneratorDialog,
+    ReadabilityReportGeneratorDialog,
+    anki_data_utils,
+    ankimorphs_config,
+    ankimorphs_db,
+)
+from ankimorphs import frequency_file_generator as ffg
+from ankimorphs import generator_dialog as gd
+from ankimorphs import name_file_utils
+from ankimorphs import readability_report_generator as rrg
+from ankimorphs import recalc, recalc_profiler, spacy_wrapper
+from ankimorphs.ankimorphs_config import AnkiMorphsConfig
+from ankimorphs.ankimorphs_db import AnkiMorphsDB
+from ankimorphs.morphemizer import Morphemizer, get_morphemizer_by_name
+from ankimorphs.text_highlighting import get_highlighted_text
+
+################################################################
+#                         BENCHMARKS
+################################################################
+# These are not run by default, use:
+#   pytest -m benchmark
+#
+# The benchmarks run against synthetic collections, so they
+# don't depend on the size of the test collection. The note
+# counts are set with the AM_BENCHMARK_SIZES environment
+# variable, e.g. AM_BENCHMARK_SIZES=10000,100000,500000, and the
+# languages with AM_BENCHMARK_LANGUAGES.
+#
+# The throughput (notes per second) of every benchmark is divided
+# by the throughput of a fixed calibration workload that runs on
+# the same machine, which makes the results comparable between
+# machines of different speeds. This relative throughput and the
+# peak memory increase are compared to the baselines in
+# tests/data/benchmark_baselines.json, and the benchmark fails if
+# it is more than _TOLERANCE worse. Benchmarks without a baseline
+# are skipped. After a deliberate change in performance, the
+# baselines should be updated with:
+#   AM_BENCHMARK_UPDATE=1 pytest -m benchmark
+#
+# With AM_BENCHMARK_RESULTS=<path> the results of every benchmark
+# are also written to that file (in the same format as the
+# baselines), which is how the CI job records them.
+################################################################
+
+pytestmark = pytest.mark.benchmark
+
+_BASELINES_PATH: str = os.path.join("tests", "data", "benchmark_baselines.json")
+_TOLERANCE: float = 0.5
+
+# the number of sentences the calibration workload processes
+_CALIBRATION_OPS: int = 20000
+
+_SIZES: list[int] = [
+    int(size) for size in os.environ.get("AM_BENCHMARK_SIZES", "10000").split(",")
+]
+_LANGUAGES: list[str] = os.environ.get("AM_BENCHMARK_LANGUAGES", "en,ru,ja").split(",")
+_UPDATE_BASELINES: bool = os.environ.get("AM_BENCHMARK_UPDATE", "") == "1"
+_RESULTS_PATH: str = os.environ.get("AM_BENCHMARK_RESULTS", "")
+
+# the generator benchmarks use one file per this many notes
+_NOTES_PER_FILE: int = 1000
+
+_MORPHEMIZERS: dict[str, str] = {
+    "en": "SpaceMorphemizer",
+    "ru": "SpaceMorphemizer",
+    "ja": "MecabMorphemizer",
+}
+
+_JAPANESE_WORDS: list[str] = [
+    "私", "は", "学生", "です", "猫", "が", "好き", "な", "本", "を", "読み",
+    "ます", "今日", "天気", "いい", "ね", "友達", "と", "映画", "見", "に",
+    "行き", "たい", "日本語", "勉強", "して", "いる", "電車", "で", "会社",
+    "来ました", "先生", "話", "聞いて", "ください", "昨日", "雨", "降りました",
+    "水", "飲んで", "から", "寝ます", "東京", "大きい", "町", "静か", "部屋",
+    "食べる", "時間", "ない", "の", "も", "まだ", "分かりません", "駅", "近く",
+]  # fmt: skip
+
+
+def _get_vocabulary(language: str, rng: random.Random) -> list[str]:
+    if language == "ja":
+        return _JAPANESE_WORDS
+
+    alphabet: str = (
+        "abcdefghijklmnopqrstuvwxyz"
+        if language == "en"
+        else "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+    )
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 10)))
+        for _ in range(20000)
+    ]
+
+
+def _generate_sentences(language: str, amount: int) -> list[str]:
+    # The words are picked with a zipf-like distribution, so the
+    # sentences have a realistic mix of common and rare morphs.
+    rng = random.Random(amount)
+    vocabulary: list[str] = _get_vocabulary(language, rng)
+    separator: str = "" if language == "ja" else " "
+
+    sentences: list[str] = []
+    for _ in range(amount):
+        words: list[str] = [
+            vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)]
+            for _ in range(rng.randint(3, 15))
+        ]
+        if rng.random() < 0.05:
+            words[0] = f"<b>{words[0]}</b>"
+        sentences.append(separator.join(words))
+    return sentences
+
+
+def _measure(func: Callable[[], object]) -> tuple[float, Optional[float]]:
+    # Returns the seconds the function took and the increase of
+    # the peak memory (in MB) while it ran. The peak memory of the
+    # process can only be reset on linux, so the memory is None on
+    # other platforms.
+    can_measure_memory: bool = sys.platform.startswith("linux")
+    rss_before: float = 0.0
+
+    # The morphemizer cache is shared by the whole process, so the
+    # benchmarks would otherwise reuse the morphs extracted by the
+    # previous benchmarks from the same generated texts.
+    Morphemizer.get_morphemes_from_expr.cache_clear()
+
+    if can_measure_memory:
+        # The memory that was freed by the previous benchmarks is given
+        # back to the os first, otherwise it would be reused without
+        # increasing the peak and the results would depend on the order
+        # of the benchmarks.
+        gc.collect()
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+        # writing '5' resets the peak resident set size (VmHWM)
+        with open("/proc/self/clear_refs", mode="w", encoding="utf-8") as file:
+            file.write("5")
+        rss_before = _get_proc_status_mb("VmRSS")
+
+    start: float = time.perf_counter()
+    func()
+    seconds: float = time.perf_counter() - start
+
+    if not can_measure_memory:
+        return seconds, None
+    return seconds, round(max(_get_proc_status_mb("VmHWM") - rss_before, 0.0), 1)
+
+
+def _get_proc_status_mb(key: str) -> float:
+    with open("/proc/self/status", encoding="utf-8") as file:
+        for line in file:
+            if line.startswith(f"{key}:"):
+                return int(line.split()[1]) / 1024  # kilobytes
+    raise KeyError(key)
+
+
+@functools.cache
+def _get_calibration_ops_per_second() -> float:
+    # A fixed mix of string processing and sqlite inserts, which is
+    # roughly what recalc spends its time on. The fastest of a few
+    # runs is used, since the slower ones are mostly noise.
+    def calibration_workload() -> None:
+        con = sqlite3.connect(":memory:")
+        con.execute("CREATE TABLE Words (word TEXT PRIMARY KEY, amount INTEGER)")
+        rng = random.Random(0)
+        for _ in range(_CALIBRATION_OPS):
+            sentence = " ".join(str(rng.random()) for _ in range(8))
+            words = re.findall(r"\w+", sentence.lower())
+            con.executemany(
+                """
+                    INSERT INTO Words VALUES (?, 1)
+                    ON CONFLICT(word) DO UPDATE SET amount = amount + 1
+                    """,
+                [(word,) for word in words],
+            )
+        con.close()
+
+    fastest_seconds: float = min(_measure(calibration_workload)[0] for _ in range(3))
+    return _CALIBRATION_OPS / fastest_seconds
+
+
+def _read_results(path: str) -> dict[str, dict[str, Optional[float]]]:
+    try:
+        with open(path, encoding="utf-8") as file:
+            results: dict[str, dict[str, Optional[float]]] = json.load(file)
+            return results
+    except FileNotFoundError:
+        return {}
+
+
+def _write_result(path: str, name: str, result: dict[str, Optional[float]]) -> None:
+    results = _read_results(path)
+    results[name] = result
+    with open(path, mode="w", encoding="utf-8") as file:
+        json.dump(dict(sorted(results.items())), file, indent=2)
+        file.write("\n")
+
+
+def _check_against_baseline(
+    name: str, notes: int, seconds: float, memory_mb: Optional[float]
+) -> None:
+    notes_per_second: float = notes / seconds
+    relative_throughput: float = round(
+        notes_per_second / _get_calibration_ops_per_second(), 4
+    )
+    print(
+        f"{name}: {round(notes_per_second, 1)} notes/s "
+        f"({relative_throughput} relative), {memory_mb} MB peak memory increase"
+    )
+    result: dict[str, Optional[float]] = {
+        "relative_throughput": relative_throughput,
+        "peak_memory_mb": memory_mb,
+    }
+
+    if _RESULTS_PATH != "":
+        _write_result(_RESULTS_PATH, name, result)
+
+    if _UPDATE_BASELINES:
+        _write_result(_BASELINES_PATH, name, result)
+        return
+
+    baselines = _read_results(_BASELINES_PATH)
+    if name not in baselines:
+        pytest.skip(f"no baseline recorded for {name}")
+
+    baseline = baselines[name]
+    baseline_throughput = baseline["relative_throughput"]
+    baseline_memory_mb = baseline["peak_memory_mb"]
+
+    assert baseline_throughput is not None
+    assert relative_throughput >= baseline_throughput * (1 - _TOLERANCE), (
+        f"{name} throughput regressed: {relative_throughput} relative throughput, "
+        f"baseline is {baseline_throughput}"
+    )
+
+    if memory_mb is not None and baseline_memory_mb is not None:
+        # small allocations are noisy, so there is a floor of 50 MB
+        memory_limit: float = max(baseline_memory_mb * (1 + _TOLERANCE), 50.0)
+        assert memory_mb <= memory_limit, (
+            f"{name} memory regressed: {memory_mb} MB, "
+            f"baseline is {baseline_memory_mb} MB"
+        )
+
+
+@pytest.fixture(params=_LANGUAGES)
+def language(request) -> str:
+    return str(request.param)
+
+
+@pytest.fixture(params=_SIZES, ids=str)
+def size(request) -> int:
+    return int(request.param)
+
+
+@pytest.fixture
+def fake_environment(tmp_path) -> Iterator[mock.Mock]:
+    with open(os.path.join("ankimorphs", "config.json"), encoding="utf-8") as file:
+        config = json.load(file)
+
+    config["filters"] = []
+    config["recalc_morphemizer_workers"] = 1
+
+    mock_mw = mock.Mock(spec=aqt.mw)
+    mock_mw.pm.profileFolder.return_value = str(tmp_path)
+    mock_mw.progress.want_cancel.return_value = False
+    mock_mw.addonManager.getConfig.return_value = config
+
+    patches = [
+        mock.patch.object(module, "mw", mock_mw)
+        for module in [
+            anki_data_utils,
+            ankimorphs_config,
+            ankimorphs_db,
+            ffg,
+            gd,
+            name_file_utils,
+            recalc,
+            recalc_profiler,
+            rrg,
+        ]
+    ]
+    patches.append(mock.patch.object(spacy_wrapper, "testing_environment", True))
+
+    for patch in patches:
+        patch.start()
+
+    yield mock_mw
+
+    for patch in patches:
+        patch.stop()
+
+
+def _get_morphemizer(language: str) -> Morphemizer:
+    morphemizer = get_morphemizer_by_name(_MORPHEMIZERS[language])
+    assert morphemizer is not None
+    return morphemizer
+
+
+def _create_collection(
+    mock_mw: mock.Mock, language: str, sentences: list[str], tmp_path
+) -> Collection:
+    collection = Collection(os.path.join(tmp_path, "collection.anki2"))
+    mock_mw.col = collection
+    mock_mw.backend = setupLangAndBackend(
+        pm=mock.Mock(name="fake_pm"), app=mock.Mock(name="fake_app"), force="en"
+    )
+
+    note_type = collection.models.by_name("Basic")
+    assert note_type is not None
+    deck_id = collection.decks.id("Default")
+    assert deck_id is not None
+
+    requests: list[AddNoteRequest] = []
+    for index, sentence in enumerate(sentences):
+        note = collection.new_note(note_type)
+        note.fields[0] = sentence
+        note.fields[1] = str(index)
+        requests.append(AddNoteRequest(note, deck_id))
+    collection.add_notes(requests)
+
+    morphemizer = _get_morphemizer(language)
+    mock_mw.addonManager.getConfig.return_value["filters"] = [
+        {
+            "extra_difficulty": True,
+            "extra_highlighted": True,
+            "extra_unknowns": True,
+            "extra_unknowns_count": True,
+            "field": "Front",
+            "field_index": 0,
+            "modify": True,
+            "morph_priority": "Collection frequency",
+            "morph_priority_index": 0,
+            "morphemizer_description": morphemizer.get_description(),
+            "morphemizer_name": _MORPHEMIZERS[language],
+            "note_type": "Basic",
+            "note_type_id": note_type["id"],
+            "read": True,
+            "tags": {"exclude": [], "include": []},
+        }
+    ]
+    return collection
+
+
+def _write_input_files(sentences: list[str], input_dir: str) -> None:
+    os.makedirs(input_dir)
+    for index in range(0, len(sentences), _NOTES_PER_FILE):
+        file_path = os.path.join(input_dir, f"{index // _NOTES_PER_FILE}.txt")
+        with open(file_path, mode="w", encoding="utf-8") as file:
+            file.write("\n".join(sentences[index : index + _NOTES_PER_FILE]))
+
+
+def _select_morphemizer(dialog, language: str) -> None:
+    # pylint:disable=protected-access
+    for index, morphemizer in enumerate(dialog._morphemizers):
+        if (
+            morphemizer.get_description()
+            == _get_morphemizer(language).get_description()
+        ):
+            dialog.ui.comboBox.setCurrentIndex(index)
+            return
+    raise ValueError(language)
+
+
+def test_recalc_benchmark(fake_environment, language, size, tmp_path):
+    sentences = _generate_sentences(language, size)
+    collection = _create_collection(fake_environment, language, sentences, tmp_path)
+
+    # pylint:disable=protected-access
+    seconds, memory_mb = _measure(lambda: recalc._recalc_background_op(collection))
+    _check_against_baseline(f"recalc[{language}-{size}]", size, seconds, memory_mb)
+
+    # the second recalc only has to deal with unchanged notes
+    seconds, memory_mb = _measure(lambda: recalc._recalc_background_op(collection))
+    _check_against_baseline(
+        f"recalc_unchanged[{language}-{size}]", size, seconds, memory_mb
+    )
+
+    collection.close()
+
+
+def test_highlighting_benchmark(
+    fake_environment, language, size
+):  # pylint:disable=unused-argument
+    sentences = _generate_sentences(language, size)
+    morphemizer = _get_morphemizer(language)
+    am_config = AnkiMorphsConfig()
+
+    # the morphs get a mix of known, learning and unknown statuses
+    rng = random.Random(size)
+    sentences_morphs = []
+    for morphs in morphemizer.get_morphemes_from_exprs(sentences):
+        for morph in morphs:
+            morph.highest_learning_interval = rng.choice([0, 5, 30])
+        sentences_morphs.append(morphs)
+
+    def highlight_all() -> None:
+        for sentence, morphs in zip(sentences, sentences_morphs):
+            get_highlighted_text(am_config, morphs, sentence)
+
+    # The highlighting only allocates short-lived strings, so the peak
+    # memory doesn't increase measurably and is not checked.
+    seconds, _ = _measure(highlight_all)
+    _check_against_baseline(f"highlighting[{language}-{size}]", size, seconds, None)
+
+
+def test_readability_report_benchmark(  # pylint:disable=unused-argument
+    fake_environment, language, size, tmp_path, qtbot
+):
+    input_dir = os.path.join(tmp_path, "input")
+    _write_input_files(_generate_sentences(language, size), input_dir)
+
+    # the report reads the learning intervals of the morphs, which are
+    # normally in ankimorphs.db from the last recalc
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.con.close()
+
+    dialog = ReadabilityReportGeneratorDialog()
+    dialog.ui.inputDirLineEdit.setText(input_dir)
+    _select_morphemizer(dialog, language)
+
+    # pylint:disable=protected-access
+    seconds, memory_mb = _measure(lambda: dialog._background_generate_report(col=None))
+    _check_against_baseline(
+        f"readability_report[{language}-{size}]", size, seconds, memory_mb
+    )
+
+
+def test_frequency_file_benchmark(  # pylint:disable=unused-argument
+    fake_environment, language, size, tmp_path, qtbot
+):
+    input_dir = os.path.join(tmp_path, "input")
+    _write_input_files(_generate_sentences(language, size), input_dir)
+
+    dialog = FrequencyFileGeneratorDialog()
+    dialog.ui.inputDirLineEdit.setText(input_dir)
+    dialog.ui.outputFileLineEdit.setText(os.path.join(tmp_path, "frequency.csv"))
+    _select_morphemizer(dialog, language)
+
+    # pylint:disable=protected-access
+    seconds, memory_mb = _measure(
+        lambda: dialog._background_generate_frequency_file(col=None)
+    )
+    _check_against_baseline(
+        f"frequency_file[{language}-{size}]", size, seconds, memory_mb
+    )
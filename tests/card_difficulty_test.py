@@ -0,0 +1,142 @@
+import random
+from unittest import mock
+
+import aqt
+import pytest
+
+from ankimorphs import ankimorphs_db
+from ankimorphs.ankimorphs_db import AnkiMorphsDB
+from ankimorphs.card_difficulty import (
+    _DEFAULT_DIFFICULTY,
+    CardMorphMatrix,
+    get_default_difficulty,
+)
+
+
+@pytest.fixture
+def fake_environment(tmp_path):
+    mock_mw = mock.Mock(spec=aqt.mw)
+    mock_mw.pm.profileFolder.return_value = str(tmp_path)
+
+    patch_am_db_mw = mock.patch.object(ankimorphs_db, "mw", mock_mw)
+    patch_am_db_mw.start()
+    yield
+    patch_am_db_mw.stop()
+
+
+def _get_expected_difficulty(
+    morphs: list[tuple[int, int]],
+    morph_priority: dict[int, int],
+    interval_for_known: int,
+    skip_only_known_morphs_cards: bool,
+) -> tuple[int, int, bool]:
+    # the original card by card algorithm, morphs are (morph_id, interval)
+    morph_unknown_penalty = 500000
+    unknowns = 0
+    has_learning_morph = False
+    difficulty = 0
+
+    for morph_id, interval in morphs:
+        if interval == 0:
+            unknowns += 1
+        elif interval <= interval_for_known:
+            has_learning_morph = True
+
+        if morph_id not in morph_priority:
+            difficulty = morph_unknown_penalty - 1
+        else:
+            difficulty += morph_priority[morph_id]
+
+    if unknowns == 0 and skip_only_known_morphs_cards:
+        return _DEFAULT_DIFFICULTY, unknowns, has_learning_morph
+
+    if difficulty >= morph_unknown_penalty:
+        difficulty = morph_unknown_penalty - 1
+
+    difficulty += unknowns * morph_unknown_penalty
+    difficulty = min(difficulty, _DEFAULT_DIFFICULTY)
+    return difficulty, unknowns, has_learning_morph
+
+
+@pytest.mark.parametrize("skip_only_known_morphs_cards", [False, True])
+def test_card_difficulties(
+    fake_environment, skip_only_known_morphs_cards
+):  # pylint:disable=unused-argument
+    rng = random.Random(0)
+    lemmas = [f"lemma{index}" for index in range(200)]
+    card_intervals = {card_id: rng.choice([0, 0, 5, 30]) for card_id in range(1, 501)}
+    card_morphs = {
+        card_id: rng.sample(lemmas, rng.randint(0, 30)) for card_id in card_intervals
+    }
+
+    am_db = AnkiMorphsDB()
+    am_db.create_all_tables()
+    am_db.insert_many_into_card_table(
+        [
+            {
+                "card_id": card_id,
+                "note_id": card_id,
+                "note_type_id": 1 if card_id <= 450 else 2,
+                "card_type": 0,
+                "fields": "",
+                "tags": "",
+                "learning_interval": interval,
+            }
+            for card_id, interval in card_intervals.items()
+        ]
+    )
+    am_db.insert_many_into_card_morph_map_table(
+        [
+            {"card_id": card_id, "morph_lemma": lemma, "morph_inflection": lemma}
+            for card_id, morphs in card_morphs.items()
+            for lemma in morphs
+        ]
+    )
+    am_db.create_indexes()
+    am_db.rebuild_morph_table()
+    # a morph that is missing from the Morphs table should not shift the rows
+    am_db.con.execute("INSERT INTO Card_Morph_Map VALUES (1, -1)")
+
+    morph_ids = {
+        (lemma, inflection): morph_id
+        for lemma, inflection, morph_id in am_db.con.execute(
+            "SELECT lemma, inflection, morph_id FROM Morphs"
+        ).fetchall()
+    }
+    morph_intervals = dict(
+        am_db.con.execute(
+            "SELECT morph_id, highest_learning_interval FROM Morphs"
+        ).fetchall()
+    )
+    # large priorities to also hit the caps, and some morphs without priorities
+    morph_priority = {
+        morph_id: rng.randint(0, 200000)
+        for morph_id in morph_ids.values()
+        if rng.random() < 0.9
+    }
+
+    am_config = mock.Mock(
+        recalc_interval_for_known=21,
+        skip_only_known_morphs_cards=skip_only_known_morphs_cards,
+    )
+    card_difficulties = CardMorphMatrix(am_db, am_config, 1).get_card_difficulties(
+        am_config, morph_priority
+    )
+
+    for card_id, morphs in card_morphs.items():
+        if card_id > 450:
+            assert card_id not in card_difficulties
+            continue
+        if len(morphs) == 0:
+            assert card_id not in card_difficulties
+            assert get_default_difficulty() == (_DEFAULT_DIFFICULTY, 0, False)
+            continue
+        sorted_morphs = [
+            (morph_ids[(lemma, lemma)], morph_intervals[morph_ids[(lemma, lemma)]])
+            for lemma in sorted(morphs)
+        ]
+        assert card_difficulties[card_id] == _get_expected_difficulty(
+            sorted_morphs, morph_priority, 21, skip_only_known_morphs_cards
+        )
+
+    am_db.con.close()
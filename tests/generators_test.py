@@ -6,7 +6,7 @@ import aqt
 import pytest
 from csv_diff import compare, load_csv
 
-from ankimorphs import FrequencyFileGeneratorDialog
+from ankimorphs import FrequencyFileGeneratorDialog, ankimorphs_db
 from ankimorphs import frequency_file_generator as ffg
 from ankimorphs import generator_dialog as gd
 from ankimorphs import spacy_wrapper
@@ -23,18 +23,21 @@ def fake_environment():
 
     patch_gd_mw = mock.patch.object(gd, "mw", mock_mw)
     patch_ffg_mw = mock.patch.object(ffg, "mw", mock_mw)
+    patch_am_db_mw = mock.patch.object(ankimorphs_db, "mw", mock_mw)
     patch_testing_variable = mock.patch.object(
         spacy_wrapper, "testing_environment", True
     )
 
     patch_gd_mw.start()
     patch_ffg_mw.start()
+    patch_am_db_mw.start()
     patch_testing_variable.start()
 
     yield
 
     patch_gd_mw.stop()
     patch_ffg_mw.stop()
+    patch_am_db_mw.stop()
     patch_testing_variable.stop()
 
 
@@ -2,7 +2,7 @@ from unittest import mock
 
 import pytest
 
-from ankimorphs import spacy_wrapper
+from ankimorphs import mecab_wrapper, spacy_wrapper
 from ankimorphs.morpheme import Morpheme
 from ankimorphs.morphemizer import get_morphemizer_by_name
 
@@ -40,3 +40,42 @@ def test_morpheme_generation(fake_environment):  # pylint:disable=unused-argumen
 
     for morph in extracted_morphs:
         assert morph in correct_morphs
+
+
+def test_morpheme_generation_batch(fake_environment):  # pylint:disable=unused-argument
+    sentences = [
+        "本当に重要な任務の時しか 動かない",
+        "猫が好きです\n",  # newlines must not break the batch
+        "",
+        "明日は雨が降るでしょう",
+    ]
+    batch_morphs = mecab_wrapper.get_morphemes_mecab_batch(sentences)
+    assert batch_morphs == [
+        mecab_wrapper.get_morphemes_mecab(sentence) for sentence in sentences
+    ]
+    assert batch_morphs[2] == []
+
+
+def test_morpheme_generation_with_workers(  # pylint:disable=unused-argument
+    fake_environment,
+):
+    morphemizer = get_morphemizer_by_name("MecabMorphemizer")
+    assert morphemizer is not None
+
+    # enough unique sentences to be split across the workers, and some
+    # duplicates
+    sentences = [
+        f"{sentence} {index}"
+        for index in range(400)
+        for sentence in [
+            "本当に重要な任務の時しか 動かない",
+            "猫が好きです",
+            "明日は雨が降るでしょう",
+        ]
+    ] * 2
+
+    # the workers have to produce the same morphs in the same order
+    single_worker_morphs = list(morphemizer.get_morphemes_from_exprs(sentences, 1))
+    multiple_workers_morphs = list(morphemizer.get_morphemes_from_exprs(sentences, 4))
+    assert len(single_worker_morphs) == len(sentences)
+    assert multiple_workers_morphs == single_worker_morphs
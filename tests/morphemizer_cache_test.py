@@ -0,0 +1,150 @@
+from typing import Optional
+from unittest import mock
+
+import aqt
+import pytest
+
+from ankimorphs import (
+    ankimorphs_db,
+    fingerprint_utils,
+    morphemizer_cache,
+    spacy_wrapper,
+)
+from ankimorphs.ankimorphs_db import AnkiMorphsDB
+from ankimorphs.morpheme import Morpheme
+from ankimorphs.morphemizer_cache import MorphemizerCache
+
+
+@pytest.fixture
+def fake_environment(tmp_path):
+    mock_mw = mock.Mock(spec=aqt.mw)
+    mock_mw.pm.profileFolder.return_value = str(tmp_path)
+
+    patch_am_db_mw = mock.patch.object(ankimorphs_db, "mw", mock_mw)
+    patch_testing_variable = mock.patch.object(
+        spacy_wrapper, "testing_environment", True
+    )
+
+    patch_am_db_mw.start()
+    patch_testing_variable.start()
+    yield
+    patch_am_db_mw.stop()
+    patch_testing_variable.stop()
+
+
+def test_cached_morphs(fake_environment):  # pylint:disable=unused-argument
+    morphs = [
+        Morpheme(lemma="見る", inflection="見", part_of_speech="動詞"),
+        Morpheme(lemma="Harry", inflection="Harry", part_of_speech="PROPN"),
+    ]
+
+    am_db = AnkiMorphsDB()
+    cache = MorphemizerCache(am_db, "AnkiMorphs: Language w/ Spaces")
+    assert cache.get_morphs(["見た Harry"]) == [None]
+    cache.add_morphs("見た Harry", morphs)
+    cache.save()
+
+    # a new cache instance has to read the morphs from the db
+    cache = MorphemizerCache(am_db, "AnkiMorphs: Language w/ Spaces")
+    cached_morphs = cache.get_morphs(["見た Harry", "not cached"])
+    assert cached_morphs[0] == morphs
+    assert cached_morphs[0][1].is_proper_noun()
+    assert cached_morphs[1] is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # the morphs are interned, so the same morph is only created once
+    interned_morphs = cache.morph_registry.intern_morphs(morphs)
+    assert interned_morphs[0] is cached_morphs[0][0]
+    assert cache.get_morphs(["見た Harry"])[0][1] is cached_morphs[0][1]
+
+    # the entries are separated by morphemizer
+    cache = MorphemizerCache(am_db, "spaCy: ja_core_news_sm")
+    assert cache.get_morphs(["見た Harry"]) == [None]
+    am_db.con.close()
+
+
+def test_cache_eviction(fake_environment):  # pylint:disable=unused-argument
+    am_db = AnkiMorphsDB()
+
+    with mock.patch.object(morphemizer_cache, "_MAX_CACHE_ENTRIES", 2):
+        with mock.patch.object(morphemizer_cache.time, "time", return_value=1):
+            cache = MorphemizerCache(am_db, "AnkiMorphs: Language w/ Spaces")
+            cache.add_morphs("a", [Morpheme("a", "a")])
+            cache.add_morphs("b", [Morpheme("b", "b")])
+            cache.save()
+
+        with mock.patch.object(morphemizer_cache.time, "time", return_value=2):
+            cache = MorphemizerCache(am_db, "AnkiMorphs: Language w/ Spaces")
+            cache.get_morphs(["a"])  # 'a' is now more recently used than 'b'
+            cache.add_morphs("c", [Morpheme("c", "c")])
+            cache.save()
+
+    cache = MorphemizerCache(am_db, "AnkiMorphs: Language w/ Spaces")
+    assert [morphs is None for morphs in cache.get_morphs(["a", "b", "c"])] == [
+        False,
+        True,
+        False,
+    ]
+    am_db.con.close()
+
+
+def test_spacy_model_version(fake_environment):  # pylint:disable=unused-argument
+    am_db = AnkiMorphsDB()
+    morphs = [Morpheme("a", "a")]
+
+    # the morphs are cached per version of the spacy model
+    with mock.patch.object(spacy_wrapper, "get_model_version", return_value="3.7.0"):
+        cache = MorphemizerCache(am_db, "spaCy: en_core_web_sm")
+        cache.add_morphs("a", morphs)
+        cache.save()
+        cache = MorphemizerCache(am_db, "spaCy: en_core_web_sm")
+        assert cache.get_morphs(["a"]) == [morphs]
+
+    with mock.patch.object(spacy_wrapper, "get_model_version", return_value="3.8.0"):
+        cache = MorphemizerCache(am_db, "spaCy: en_core_web_sm")
+        assert cache.get_morphs(["a"]) == [None]
+
+    # the cache is not used if the version of the model is unknown
+    with mock.patch.object(spacy_wrapper, "get_model_version", return_value=None):
+        cache = MorphemizerCache(am_db, "spaCy: en_core_web_sm")
+        cache.add_morphs("b", morphs)
+        cache.save()
+        cache = MorphemizerCache(am_db, "spaCy: en_core_web_sm")
+        assert cache.get_morphs(["a", "b"]) == [None, None]
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    cache_size = am_db.con.execute("SELECT COUNT(*) FROM Morphemizer_Cache").fetchone()
+    assert cache_size == (1,)
+    am_db.con.close()
+
+
+def test_filter_hash_model_version(fake_environment):  # pylint:disable=unused-argument
+    am_db = AnkiMorphsDB()
+    config_filter = mock.Mock(morphemizer_name="SpacyMorphemizer", field_index=0)
+
+    def get_filter_hash(model_version: Optional[str]) -> str:
+        with mock.patch.object(
+            spacy_wrapper, "get_model_version", return_value=model_version
+        ):
+            cache = MorphemizerCache(am_db, "spaCy: en_core_web_sm")
+        return fingerprint_utils.get_filter_hash(
+            "preprocess_hash", config_filter, cache.morphemizer_key
+        )
+
+    def note_has_changed(stored_filter_hash: str, filter_hash: str) -> bool:
+        return fingerprint_utils.note_has_changed(
+            (1, stored_filter_hash, "expression_hash"),
+            1,
+            filter_hash,
+            "expression_hash",
+        )
+
+    # unchanged notes are skipped as long as the model stays the same
+    assert not note_has_changed(get_filter_hash("3.7.0"), get_filter_hash("3.7.0"))
+
+    # the morphs are extracted again when the model is updated
+    assert note_has_changed(get_filter_hash("3.7.0"), get_filter_hash("3.8.0"))
+
+    # and on every recalc if the version of the model is unknown
+    assert note_has_changed(get_filter_hash(None), get_filter_hash(None))
+    am_db.con.close()
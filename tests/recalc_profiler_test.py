@@ -0,0 +1,46 @@
+import json
+import os
+from unittest import mock
+
+import aqt
+import pytest
+
+from ankimorphs import recalc_profiler
+
+
+@pytest.fixture
+def fake_environment(tmp_path):
+    mock_mw = mock.Mock(spec=aqt.mw)
+    mock_mw.pm.profileFolder.return_value = str(tmp_path)
+
+    patch_profiler_mw = mock.patch.object(recalc_profiler, "mw", mock_mw)
+    patch_profiler_mw.start()
+    yield tmp_path
+    patch_profiler_mw.stop()
+
+
+def test_recalc_profile(fake_environment):  # pylint:disable=redefined-outer-name
+    for run in range(2):
+        recalc_profiler.start()
+        for _ in range(3):
+            with recalc_profiler.phase("highlight"):
+                pass
+        recalc_profiler.count("morphemizer_cache_hits", 3)
+        recalc_profiler.count("morphemizer_cache_misses", 1)
+        recalc_profiler.count("cards_updated", run)
+        report = recalc_profiler.finish()
+
+    assert report["phases"]["highlight"]["calls"] == 3
+    assert report["counters"]["cards_updated"] == 1
+    assert report["morphemizer_cache_hit_rate"] == 0.75
+    # the peak memory can't be measured on windows
+    assert report["peak_rss_mb"] is None or report["peak_rss_mb"] > 0
+
+    # every run is added to the log
+    log_path = os.path.join(fake_environment, recalc_profiler.PROFILE_LOG_FILE_NAME)
+    with open(log_path, encoding="utf-8") as file:
+        reports = json.load(file)
+    assert [_report["counters"]["cards_updated"] for _report in reports] == [0, 1]
+
+    # pylint:disable=protected-access
+    assert "highlight" in recalc_profiler._format_report(report)
@@ -25,6 +25,7 @@ from ankimorphs import (
     text_highlighting,
 )
 from ankimorphs.morpheme import Morpheme
+from ankimorphs.morphemizer_cache import MorphemizerCache
 
 
 class CardData:
@@ -244,6 +245,34 @@ def test_recalc(fake_environment):  # pylint:disable=too-many-locals
     assert known_morphs_test == known_morphs_correct
 
 
+def test_recalc_incremental(fake_environment):
+    # The morphs of unchanged notes are reused from ankimorphs.db,
+    # so running recalc again should not change anything.
+    mock_collection, _ = fake_environment
+
+    def get_cards_snapshot() -> dict[int, tuple[int, list[str], list[str]]]:
+        snapshot = {}
+        for card_id in mock_collection.find_cards(""):
+            card: Card = mock_collection.get_card(card_id)
+            note: Note = card.note()
+            snapshot[card_id] = (card.due, note.fields, note.tags)
+        return snapshot
+
+    # the first recalc stores the morphs of all the notes
+    recalc._recalc_background_op(mock_collection)
+    cards_before = get_cards_snapshot()
+
+    with mock.patch.object(
+        MorphemizerCache,
+        "get_morphs",
+        side_effect=AssertionError("no expressions should be morphemized"),
+    ) as morphemizer_cache_mock:
+        recalc._recalc_background_op(mock_collection)
+    morphemizer_cache_mock.assert_not_called()
+
+    assert get_cards_snapshot() == cards_before
+
+
 def test_highlighting(fake_environment):  # pylint:disable=unused-argument
     # this example has a couple of good nuances:
     #   1.  空[あ]い has a ruby character in the middle of the morph
@@ -8,7 +8,7 @@ import spacy
 from ankimorphs import AnkiMorphsConfig, ankimorphs_config, spacy_wrapper
 from ankimorphs.morpheme import Morpheme
 from ankimorphs.spacy_wrapper import get_nlp
-from ankimorphs.text_preprocessing import get_processed_spacy_morphs
+from ankimorphs.text_preprocessing import filter_spacy_morphs, get_spacy_morphs
 
 
 class SpacyMorph:
@@ -75,7 +75,9 @@ def test_ja_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -107,7 +109,9 @@ def test_nb_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -151,7 +155,9 @@ def test_en_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
 
     # print(f"processes morphs: {len(processed_morphs)}")
     # for _morph in processed_morphs:
@@ -206,7 +212,9 @@ def test_de_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -241,7 +249,9 @@ def test_ca_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -274,7 +284,9 @@ def test_es_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -306,7 +318,9 @@ def test_fr_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -338,7 +352,9 @@ def test_da_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -370,7 +386,9 @@ def test_sv_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -402,7 +420,9 @@ def test_nl_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -437,7 +457,9 @@ def test_hr_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -469,7 +491,9 @@ def test_fi_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -501,7 +525,9 @@ def test_el_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -534,7 +560,9 @@ def test_it_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -566,7 +594,9 @@ def test_lt_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -598,7 +628,9 @@ def test_mk_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -630,7 +662,9 @@ def test_pl_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -661,7 +695,9 @@ def test_pt_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -693,7 +729,9 @@ def test_ro_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -725,7 +763,9 @@ def test_sl_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -755,7 +795,9 @@ def test_ru_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -785,7 +827,9 @@ def test_uk_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -818,7 +862,9 @@ def test_ko_model(fake_environment) -> None:  # pylint:disable=unused-argument
 
     am_config = AnkiMorphsConfig()
     am_config.preprocess_ignore_names_morphemizer = True
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
     assert processed_morphs == correct_am_morphs
 
 
@@ -858,7 +904,9 @@ def test_zh_model(fake_environment) -> None:  # pylint:disable=unused-argument
         assert morph.part_of_speech == w.pos_
 
     am_config = AnkiMorphsConfig()
-    processed_morphs: list[Morpheme] = get_processed_spacy_morphs(am_config, doc)
+    processed_morphs: list[Morpheme] = filter_spacy_morphs(
+        am_config, get_spacy_morphs(doc)
+    )
 
     # print(f"processes morphs: {len(processed_morphs)}")
     # for _morph in processed_morphs:
@@ -867,3 +915,41 @@ def test_zh_model(fake_environment) -> None:  # pylint:disable=unused-argument
     #     print("")
 
     assert processed_morphs == correct_am_morphs
+
+
+def test_spacy_pipeline(fake_environment) -> None:  # pylint:disable=unused-argument
+    am_config = AnkiMorphsConfig()
+    am_config.spacy_pipe_settings = {"en_core_web_sm": {"batch_size": 2}}
+
+    spacy_pipeline = spacy_wrapper.get_spacy_pipeline(
+        "en_core_web_sm", am_config.get_spacy_pipe_settings("en_core_web_sm")
+    )
+    assert spacy_pipeline is not None
+    assert spacy_pipeline.batch_size == 2
+    # spacy only uses multiple processes when n_process is set explicitly
+    assert spacy_pipeline.n_process == 1
+
+    # the docs are produced in the same order as the texts
+    expressions = ["My mother-in-law is wonderful", "I am walking", "Hello", ""]
+    docs = list(spacy_pipeline.pipe(expressions))
+    assert [doc.text for doc in docs] == expressions
+    assert [[token.lemma_ for token in doc] for doc in docs] == [
+        [token.lemma_ for token in spacy_pipeline.nlp(text)] for text in expressions
+    ]
+
+
+def test_loaded_models_registry(  # pylint:disable=unused-argument
+    fake_environment,
+) -> None:
+    with mock.patch.object(spacy_wrapper, "_MAX_LOADED_MODELS", 2):
+        nlp: spacy.Language = get_nlp(spacy_model_name="ja_core_news_sm")
+        assert get_nlp(spacy_model_name="ja_core_news_sm") is nlp
+
+        # loading two other models evicts the least recently used model
+        get_nlp(spacy_model_name="en_core_web_sm")
+        get_nlp(spacy_model_name="nb_core_news_sm")
+        assert list(spacy_wrapper._loaded_models) == [
+            "en_core_web_sm",
+            "nb_core_news_sm",
+        ]
+        assert get_nlp(spacy_model_name="ja_core_news_sm") is not nlp
@@ -0,0 +1,172 @@
+import random
+import re
+from typing import Optional
+from unittest import mock
+
+import pytest
+
+from ankimorphs import (
+    ankimorphs_globals,
+    extra_field_utils,
+    text_highlighting,
+    text_preprocessing,
+)
+from ankimorphs.morpheme import Morpheme
+from ankimorphs.text_highlighting import SpanElement, get_highlighted_text
+
+
+def _extract_ruby_characters_and_filter_string(
+    am_config, text_to_highlight: str
+) -> tuple[dict[int, str], str]:
+    # the original implementation, which removes one match at a time
+    ruby_character_dict: dict[int, str] = {}
+
+    if not am_config.preprocess_ignore_bracket_contents:
+        return ruby_character_dict, text_to_highlight
+
+    while True:
+        match: Optional[re.Match[str]] = re.search(
+            text_preprocessing.square_brackets_regex, text_to_highlight
+        )
+        if match is None:
+            break
+
+        ruby_character_dict[match.start()] = match.group()
+        text_to_highlight = (
+            text_to_highlight[: match.start()] + text_to_highlight[match.end() :]
+        )
+
+    return ruby_character_dict, text_to_highlight
+
+
+def _get_morph_status(am_config, morph: Morpheme) -> str:
+    assert morph.highest_learning_interval is not None
+    if morph.highest_learning_interval == 0:
+        return "unknown"
+    if morph.highest_learning_interval < am_config.recalc_interval_for_known:
+        return "learning"
+    return "known"
+
+
+def _extract_span_elements_and_filter_string(
+    am_config, card_morphs: list[Morpheme], text_to_highlight: str
+) -> tuple[list[SpanElement], str]:
+    # the original implementation, which replaces the morphs with whitespaces
+    span_elements: list[SpanElement] = []
+
+    morphs_by_size = sorted(
+        card_morphs,
+        key=lambda _simple_morph: len(_simple_morph.inflection),
+        reverse=True,
+    )
+
+    for morph in morphs_by_size:
+        morph_status = _get_morph_status(am_config, morph)
+
+        morph_matches = re.finditer(
+            re.escape(morph.inflection), text_to_highlight, flags=re.IGNORECASE
+        )
+
+        for morph_match in morph_matches:
+            start_index = morph_match.start()
+            end_index = morph_match.end()
+            span_elements.append(
+                SpanElement(morph_match.group(), morph_status, start_index, end_index)
+            )
+            text_to_highlight = (
+                text_to_highlight[:start_index]
+                + " " * (end_index - start_index)
+                + text_to_highlight[end_index:]
+            )
+
+    return span_elements, text_to_highlight
+
+
+@pytest.mark.parametrize("preprocess_ignore_bracket_contents", [False, True])
+def test_highlighting_is_unchanged(preprocess_ignore_bracket_contents):
+    # The texts are built from a tiny alphabet, so the morphs overlap
+    # each other a lot, which is where the order of extraction matters.
+    rng = random.Random(0)
+    alphabet = ["a", "b", "A", "B", "ab", " ", "?", "[b]", "[", "]", "é", "É"]
+    am_config = mock.Mock(
+        preprocess_ignore_bracket_contents=preprocess_ignore_bracket_contents,
+        recalc_interval_for_known=21,
+    )
+
+    for _ in range(3000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 25)))
+        card_morphs = [
+            Morpheme(
+                lemma="",
+                inflection="".join(
+                    rng.choice(alphabet[:6] + ["é"]) for _ in range(rng.randint(0, 3))
+                ),
+                highest_learning_interval=rng.choice([0, 5, 30]),
+            )
+            for _ in range(rng.randint(0, 6))
+        ]
+
+        highlighted_text = get_highlighted_text(am_config, card_morphs, text)
+
+        with mock.patch.object(
+            text_highlighting,
+            "_extract_ruby_characters_and_filter_string",
+            _extract_ruby_characters_and_filter_string,
+        ), mock.patch.object(
+            text_highlighting,
+            "_extract_span_elements_and_filter_string",
+            _extract_span_elements_and_filter_string,
+        ):
+            expected_text = get_highlighted_text(am_config, card_morphs, text)
+
+        assert highlighted_text == expected_text, (
+            text,
+            [morph.inflection for morph in card_morphs],
+        )
+
+
+def test_highlighting_is_skipped_when_unchanged():
+    am_config = mock.Mock(
+        preprocess_ignore_bracket_contents=True, recalc_interval_for_known=21
+    )
+    config_filter = mock.Mock(field_index=0)
+    note_type_field_name_dict = {ankimorphs_globals.EXTRA_FIELD_HIGHLIGHTED: (1, {})}
+    card_morph_map_cache = {
+        1: [Morpheme("hello", "hello", highest_learning_interval=0)]
+    }
+    fields = ["hello world", ""]
+
+    def update_highlighted_field(highlight_hash):
+        return extra_field_utils.update_highlighted_field(
+            am_config,
+            config_filter,
+            note_type_field_name_dict,
+            card_morph_map_cache,
+            1,
+            fields,
+            highlight_hash,
+        )
+
+    with mock.patch.object(
+        text_highlighting,
+        "get_highlighted_text",
+        wraps=text_highlighting.get_highlighted_text,
+    ) as get_highlighted_text_mock:
+        highlight_hash = update_highlighted_field(None)
+        assert highlight_hash is not None
+        assert fields[1] == '<span morph-status="unknown">hello</span> world'
+
+        assert update_highlighted_field(highlight_hash) is None
+        assert get_highlighted_text_mock.call_count == 1
+
+        # the status of the morph changed
+        card_morph_map_cache[1][0].highest_learning_interval = 30
+        new_highlight_hash = update_highlighted_field(highlight_hash)
+        assert new_highlight_hash not in (None, highlight_hash)
+        assert fields[1] == '<span morph-status="known">hello</span> world'
+
+        # the highlighted field was edited by hand
+        fields[1] = "hello world"
+        assert update_highlighted_field(new_highlight_hash) is None
+        assert fields[1] == '<span morph-status="known">hello</span> world'
+        assert get_highlighted_text_mock.call_count == 3